@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from movie_analysis.Movies import Movies  # noqa: E402
+from movie_analysis.Reader import read_rows  # noqa: E402
+
+
+def smart_split(line):
+    # прежний Movies.smart_split: срез между первой и последней кавычкой
+    line = line.strip()
+    if '"' in line:
+        first_quote = line.index('"')
+        last_quote = line.rindex('"')
+        movieID = line[:first_quote - 1]
+        title = line[first_quote + 1:last_quote]
+        genres = line[last_quote + 2:]
+    else:
+        movieID, title, genres = line.split(',', maxsplit=2)
+    return int(movieID), title.strip(), genres.strip()
+
+
+def extract_title_and_year(title):
+    if title.endswith(')') and '(' in title:
+        name, year = title.rsplit('(', 1)
+        year_cleaned = year.strip(')')
+        if year_cleaned[:4].isdigit():
+            return name.strip(), int(year_cleaned[:4])
+    return title.strip(), None
+
+
+def parse_split(line):
+    movieID, title_raw, genres = smart_split(line)
+    title, year = extract_title_and_year(title_raw)
+    genre_list = genres.split('|') if genres != "(no genres listed)" else ['(no genres listed)']
+    return {'movieID': movieID, 'title': title, 'release': year, 'genres': genre_list}
+
+
+def read_split_rows(path, parse, limit=None):
+    # прежний Reader.read_rows: построчно, строка целиком отдаётся в parse
+    with open(path, 'r', encoding='utf-8') as f:
+        next(f)
+        for i, line in enumerate(f):
+            if limit is not None and i >= limit:
+                break
+            try:
+                row = parse(line)
+            except Exception as e:
+                print("Ошибка разбора:", i + 2, line)
+                print("→", e)
+                continue
+            if row is not None:
+                yield row
+
+
+def read_split(path):
+    return list(read_split_rows(path, parse_split))
+
+
+def read_csv(path):
+    return list(read_rows(path, Movies.parse_record))
+
+
+def timed(func, path):
+    start = time.perf_counter()
+    func(path)
+    return time.perf_counter() - start
+
+
+def bench(path, repeat):
+    # прогоны чередуются, чтобы дрейф частоты и кэшей одинаково влиял на оба пути;
+    # ускорение считается по каждой паре прогонов, в отчёте — медиана и разброс
+    before, after = [], []
+    for _ in range(repeat):
+        before.append(timed(read_split, path))
+        after.append(timed(read_csv, path))
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость разбора movies.csv: split-путь против csv-парсера")
+    parser.add_argument('path', nargs='?', default='./ml-latest-small/movies.csv')
+    parser.add_argument('--repeat', type=int, default=21)
+    args = parser.parse_args()
+
+    before_rows = read_split(args.path)
+    after_rows = read_csv(args.path)
+    mismatches = sum(a != b for a, b in zip(before_rows, after_rows)) + abs(len(before_rows) - len(after_rows))
+    before, after = bench(args.path, args.repeat)
+    speedups = [b / a for b, a in zip(before, after)]
+    print(json.dumps({
+        'rows': len(after_rows),
+        'repeat': args.repeat,
+        'before_rows_per_sec': round(len(before_rows) / statistics.median(before), 1),
+        'after_rows_per_sec': round(len(after_rows) / statistics.median(after), 1),
+        'speedup_median': round(statistics.median(speedups), 2),
+        'speedup_stdev': round(statistics.stdev(speedups), 2) if len(speedups) > 1 else 0.0,
+        'speedup_min': round(min(speedups), 2),
+        'speedup_max': round(max(speedups), 2),
+        'mismatches': mismatches,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
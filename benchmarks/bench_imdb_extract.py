@@ -0,0 +1,79 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from movie_analysis.Extractors import extract  # noqa: E402
+
+FIELDS = ["Director", "Budget", "Cumulative Worldwide Gross", "Runtime"]
+
+
+def extract_soup(html, fields):
+    # прежний путь Links.get_imdb: BeautifulSoup + отдельный поиск на каждое поле
+    soup = BeautifulSoup(html, 'html.parser')
+    data = {}
+    for field in fields:
+        value = None
+        if field == "Director":
+            section = soup.find(attrs={"data-testid": "title-pc-principal-credit"})
+            if section and section.find("a"):
+                value = section.find("a").text.strip()
+        elif field in ("Budget", "Cumulative Worldwide Gross"):
+            label = "Budget" if field == "Budget" else "Gross worldwide"
+            for li in soup.find_all("li", class_="ipc-metadata-list__item"):
+                if li.find(string=label):
+                    value = li.find_all("span")[-1].text.strip()
+                    break
+        elif field == "Runtime":
+            tech = soup.find("li", attrs={"data-testid": "title-techspec_runtime"})
+            if tech and tech.find("div"):
+                value = tech.find("div").text.strip()
+        data[field] = value
+    return data
+
+
+def bench(func, pages, fields, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in pages:
+            func(html, fields)
+        best = min(best, time.perf_counter() - start)
+    return len(pages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость извлечения полей IMDb: BeautifulSoup против Extractors")
+    parser.add_argument('corpus', help="каталог с сохранёнными страницами *.html")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fields', nargs='*', default=FIELDS)
+    args = parser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    if not pages:
+        parser.error(f"нет страниц *.html в {args.corpus}")
+
+    mismatches = sum(extract_soup(html, args.fields) != extract(html, args.fields) for html in pages)
+    before = bench(extract_soup, pages, args.fields, args.repeat)
+    after = bench(extract, pages, args.fields, args.repeat)
+    print(json.dumps({
+        'pages': len(pages),
+        'fields': args.fields,
+        'before_pages_per_sec': round(before, 1),
+        'after_pages_per_sec': round(after, 1),
+        'speedup': round(after / before, 2),
+        'mismatches': mismatches,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.generate_data import SCALES, generate  # noqa: E402
+from movie_analysis.ImdbCache import ImdbCache  # noqa: E402
+from movie_analysis.Links import Links  # noqa: E402
+from movie_analysis.Movies import Movies  # noqa: E402
+from movie_analysis.Ratings import Ratings  # noqa: E402
+from movie_analysis.Tags import Tags  # noqa: E402
+
+# загрузка, запись и служебные методы измеряются через конструктор, а не по отдельности
+SKIP = {'load', 'load_cached', 'build_columns', 'append', 'refresh', 'parse_record', 'read_chunks', 'parse_imdb'}
+
+# значения обязательных аргументов по имени параметра
+ARGS = {
+    'n': 10,
+    'word': 'dark',
+    'unit': 'year',
+    'low': 1990,
+    'high': 1999,
+    'user_id': 1,
+    'movie_id': 1,
+    'column': 'user_ids',
+    'imdb_id': 114709,
+    'values': [4.0, 3.5, 5.0, 2.0],
+    'lst': [4.0, 3.5, 5.0, 2.0],
+}
+
+IMDB_SAMPLE = 1000
+
+
+def public_methods(cls):
+    for name, func in inspect.getmembers(cls, callable):
+        if not name.startswith('_') and name not in SKIP:
+            yield name, func
+
+
+def call_args(func, extra):
+    args = []
+    for param in list(inspect.signature(func).parameters.values())[1:]:
+        if param.default is not param.empty or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        if param.name in extra:
+            args.append(extra[param.name])
+        elif param.name in ARGS:
+            args.append(ARGS[param.name])
+        else:
+            return None
+    return args
+
+
+def consume(result):
+    # генераторы и итераторы проходятся до конца, иначе измерялось бы только их создание
+    if isinstance(result, Iterator):
+        return sum(1 for _ in result)
+    return result
+
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    consume(func())
+    first = time.perf_counter() - start
+    warm = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        consume(func())
+        warm = min(warm, time.perf_counter() - start)
+    return first, warm
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        consume(func())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def fill_imdb_cache(path, links, sample, seed):
+    # поля IMDb для части фильмов кладутся в офлайн-кэш, чтобы аналитика Links шла без сети
+    rnd = random.Random(seed)
+    cache = ImdbCache(path, ttl=None, max_bytes=None)
+    movie_ids = list(links.links)[:sample]
+    for movie_id in movie_ids:
+        budget = rnd.randint(1, 300) * 1_000_000
+        minutes = rnd.randint(70, 200)
+        cache.put(links.links[movie_id], None, {
+            'Director': f"Director {rnd.randint(1, sample // 10 + 1)}",
+            'Budget': f"${budget:,}",
+            'Cumulative Worldwide Gross': f"${budget * rnd.randint(1, 5):,}",
+            'Runtime': f"{minutes // 60} hours {minutes % 60} minutes",
+        })
+    cache.close()
+    return movie_ids
+
+
+def targets(data_dir, workers):
+    path = lambda name: os.path.join(data_dir, name)  # noqa: E731
+    movies_path = path('movies.csv')
+    imdb_path = path('imdb_cache.sqlite')
+    return {
+        'Movies': (lambda: Movies(movies_path, limit=None), lambda obj: obj),
+        'Ratings.Movies': (lambda: Ratings(path('ratings.csv'), limit=None, movies_path=movies_path, workers=workers),
+                           lambda obj: obj.Movies(obj)),
+        'Ratings.Users': (lambda: Ratings(path('ratings.csv'), limit=None, movies_path=movies_path, workers=workers),
+                          lambda obj: obj.Users(obj)),
+        'Tags': (lambda: Tags(path('tags.csv'), limit=None, movies_path=movies_path), lambda obj: obj),
+        'Links': (lambda: Links(path('links.csv'), limit=None, movies_path=movies_path,
+                                imdb_cache=ImdbCache(imdb_path, ttl=None, offline=True)),
+                  lambda obj: obj),
+    }
+
+
+def run_target(name, make, view, extra, repeat, pattern):
+    results = {}
+    start = time.perf_counter()
+    timed = make()
+    load = time.perf_counter() - start
+    results[f"{name}.__init__"] = {'first_s': load, 'warm_s': load, 'peak_bytes': peak_memory(make)}
+    traced = make()
+    if name == 'Links':
+        timed.get_imdb(extra['list_of_movies'])
+        traced.get_imdb(extra['list_of_movies'])
+    cls = type(view(timed))
+    for method, func in public_methods(cls):
+        key = f"{name}.{method}"
+        if pattern and not re.search(pattern, key):
+            continue
+        args = call_args(func, extra)
+        if args is None:
+            results[key] = {'skipped': "нет значений для обязательных аргументов"}
+            continue
+        try:
+            # память — на отдельном экземпляре, чтобы первый вызов там тоже был холодным
+            peak = peak_memory(lambda: getattr(view(traced), method)(*args))
+            first, warm = measure(lambda: getattr(view(timed), method)(*args), repeat)
+        except Exception as e:
+            results[key] = {'error': f"{type(e).__name__}: {e}"}
+            continue
+        results[key] = {'first_s': first, 'warm_s': warm, 'peak_bytes': peak}
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время и память всех публичных методов на синтетических данных")
+    parser.add_argument('--scale', choices=SCALES, default='100k')
+    parser.add_argument('--rows', type=int, help="число строк ratings.csv вместо --scale")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help="каталог с данными; если файлов нет, они будут сгенерированы")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--only', help="регулярное выражение по имени Класс.метод")
+    parser.add_argument('--output', help="файл для JSON, по умолчанию stdout")
+    args = parser.parse_args()
+
+    rows = args.rows or SCALES[args.scale]
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), f"movielens_bench_{rows}_{args.seed}")
+    if not os.path.isfile(os.path.join(data_dir, 'tags.csv')):
+        generate(data_dir, rows, args.seed)
+    imdb_path = os.path.join(data_dir, 'imdb_cache.sqlite')
+    if os.path.exists(imdb_path):
+        os.remove(imdb_path)
+    sample = fill_imdb_cache(imdb_path, Links(os.path.join(data_dir, 'links.csv'), limit=IMDB_SAMPLE),
+                             IMDB_SAMPLE, args.seed)
+    extra = {'list_of_movies': sample}
+
+    results = {}
+    for name, (make, view) in targets(data_dir, args.workers).items():
+        results.update(run_target(name, make, view, extra, args.repeat, args.only))
+
+    report = {
+        'meta': {
+            'rows': rows,
+            'seed': args.seed,
+            'workers': args.workers,
+            'repeat': args.repeat,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+
+METRICS = ('first_s', 'warm_s', 'peak_bytes')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(before, after, threshold=1.2, min_time=1e-3, min_bytes=64 * 1024):
+    # отношение after/before по каждой метрике; слишком короткие и малые замеры не сравниваются,
+    # чтобы шум микросекунд не выглядел регрессией
+    floors = {'first_s': min_time, 'warm_s': min_time, 'peak_bytes': min_bytes}
+    rows = []
+    for key in sorted(set(before['results']) | set(after['results'])):
+        old = before['results'].get(key)
+        new = after['results'].get(key)
+        if old is None or new is None:
+            rows.append({'method': key, 'status': 'added' if old is None else 'removed'})
+            continue
+        row = {'method': key, 'status': 'ok'}
+        for metric in METRICS:
+            if metric not in old or metric not in new:
+                continue
+            a, b = old[metric], new[metric]
+            row[metric] = [a, b]
+            if max(a, b) < floors[metric]:
+                continue
+            ratio = b / a if a else float('inf')
+            row[f"{metric}_ratio"] = round(ratio, 3)
+            if ratio > threshold:
+                row['status'] = 'regression'
+            elif ratio < 1 / threshold and row['status'] == 'ok':
+                row['status'] = 'improvement'
+        if 'error' in new and 'error' not in old:
+            row['status'] = 'regression'
+            row['error'] = new['error']
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение двух JSON-отчётов bench_suite.py")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.2, help="во сколько раз хуже считается регрессией")
+    parser.add_argument('--min-time', type=float, default=1e-3)
+    parser.add_argument('--min-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--json', action='store_true', help="вывести все строки сравнения в JSON")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    if before['meta'].get('rows') != after['meta'].get('rows'):
+        print("Предупреждение: отчёты сняты на разном объёме данных", file=sys.stderr)
+    rows = compare(before, after, args.threshold, args.min_time, args.min_bytes)
+    if args.json:
+        print(json.dumps({'before': before['meta'], 'after': after['meta'], 'rows': rows},
+                         ensure_ascii=False, indent=2))
+    else:
+        for row in rows:
+            if row['status'] == 'ok':
+                continue
+            ratios = ' '.join(f"{m}={row[f'{m}_ratio']}" for m in METRICS if f"{m}_ratio" in row)
+            print(f"{row['status']:<12} {row['method']:<45} {ratios} {row.get('error', '')}".rstrip())
+    regressions = sum(row['status'] == 'regression' for row in rows)
+    print(f"регрессий: {regressions} из {len(rows)}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import csv
+import os
+import random
+
+# число строк ratings.csv; остальные файлы масштабируются от него, как в настоящих выгрузках MovieLens
+SCALES = {
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '25m': 25_000_000,
+    '100m': 100_000_000,
+}
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime', 'Documentary', 'Drama',
+          'Fantasy', 'Film-Noir', 'Horror', 'IMAX', 'Musical', 'Mystery', 'Romance', 'Sci-Fi',
+          'Thriller', 'War', 'Western']
+WORDS = ['dark', 'funny', 'classic', 'atmospheric', 'twist ending', 'based on a book', 'visually stunning',
+         'sci-fi', 'romance', 'thought-provoking', 'quirky', 'war', 'violence', 'dialogue', 'soundtrack',
+         'Highly quotable', 'cult film', 'slow', 'predictable', 'great acting']
+TITLE_WORDS = ['Night', 'Day', 'Love', 'War', 'Story', 'Man', 'City', 'Dream', 'Return', 'Last', 'Dark',
+               'Blue', 'House', 'Road', 'King', 'Ghost', 'River', 'Star', 'Secret', 'Time']
+START = 828_000_000
+END = 1_540_000_000
+CHUNK = 100_000
+
+
+def sizes(ratings):
+    return {
+        'ratings': ratings,
+        'movies': max(100, ratings // 10),
+        'users': max(10, ratings // 150),
+        'tags': max(10, ratings // 30),
+    }
+
+
+def write_movies(path, rnd, count):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['movieId', 'title', 'genres'])
+        for movie_id in range(1, count + 1):
+            title = ' '.join(rnd.choices(TITLE_WORDS, k=rnd.randint(1, 4)))
+            if rnd.random() < 0.05:
+                title += ', The'
+            if rnd.random() < 0.01:
+                title += ' "Redux"'
+            if rnd.random() < 0.98:
+                title += f" ({rnd.randint(1902, 2018)})"
+            if rnd.random() < 0.01:
+                genres = '(no genres listed)'
+            else:
+                genres = '|'.join(rnd.sample(GENRES, rnd.randint(1, 6)))
+            writer.writerow([movie_id, title, genres])
+
+
+def write_links(path, rnd, count):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('movieId,imdbId,tmdbId\n')
+        for movie_id in range(1, count + 1):
+            tmdb = '' if rnd.random() < 0.01 else rnd.randint(2, 500_000)
+            f.write(f"{movie_id},{rnd.randint(1, 9_999_999):07d},{tmdb}\n")
+
+
+def popular_movie(rnd, movies):
+    # длинный хвост: немногие фильмы собирают большую часть оценок
+    return int(movies * (rnd.paretovariate(1.2) - 1)) % movies + 1
+
+
+def write_ratings(path, rnd, count, users, movies):
+    per_user = max(1, count // users)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('userId,movieId,rating,timestamp\n')
+        written = 0
+        user_id = 0
+        while written < count:
+            user_id += 1
+            n = min(count - written, max(1, int(rnd.expovariate(1 / per_user))))
+            base = rnd.randint(START, END)
+            lines = []
+            for _ in range(n):
+                rating = rnd.randint(1, 10) / 2
+                lines.append(f"{user_id},{popular_movie(rnd, movies)},{rating},{base + rnd.randint(0, 90_000_000)}\n")
+                if len(lines) >= CHUNK:
+                    f.writelines(lines)
+                    lines = []
+            f.writelines(lines)
+            written += n
+
+
+def write_tags(path, rnd, count, users, movies):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['userId', 'movieId', 'tag', 'timestamp'])
+        for _ in range(count):
+            tag = rnd.choice(WORDS)
+            if rnd.random() < 0.3:
+                tag = f"{tag} {rnd.choice(WORDS)}"
+            if rnd.random() < 0.02:
+                tag = f"{tag}, {rnd.choice(WORDS)}"
+            writer.writerow([rnd.randint(1, users), popular_movie(rnd, movies), tag, rnd.randint(START, END)])
+
+
+def generate(out_dir, ratings, seed=0):
+    # один и тот же seed даёт побайтно одинаковые файлы
+    os.makedirs(out_dir, exist_ok=True)
+    n = sizes(ratings)
+    write_movies(os.path.join(out_dir, 'movies.csv'), random.Random(seed), n['movies'])
+    write_links(os.path.join(out_dir, 'links.csv'), random.Random(seed + 1), n['movies'])
+    write_ratings(os.path.join(out_dir, 'ratings.csv'), random.Random(seed + 2), n['ratings'], n['users'], n['movies'])
+    write_tags(os.path.join(out_dir, 'tags.csv'), random.Random(seed + 3), n['tags'], n['users'], n['movies'])
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические movies/ratings/tags/links.csv в схеме MovieLens")
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', choices=SCALES, default='100k')
+    parser.add_argument('--rows', type=int, help="число строк ratings.csv вместо --scale")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.out_dir, args.rows or SCALES[args.scale], args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from . import Metrics
+
+# бинарный кэш разобранных колонок рядом с исходным csv: <file>.mlcache
+CACHE_SUFFIX = '.mlcache'
+FORMAT_VERSION = 1
+MAGIC = b'MLC1'
+ALIGN = 8
+SEPARATOR = '\x00'
+
+
+def cache_path(source):
+    return source + CACHE_SUFFIX
+
+
+def _stamp(source):
+    st = os.stat(source)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _key(source, schema, stamp=None):
+    return {'format': FORMAT_VERSION, 'schema': schema, 'source': stamp or _stamp(source)}
+
+
+def save(source, schema, columns, path=None, stamp=None):
+    # columns: имя -> array (числа) или список строк; path — другой файл кэша для
+    # производных данных, актуальность по-прежнему сверяется с source. stamp — размер
+    # и время изменения source на момент, когда колонки начали строиться.
+    # Кэш необязателен: если записать его нельзя (каталог только для чтения,
+    # нет места), возвращается False и загрузка продолжается без него
+    path = path or cache_path(source)
+    header = _key(source, schema, stamp)
+    header['columns'] = []
+    blobs = []
+    offset = 0
+    for name, column in columns.items():
+        if isinstance(column, list):
+            data = SEPARATOR.join(column).encode('utf-8')
+            meta = {'name': name, 'kind': 'str', 'count': len(column)}
+        else:
+            data = column.tobytes()
+            meta = {'name': name, 'kind': column.typecode, 'count': len(column)}
+        meta['offset'] = offset
+        meta['nbytes'] = len(data)
+        header['columns'].append(meta)
+        blobs.append(data)
+        offset += len(data) + (-len(data)) % ALIGN
+
+    raw_header = json.dumps(header).encode('utf-8')
+    start = len(MAGIC) + 4 + len(raw_header)
+    padding = (-start) % ALIGN
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(raw_header)))
+            f.write(raw_header)
+            f.write(b'\0' * padding)
+            for data in blobs:
+                f.write(data)
+                f.write(b'\0' * ((-len(data)) % ALIGN))
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def load(source, schema, path=None):
+    # колонки-числа возвращаются как memoryview поверх mmap, без копирования;
+    # None, если кэша нет, он устарел, не читается или повреждён (обрезан, испорчен)
+    path = path or cache_path(source)
+    try:
+        return _read(source, schema, path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _read(source, schema, path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        return None
+    (size,) = struct.unpack_from('<I', view, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(view[start:start + size]))
+    meta = header.pop('columns', None) if isinstance(header, dict) else None
+    if not isinstance(meta, list):
+        raise ValueError(f"Повреждён заголовок кэша: {path}")
+    if header != _key(source, schema):
+        return None
+    start += size
+    start += (-start) % ALIGN
+
+    columns = {}
+    for col in meta:
+        begin = start + col['offset']
+        data = view[begin:begin + col['nbytes']]
+        if len(data) != col['nbytes']:
+            raise ValueError(f"Файл кэша обрезан: {path}")
+        if col['kind'] == 'str':
+            text = str(data, 'utf-8')
+            columns[col['name']] = text.split(SEPARATOR) if col['count'] else []
+        else:
+            columns[col['name']] = data.cast(col['kind'])
+    return columns
+
+
+def load_or_build(source, schema, build, path=None, size=None):
+    # size — до какого байта source прочитан загрузчиком: если файл уже дописан дальше,
+    # кэш ему не подходит, и колонки строятся без сохранения
+    stamp = _stamp(source)
+    if size is not None and size != stamp['size']:
+        Metrics.cache('binary_cache', False)
+        return build()
+    columns = load(source, schema, path)
+    Metrics.cache('binary_cache', columns is not None)
+    if columns is None:
+        built = build()
+        if not save(source, schema, built, path, stamp):
+            return built
+        # файл изменился, пока колонки строились: сохранённый кэш уже устарел
+        columns = load(source, schema, path) or built
+    return columns
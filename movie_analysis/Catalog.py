@@ -0,0 +1,49 @@
+import os
+from threading import Lock
+from . import Metrics
+from .Movies import Movies
+
+
+class Catalog:
+    # общий на процесс реестр разобранных movies.csv: ключ — путь, проверка — mtime и размер
+    _registry = {}
+    _lock = Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.movies = Movies(path, limit=None)
+        self.titles = {m['movieID']: m['title'] for m in self.movies.movies}
+        self._labels = None
+
+    def labels(self):
+        # подписи без совпадений: одинаковые названия различаются годом (или movieId), как в most_genres
+        if self._labels is None:
+            index = self.movies.genre_index()
+            self._labels = dict(zip(index.movie_ids, index.labels()))
+        return self._labels
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def get(cls, path='./ml-latest-small/movies.csv'):
+        key = os.path.abspath(path)
+        stamp = cls._stamp(key)
+        with cls._lock:
+            entry = cls._registry.get(key)
+            Metrics.cache('catalog', entry is not None and entry[0] == stamp)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, cls(key))
+                cls._registry[key] = entry
+            return entry[1]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._registry.clear()
+
+    @staticmethod
+    def default_path(data_path):
+        return os.path.join(os.path.dirname(data_path), 'movies.csv')
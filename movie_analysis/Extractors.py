@@ -0,0 +1,302 @@
+import json
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# Реестр полей IMDb. Каждое поле объявляет, откуда его брать:
+#   next_data — функция над JSON из <script id="__NEXT_DATA__">,
+#   json_ld   — функция над JSON-LD (<script type="application/ld+json">),
+#   dom       — правило для однопроходного сканера разметки (запасной путь).
+# Скрипты вырезаются регулярным выражением, полное DOM-дерево не строится;
+# все DOM-правила проверяет один сканер за один проход по документу: он разбирает
+# только элементы-кандидаты, найденные поиском по подстроке, в порядке их следования.
+
+Field = namedtuple('Field', 'name next_data json_ld dom')
+
+# правила DOM
+TestIdLink = namedtuple('TestIdLink', 'testid')            # первая <a> внутри [data-testid]
+TestIdChild = namedtuple('TestIdChild', 'testid tag')      # первый <tag> внутри [data-testid]
+LabeledItem = namedtuple('LabeledItem', 'label')           # последний <span> в li.ipc-metadata-list__item с подписью
+
+FIELDS = {}
+
+NEXT_DATA_RE = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+JSON_LD_RE = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+METADATA_ITEM = 'ipc-metadata-list__item'
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'INR': '₹', 'CAD': 'CA$', 'AUD': 'A$'}
+
+
+def register(name, next_data=None, json_ld=None, dom=None):
+    FIELDS[name] = Field(name, next_data, json_ld, dom)
+    return FIELDS[name]
+
+
+def _get(data, *path):
+    for key in path:
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and isinstance(key, int) and -len(data) <= key < len(data):
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+def format_money(money):
+    if not money or money.get('amount') is None:
+        return None
+    currency = money.get('currency') or 'USD'
+    amount = f"{int(money['amount']):,}"
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount}" if symbol else f"{currency} {amount}"
+
+
+def format_runtime(seconds):
+    if not seconds:
+        return None
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours} hour" + ("s" if hours != 1 else ""))
+    if minutes:
+        parts.append(f"{minutes} minute" + ("s" if minutes != 1 else ""))
+    return ' '.join(parts) or None
+
+
+def parse_iso_duration(value):
+    match = re.fullmatch(r'PT(?:(\d+)H)?(?:(\d+)M)?', value or '')
+    if not match:
+        return None
+    return (int(match.group(1) or 0) * 60 + int(match.group(2) or 0)) * 60
+
+
+def _director_from_next_data(data):
+    for group in _get(data, 'props', 'pageProps', 'aboveTheFoldData', 'principalCredits') or []:
+        if _get(group, 'category', 'id') == 'director':
+            return _get(group, 'credits', 0, 'name', 'nameText', 'text')
+    return None
+
+
+def _director_from_json_ld(data):
+    director = data.get('director')
+    if isinstance(director, list):
+        director = director[0] if director else None
+    return _get(director, 'name')
+
+
+def _join(values):
+    if isinstance(values, list):
+        return ', '.join(str(v) for v in values)
+    return values
+
+
+register(
+    "Director",
+    next_data=_director_from_next_data,
+    json_ld=_director_from_json_ld,
+    dom=TestIdLink("title-pc-principal-credit"),
+)
+register(
+    "Budget",
+    next_data=lambda d: format_money(_get(d, 'props', 'pageProps', 'mainColumnData', 'productionBudget', 'budget')),
+    dom=LabeledItem("Budget"),
+)
+register(
+    "Cumulative Worldwide Gross",
+    next_data=lambda d: format_money(_get(d, 'props', 'pageProps', 'mainColumnData', 'worldwideGross', 'total')),
+    dom=LabeledItem("Gross worldwide"),
+)
+register(
+    "Runtime",
+    next_data=lambda d: format_runtime(_get(d, 'props', 'pageProps', 'aboveTheFoldData', 'runtime', 'seconds')),
+    json_ld=lambda d: format_runtime(parse_iso_duration(d.get('duration'))),
+    dom=TestIdChild("title-techspec_runtime", "div"),
+)
+register(
+    "Title",
+    next_data=lambda d: _get(d, 'props', 'pageProps', 'aboveTheFoldData', 'titleText', 'text'),
+    json_ld=lambda d: d.get('name'),
+)
+register(
+    "Rating",
+    json_ld=lambda d: _get(d, 'aggregateRating', 'ratingValue'),
+    next_data=lambda d: _get(d, 'props', 'pageProps', 'aboveTheFoldData', 'ratingsSummary', 'aggregateRating'),
+)
+register("Genres", json_ld=lambda d: _join(d.get('genre')))
+register("Release Date", json_ld=lambda d: d.get('datePublished'))
+register("Content Rating", json_ld=lambda d: d.get('contentRating'))
+register("Country of origin", dom=LabeledItem("Country of origin"))
+
+
+class _Done(Exception):
+    pass
+
+
+class DomScanner(HTMLParser):
+    # потоковый разбор элемента сразу для всех правил; элемент заканчивается, когда закрыт
+    # первый открытый в нём тег, весь разбор — когда найдены все поля
+    def __init__(self, rules):
+        super().__init__(convert_charrefs=True)
+        self.wanted = len(rules)
+        self.links = {rule.testid: name for name, rule in rules.items() if isinstance(rule, TestIdLink)}
+        self.children = {rule.testid: (name, rule.tag) for name, rule in rules.items() if isinstance(rule, TestIdChild)}
+        self.labels = {rule.label: name for name, rule in rules.items() if isinstance(rule, LabeledItem)}
+        self.found = {}
+        self.stack = []        # открытые теги: [tag, buffer или None, действие при закрытии]
+        self.buffers = []      # активные буферы текста
+        self.sections = []     # (field, tag, глубина) для секций [data-testid]
+        self.item = None       # текущий li.ipc-metadata-list__item: {'depth', 'texts', 'last_span'}
+
+    @property
+    def done(self):
+        return len(self.found) == self.wanted
+
+    def scan(self, html, start):
+        # разбирает элемент, начинающийся в start; возвращает позицию, где разбор остановился
+        self.reset()
+        self.stack, self.buffers, self.sections, self.item = [], [], [], None
+        text = html[start:]
+        try:
+            self.feed(text)
+            self.close()
+        except _Done:
+            pass
+        line, column = self.getpos()
+        offset = 0
+        for _ in range(line - 1):
+            offset = text.index('\n', offset) + 1
+        return start + offset + column
+
+    def _open(self, tag, buffer=None, on_close=None):
+        if buffer is not None:
+            self.buffers.append(buffer)
+        self.stack.append((tag, buffer, on_close))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        attrs = dict(attrs)
+        depth = len(self.stack)
+        testid = attrs.get('data-testid')
+
+        if testid in self.links and self.links[testid] not in self.found:
+            self.sections.append((self.links[testid], 'a', depth))
+        if testid in self.children and self.children[testid][0] not in self.found:
+            self.sections.append((self.children[testid][0], self.children[testid][1], depth))
+        if tag == 'li' and self.labels and METADATA_ITEM in (attrs.get('class') or '').split():
+            self.item = {'depth': depth, 'texts': set(), 'last_span': None}
+
+        for field, wanted, _ in self.sections:
+            if tag == wanted and field not in self.found:
+                buffer = []
+                self._open(tag, buffer, lambda b=buffer, f=field: self.found.setdefault(f, ''.join(b).strip()))
+                return
+        if self.item is not None and tag == 'span':
+            buffer = []
+            self.item['last_span'] = buffer
+            self._open(tag, buffer)
+            return
+        self._open(tag)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or not any(t == tag for t, _, _ in self.stack):
+            return
+        while self.stack:
+            name, buffer, on_close = self.stack.pop()
+            if buffer is not None:
+                self.buffers.pop()
+            if on_close is not None:
+                on_close()
+            depth = len(self.stack)
+            self.sections = [s for s in self.sections if s[2] < depth]
+            if self.item is not None and self.item['depth'] == depth:
+                self._close_item()
+            if name == tag:
+                break
+        if not self.stack or self.done:
+            raise _Done
+
+    def _close_item(self):
+        item, self.item = self.item, None
+        for label, field in self.labels.items():
+            if field not in self.found and label in item['texts'] and item['last_span'] is not None:
+                self.found[field] = ''.join(item['last_span']).strip()
+
+    def handle_data(self, data):
+        for buffer in self.buffers:
+            buffer.append(data)
+        if self.item is not None:
+            self.item['texts'].add(data.strip())
+
+
+def _scripts(pattern, html):
+    for raw in pattern.findall(html):
+        try:
+            yield json.loads(raw)
+        except ValueError:
+            continue
+
+
+def extract(html, fields):
+    # все запрошенные поля за один проход; неизвестные поля -> None
+    result = {field: None for field in fields}
+    pending = {field: FIELDS[field] for field in fields if field in FIELDS}
+
+    next_data = next(_scripts(NEXT_DATA_RE, html), None) if any(f.next_data for f in pending.values()) else None
+    json_ld = []
+    if any(f.json_ld for f in pending.values()):
+        for block in _scripts(JSON_LD_RE, html):
+            json_ld.extend(block if isinstance(block, list) else [block])
+
+    for name, field in list(pending.items()):
+        value = None
+        if field.next_data and next_data is not None:
+            value = field.next_data(next_data)
+        if value is None and field.json_ld:
+            for block in json_ld:
+                if isinstance(block, dict):
+                    value = field.json_ld(block)
+                    if value is not None:
+                        break
+        if value is not None:
+            result[name] = str(value)
+            del pending[name]
+
+    result.update(_scan(html, {name: field.dom for name, field in pending.items() if field.dom}))
+    return result
+
+
+def _starts(html, rule):
+    # начала элементов, внутри которых может сработать правило
+    if isinstance(rule, LabeledItem):
+        marker = f'>{rule.label}<'
+        pos = html.find(marker)
+        while pos != -1:
+            item = html.rfind(METADATA_ITEM, 0, pos)
+            start = html.rfind('<li', 0, item) if item != -1 else -1
+            if start != -1:
+                yield start
+            pos = html.find(marker, pos + 1)
+    else:
+        for quote in '"\'':
+            pos = html.find(f'data-testid={quote}{rule.testid}{quote}')
+            if pos != -1:
+                yield html.rfind('<', 0, pos)
+
+
+def _scan(html, rules):
+    # кандидаты всех правил по возрастанию позиции; кандидат внутри уже разобранного
+    # элемента пропускается — его правила проверены в том же проходе
+    if not rules:
+        return {}
+    scanner = DomScanner(rules)
+    end = -1
+    for start in sorted({s for rule in rules.values() for s in _starts(html, rule) if s != -1}):
+        if start < end:
+            continue
+        end = scanner.scan(html, start)
+        if scanner.done:
+            break
+    return {name: scanner.found.get(name) or None for name in rules}
@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import Metrics
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_2_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.3 Safari/605.1.15",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Connection": "keep-alive",
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    # равномерный интервал между запросами: не чаще rate в секунду
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError(f"Неверное значение rate: {rate}")
+        self.interval = 1.0 / rate
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Fetcher:
+    # пул соединений httpx + пул потоков, лимит запросов на хост, повторы с backoff
+    def __init__(self, concurrency=8, rate=5.0, retries=3, backoff=0.5, timeout=10.0, headers=None,
+                 max_backoff=60.0):
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError(f"Неверное значение concurrency: {concurrency}")
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.client = httpx.Client(
+            headers=headers or DEFAULT_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    def _limiter(self, url):
+        if not self.rate:
+            return None
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = RateLimiter(self.rate)
+            return self.limiters[host]
+
+    def _delay(self, attempt, response=None):
+        # Retry-After от сервера тоже ограничен max_backoff: один неверный заголовок
+        # не должен останавливать загрузку на часы
+        delay = self.backoff * 2 ** attempt
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = float(retry_after)
+        return min(delay, self.max_backoff)
+
+    def fetch(self, url):
+        limiter = self._limiter(url)
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            if limiter:
+                limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.client.get(url)
+            except httpx.HTTPError as e:
+                Metrics.http(host, time.perf_counter() - start, 'error')
+                if attempt == self.retries:
+                    print(f"[ERROR] Не удалось загрузить {url}: {e}")
+                    return None
+                time.sleep(self._delay(attempt))
+                continue
+            Metrics.http(host, time.perf_counter() - start, response.status_code)
+            if response.status_code == 200:
+                return response.text
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                print(f"[ERROR] Не удалось загрузить {url}: код {response.status_code}")
+                return None
+            time.sleep(self._delay(attempt, response))
+        return None
+
+    def fetch_many(self, urls):
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, max(len(urls), 1))) as pool:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
@@ -0,0 +1,112 @@
+from array import array
+from collections import Counter
+from itertools import compress
+from operator import and_
+
+
+class GenreIndex:
+    # жанры фильма — битовая маска над словарём жанров: бит i означает жанр names[i].
+    # Подсчёты идут по различным маскам (их на порядки меньше, чем фильмов)
+    MAX_GENRES = 64
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.movie_ids = array('i')
+        self.masks = array('Q')
+        self.titles = []
+        self.years = array('i')
+
+    @classmethod
+    def build(cls, rows):
+        index = cls()
+        for m in rows:
+            index.add(m['movieID'], m['title'], m['release'], m['genres'])
+        return index
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def intern(self, genre):
+        bit = self.ids.get(genre)
+        if bit is None:
+            if len(self.names) >= self.MAX_GENRES:
+                raise ValueError(f"Слишком много жанров для битовой маски: {genre}")
+            bit = self.ids[genre] = len(self.names)
+            self.names.append(genre)
+        return bit
+
+    def add(self, movie_id, title, year, genres):
+        mask = 0
+        for genre in genres:
+            mask |= 1 << self.intern(genre)
+        self.movie_ids.append(movie_id)
+        self.masks.append(mask)
+        self.titles.append(title)
+        self.years.append(year if year is not None else -1)
+
+    def mask(self, genres):
+        # неизвестный жанр -> None: ни один фильм его не содержит
+        mask = 0
+        for genre in genres:
+            bit = self.ids.get(genre)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def mask_counts(self):
+        return Counter(self.masks)
+
+    def counts(self):
+        # число фильмов на жанр; порядок жанров — порядок первого появления
+        result = dict.fromkeys(self.names, 0)
+        for mask, n in self.mask_counts().items():
+            for bit, name in enumerate(self.names):
+                if mask >> bit & 1:
+                    result[name] += n
+        return result
+
+    def sizes(self):
+        return map(int.bit_count, self.masks)
+
+    def matching(self, any_of=None, all_of=None):
+        # множество масок, проходящих фильтр: хотя бы один из any_of и все из all_of
+        masks = set(self.masks)
+        if all_of:
+            required = self.mask(all_of)
+            if required is None:
+                return set()
+            masks = {m for m in masks if m & required == required}
+        if any_of:
+            wanted = 0
+            for genre in any_of:
+                bit = self.ids.get(genre)
+                if bit is not None:
+                    wanted |= 1 << bit
+            masks = {m for m in masks if m & wanted}
+        return masks
+
+    def select(self, any_of=None, all_of=None, years=None):
+        # years — пара (с, по) включительно
+        masks = self.matching(any_of, all_of)
+        flags = map(masks.__contains__, self.masks)
+        if years is not None:
+            low, high = years
+            flags = map(and_, flags, map(range(low, high + 1).__contains__, self.years))
+        return array('i', compress(self.movie_ids, flags))
+
+    def labels(self):
+        # название, а для совпадающих названий (ремейки) — название с годом
+        repeated = Counter(self.titles)
+        labels = []
+        for title, year in zip(self.titles, self.years):
+            if repeated[title] > 1:
+                title = f"{title} ({year})" if year != -1 else title
+            labels.append(title)
+        repeated = Counter(labels)
+        return [f"{label} [{movie_id}]" if repeated[label] > 1 else label
+                for label, movie_id in zip(labels, self.movie_ids)]
+
+    def by_movie(self):
+        return dict(zip(self.movie_ids, self.masks))
@@ -0,0 +1,143 @@
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# шаг оценок MovieLens: 0.5..5.0, то есть не больше 10 различных значений
+STEP = 0.5
+
+
+class GroupStats:
+    # агрегаты по группам: count, sum, сумма квадратов, min/max и гистограмма точных значений
+    # (значение -> число). Гистограмма мала, только пока значения лежат на сетке step: для
+    # оценок с шагом 0.5 это не больше 10 корзин, дописывание и слияние стоят O(групп × корзин),
+    # а медиана по гистограмме точная
+    def __init__(self, step=STEP):
+        # значение не кратное step — ValueError; step=None снимает проверку, тогда гистограмма
+        # растёт с числом различных значений группы
+        self.step = step
+        self.counts = {}
+        self.sums = {}
+        self.sumsq = {}
+        self.mins = {}
+        self.maxs = {}
+        self.histograms = {}
+
+    @classmethod
+    def build(cls, keys, values, step=STEP):
+        return cls(step).update(keys, values)
+
+    def update(self, keys, values):
+        # пары (группа, значение) считаются на C, дальше цикл только по различным парам
+        step = self.step
+        for (key, value), n in Counter(zip(keys, values)).items():
+            if step is not None and (value / step) % 1:
+                raise ValueError(f"Значение {value} не кратно шагу {step}")
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.counts[key] = n
+                self.sums[key] = value * n
+                self.sumsq[key] = value * value * n
+                self.mins[key] = self.maxs[key] = value
+                self.histograms[key] = {value: n}
+            else:
+                self.counts[key] += n
+                self.sums[key] += value * n
+                self.sumsq[key] += value * value * n
+                if value < self.mins[key]:
+                    self.mins[key] = value
+                elif value > self.maxs[key]:
+                    self.maxs[key] = value
+                histogram[value] = histogram.get(value, 0) + n
+        return self
+
+    def merge(self, other):
+        # частичные агрегаты складываются вместе с гистограммами, поэтому медиана
+        # после слияния точная
+        for key, n in other.counts.items():
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.counts[key] = n
+                self.sums[key] = other.sums[key]
+                self.sumsq[key] = other.sumsq[key]
+                self.mins[key] = other.mins[key]
+                self.maxs[key] = other.maxs[key]
+                self.histograms[key] = dict(other.histograms[key])
+            else:
+                self.counts[key] += n
+                self.sums[key] += other.sums[key]
+                self.sumsq[key] += other.sumsq[key]
+                self.mins[key] = min(self.mins[key], other.mins[key])
+                self.maxs[key] = max(self.maxs[key], other.maxs[key])
+                for value, count in other.histograms[key].items():
+                    histogram[value] = histogram.get(value, 0) + count
+        return self
+
+    @classmethod
+    def build_parallel(cls, parts, workers, step=STEP):
+        # map: каждая часть (keys, values) агрегируется в отдельном процессе и возвращает
+        # только счётчики и гистограммы; reduce: результаты сливаются в порядке частей,
+        # как при последовательном update
+        stats = cls(step)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for keys, values in parts:
+                pending.append(pool.submit(cls.build, keys, values, step))
+                if len(pending) >= 2 * workers:
+                    stats.merge(pending.popleft().result())
+            while pending:
+                stats.merge(pending.popleft().result())
+        return stats
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def keys(self):
+        return self.counts.keys()
+
+    def count(self, key):
+        return self.counts.get(key, 0)
+
+    def mean(self, key):
+        n = self.counts.get(key, 0)
+        return self.sums[key] / n if n else 0
+
+    def median(self, key):
+        n = self.counts.get(key, 0)
+        if not n:
+            return 0
+        # значения с позиций (n-1)//2 и n//2 отсортированного ряда по накопленным счётчикам
+        low = high = None
+        seen = 0
+        for value, count in sorted(self.histograms[key].items()):
+            seen += count
+            if low is None and seen > (n - 1) // 2:
+                low = value
+            if seen > n // 2:
+                high = value
+                break
+        return low if n % 2 == 1 else (low + high) / 2
+
+    def variance(self, key):
+        n = self.counts.get(key, 0)
+        if not n:
+            return 0
+        s = self.sums[key]
+        return max((n * self.sumsq[key] - s * s) / (n * n), 0.0)
+
+    def sorted_values(self, key):
+        values = array('f')
+        for value, count in sorted(self.histograms.get(key, {}).items()):
+            values.extend([value] * count)
+        return values
+
+    def means(self, min_count=1):
+        return {key: self.mean(key) for key, n in self.counts.items() if n >= min_count}
+
+    def medians(self, min_count=1):
+        return {key: self.median(key) for key, n in self.counts.items() if n >= min_count}
+
+    def variances(self, min_count=1):
+        return {key: self.variance(key) for key, n in self.counts.items() if n >= min_count}
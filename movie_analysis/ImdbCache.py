@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from . import Metrics
+
+CACHE_NAME = '.imdb_cache.sqlite'
+DEFAULT_PATH = './' + CACHE_NAME
+DAY = 86400
+
+
+class ImdbCache:
+    # постоянный кэш страниц IMDb: сжатый html + извлечённые поля, TTL и вытеснение LRU
+    def __init__(self, path=DEFAULT_PATH, ttl=30 * DAY, max_bytes=256 * 1024 * 1024, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " imdb_id INTEGER PRIMARY KEY,"
+            " html BLOB,"
+            " fields TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_lru ON pages (accessed_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def default_path(source):
+        # кэш по умолчанию лежит рядом с набором данных, а не в текущем каталоге
+        return os.path.join(os.path.dirname(source) or '.', CACHE_NAME)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def total_bytes(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def _expired(self, fetched_at, now):
+        # в offline-режиме устаревшие записи всё равно лучше, чем ничего
+        return self.ttl is not None and not self.offline and now - fetched_at > self.ttl
+
+    def get(self, imdb_id):
+        # -> (html или None, dict полей) или None
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT html, fields, fetched_at FROM pages WHERE imdb_id = ?", (imdb_id,)
+            ).fetchone()
+            if row is None:
+                Metrics.cache('imdb', False)
+                return None
+            html, fields, fetched_at = row
+            if self._expired(fetched_at, now):
+                self.conn.execute("DELETE FROM pages WHERE imdb_id = ?", (imdb_id,))
+                self.conn.commit()
+                Metrics.cache('imdb', False)
+                return None
+            Metrics.cache('imdb', True)
+            self.conn.execute("UPDATE pages SET accessed_at = ? WHERE imdb_id = ?", (now, imdb_id))
+            self.conn.commit()
+        html = zlib.decompress(html).decode('utf-8') if html is not None else None
+        return html, json.loads(fields)
+
+    def put(self, imdb_id, html, fields):
+        now = time.time()
+        blob = zlib.compress(html.encode('utf-8')) if html is not None else None
+        raw_fields = json.dumps(fields, ensure_ascii=False)
+        size = len(raw_fields) + (len(blob) if blob is not None else 0)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (imdb_id, html, fields, size, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (imdb_id, blob, raw_fields, size, now, now),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def update_fields(self, imdb_id, fields):
+        raw_fields = json.dumps(fields, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET fields = ?, size = ? + COALESCE(LENGTH(html), 0) WHERE imdb_id = ?",
+                (raw_fields, len(raw_fields), imdb_id),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT imdb_id, size FROM pages ORDER BY accessed_at").fetchall()
+        evicted = []
+        for imdb_id, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((imdb_id,))
+            total -= size
+        self.conn.executemany("DELETE FROM pages WHERE imdb_id = ?", evicted)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM pages")
+            self.conn.commit()
@@ -0,0 +1,117 @@
+import re
+from array import array
+
+MISSING = -1
+
+# от длинных префиксов к коротким: "CA$" не должен читаться как "$"
+CURRENCY_PREFIXES = [
+    ('CA$', 'CAD'), ('A$', 'AUD'), ('NZ$', 'NZD'), ('HK$', 'HKD'), ('R$', 'BRL'), ('MX$', 'MXN'),
+    ('$', 'USD'), ('€', 'EUR'), ('£', 'GBP'), ('¥', 'JPY'), ('₹', 'INR'), ('₩', 'KRW'), ('₽', 'RUB'),
+]
+AMOUNT_RE = re.compile(r'\d[\d,]*')
+CODE_RE = re.compile(r'[A-Z]{3}')
+HOURS_RE = re.compile(r'(\d+)\s*(?:hours?|hrs?|h)\b')
+MINUTES_RE = re.compile(r'(\d+)\s*(?:minutes?|mins?|m)\b')
+
+
+def parse_money(raw):
+    # "$63,000,000 (estimated)" -> (63000000, 'USD'); "DKK 10,000,000" -> (10000000, 'DKK')
+    if not raw:
+        return None, None
+    raw = raw.strip()
+    amount = AMOUNT_RE.search(raw)
+    if not amount:
+        return None, None
+    head = raw[:amount.start()].strip()
+    currency = next((code for prefix, code in CURRENCY_PREFIXES if head == prefix), None)
+    if currency is None:
+        code = CODE_RE.fullmatch(head)
+        currency = code.group(0) if code else None
+    if currency is None:
+        return None, None
+    return int(amount.group(0).replace(',', '')), currency
+
+
+def parse_runtime(raw):
+    # "1 hour 21 minutes" / "1h 21m" / "81 min" -> 81
+    if not raw:
+        return None
+    text = raw.lower().replace(',', '')
+    hours = HOURS_RE.search(text)
+    minutes = MINUTES_RE.search(text)
+    if not hours and not minutes:
+        return None
+    return (int(hours.group(1)) if hours else 0) * 60 + (int(minutes.group(1)) if minutes else 0)
+
+
+class ImdbFacts:
+    # нормализованные числовые факты IMDb: по строке на фильм, колонки-массивы
+    def __init__(self):
+        self.movie_ids = array('i')
+        self.budgets = array('q')
+        self.budget_currencies = array('H')
+        self.grosses = array('q')
+        self.gross_currencies = array('H')
+        self.runtimes = array('i')
+        self.currencies = [None]
+        self.currency_codes = {None: 0}
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def _currency(self, code):
+        if code not in self.currency_codes:
+            self.currency_codes[code] = len(self.currencies)
+            self.currencies.append(code)
+        return self.currency_codes[code]
+
+    def update(self, movie_data):
+        movie_id = movie_data['movie_id']
+        if movie_id not in self.rows:
+            self.rows[movie_id] = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+            self.budgets.append(MISSING)
+            self.budget_currencies.append(0)
+            self.grosses.append(MISSING)
+            self.gross_currencies.append(0)
+            self.runtimes.append(MISSING)
+        row = self.rows[movie_id]
+        if "Budget" in movie_data:
+            amount, currency = parse_money(movie_data["Budget"])
+            self.budgets[row] = amount if amount is not None else MISSING
+            self.budget_currencies[row] = self._currency(currency)
+        if "Cumulative Worldwide Gross" in movie_data:
+            amount, currency = parse_money(movie_data["Cumulative Worldwide Gross"])
+            self.grosses[row] = amount if amount is not None else MISSING
+            self.gross_currencies[row] = self._currency(currency)
+        if "Runtime" in movie_data:
+            minutes = parse_runtime(movie_data["Runtime"])
+            self.runtimes[row] = minutes if minutes is not None else MISSING
+
+    def budget(self, currency='USD'):
+        code = self.currency_codes.get(currency)
+        return {
+            m: b for m, b, c in zip(self.movie_ids, self.budgets, self.budget_currencies)
+            if c == code and b != MISSING
+        }
+
+    def profit(self, currency='USD'):
+        code = self.currency_codes.get(currency)
+        return {
+            m: g - b
+            for m, b, bc, g, gc in zip(self.movie_ids, self.budgets, self.budget_currencies,
+                                       self.grosses, self.gross_currencies)
+            if bc == code and gc == code and b > 0 and g != MISSING
+        }
+
+    def runtime(self):
+        return {m: r for m, r in zip(self.movie_ids, self.runtimes) if r != MISSING}
+
+    def cost_per_minute(self, currency='USD'):
+        code = self.currency_codes.get(currency)
+        return {
+            m: round(b / r, 2)
+            for m, b, c, r in zip(self.movie_ids, self.budgets, self.budget_currencies, self.runtimes)
+            if c == code and b != MISSING and r > 0
+        }
@@ -1,121 +1,237 @@
 
 import os
-import requests
-from bs4 import BeautifulSoup
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+from array import array
+from itertools import islice, repeat
+from . import BinaryCache
+from . import Metrics
 from collections import Counter
+from .Catalog import Catalog
+from .Extractors import extract
+from .Fetcher import Fetcher
+from .ImdbCache import ImdbCache
+from .ImdbFacts import ImdbFacts
+from . import Sampling
+from .Reader import DEFAULT_CHUNK_SIZE, batched, read_rows
+from .TopK import top_k
 
 
+@Metrics.instrument
 class Links:
-    def __init__(self, path='./ml-latest-small/links.csv', limit=1000):
+    CACHE_SCHEMA = 'links/1'
+    SAMPLE_KEYS = {'movie': 0}
+
+    IMDB_URL = 'https://www.imdb.com'
+
+    def __init__(self, path='./ml-latest-small/links.csv', limit=Sampling.DEFAULT_LIMIT, movies_path=None,
+                 stream=False, chunk_size=DEFAULT_CHUNK_SIZE, cache=False, imdb_url=IMDB_URL,
+                 fetcher=None, imdb_cache=None, sample=None):
         if not os.path.isfile(path) or os.path.getsize(path) == 0:
             raise FileNotFoundError(f"Файл не найден или пустой: {path}")
+        if sample is not None and not isinstance(sample, Sampling.Sampler):
+            raise TypeError("sample должен быть выборкой из модуля Sampling")
         
         self.path = path
-        self.limit = limit
+        self.limit = Sampling.resolve_limit(limit, sample)
+        self.movies_path = movies_path or Catalog.default_path(path)
+        self.stream = stream
+        self.chunk_size = chunk_size
         self.links = {}
+        self._sorted_ids = None
         self.imdb_info=[]
-        self.load()
+        self.imdb_url = imdb_url.rstrip('/')
+        self.fetcher = fetcher
+        # None — кэш по умолчанию (рядом с links.csv), False — без кэша
+        self.imdb_cache = imdb_cache
+        # закрываются в close() только созданные здесь клиент и кэш, переданные — владельцем
+        self._own_fetcher = fetcher is None
+        self._own_cache = imdb_cache is None
+        self._imdb_by_movie = {}
+        self.imdb_facts = ImdbFacts()
+        self.cache = cache
+        self.sample = sample
+        self._select = sample.selector(self.SAMPLE_KEYS) if sample is not None else None
+        if self.stream:
+            pass
+        elif self.cache and self.sample is None:
+            self.load_cached()
+        else:
+            self.load()
+
+    @staticmethod
+    def parse_record(fields):
+        movieId, imdbId, _ = fields
+        return int(movieId), int(imdbId)
+
+    def read_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        for chunk in batched(read_rows(self.path, self.parse_record, self.limit, self._select), chunk_size):
+            yield dict(chunk)
 
     def load(self):
-        with open(self.path, 'r', encoding='utf-8') as f:
-            next(f)
-            for i, line in enumerate(f):
-                if i >= self.limit:
-                    break
-                try:
-                    movieId, imdbId, _ = line.strip().split(',', 2)
-                    self.links[int(movieId)] = int(imdbId)
-                except Exception as e:
-                    print("Ошибка разбора:",i+2, line)
-                    print("→", e)
-                    continue
+        for chunk in self.read_chunks(self.chunk_size):
+            self.links.update(chunk)
     
+    def build_columns(self):
+        columns = {'movieId': array('i'), 'imdbId': array('i')}
+        for movie_id, imdb_id in read_rows(self.path, self.parse_record):
+            columns['movieId'].append(movie_id)
+            columns['imdbId'].append(imdb_id)
+        return columns
+
+    def load_cached(self):
+        columns = BinaryCache.load_or_build(self.path, self.CACHE_SCHEMA, self.build_columns)
+        self.links.update(islice(zip(columns['movieId'], columns['imdbId']), self.limit))
+
+    def chunks(self):
+        # в режиме stream данные читаются из файла блоками, иначе — один блок из памяти
+        if self.stream:
+            yield from self.read_chunks(self.chunk_size)
+        else:
+            Metrics.add(len(self.links))
+            yield self.links
+
     def get_links(self):
-        return self.links.copy()
+        # представление только для чтения, изменения self.links в нём видны сразу
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        return MappingProxyType(self.links)
+
+    @property
+    def population(self):
+        # размеры страт в полном файле по итогам отбора; None без выборки
+        return self._select.population if self._select is not None else None
+
+    def rows(self):
+        for chunk in self.chunks():
+            yield from chunk.items()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # http-клиент и кэш IMDb, созданные get_imdb; при следующем вызове создаются заново
+        if self._own_fetcher and self.fetcher is not None:
+            self.fetcher.close()
+            self.fetcher = None
+        if self._own_cache and self.imdb_cache is not None:
+            self.imdb_cache.close()
+            self.imdb_cache = None
+
+    def by_id(self, low, high):
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        if self._sorted_ids is None:
+            self._sorted_ids = array('i', sorted(self.links))
+        ids = self._sorted_ids
+        return {movie_id: self.links[movie_id]
+                for movie_id in ids[bisect_left(ids, low):bisect_right(ids, high)]}
+
+    def movie_ids_where(self):
+        return {movie_id for movie_id, _ in self.rows()}
+
+    def imdb_ids(self, movie_ids):
+        # movieId -> imdbId для нужных фильмов; в режиме stream — одним проходом по файлу
+        if not self.stream:
+            return self.links
+        wanted = set(movie_ids)
+        return {movie_id: imdb_id for movie_id, imdb_id in self.rows() if movie_id in wanted}
+
+    def estimate_counts(self, key=None, z=Sampling.Z):
+        # число ссылок в полном файле (key=None) или по фильмам (key='movie')
+        if key not in (None, 'movie'):
+            raise ValueError(f"Неверное значние аргумента: {key}")
+        ids = [movie_id for movie_id, _ in self.rows()]
+        stratified = self._select is not None and self._select.key == 'movie'
+        strata = ids if stratified else repeat(None, len(ids))
+        groups = ids if key == 'movie' else repeat(None, len(ids))
+        population = self.population if self._select is not None else {None: len(ids)}
+        return Sampling.estimate_totals(population, strata, groups, z)
+
+    def get_titles(self):
+        return Catalog.get(self.movies_path).titles
+
+    def imdb_page_url(self, imdb_id):
+        return f"{self.imdb_url}/title/tt{imdb_id:07d}/"
+
+    def parse_imdb(self, movie_id, html, list_of_fields):
+        return {'movie_id': movie_id, **extract(html, list_of_fields)}
+
+    def _cache(self):
+        if self.imdb_cache is None:
+            self.imdb_cache = ImdbCache(ImdbCache.default_path(self.path))
+        return self.imdb_cache if self.imdb_cache is not False else None
+
+    def _from_cache(self, cache, movie_id, imdb_id, list_of_fields):
+        entry = cache.get(imdb_id)
+        if entry is None:
+            return None
+        html, fields = entry
+        if all(field in fields for field in list_of_fields):
+            return {'movie_id': movie_id, **{field: fields[field] for field in list_of_fields}}
+        if html is None:
+            return None
+        movie_data = self.parse_imdb(movie_id, html, list_of_fields)
+        fields.update({k: v for k, v in movie_data.items() if k != 'movie_id'})
+        cache.update_fields(imdb_id, fields)
+        return movie_data
 
     def get_imdb(self, list_of_movies, list_of_fields=None):
-        if len(list_of_movies) > 20:
-            raise ValueError("Слишком много фильмов. Разбей список на части по 20 или меньше.")
-
         if not isinstance(list_of_movies,list):
             raise TypeError("Не верный тип данных в аргументах")
 
         if list_of_fields is None:
             list_of_fields = ["Director", "Budget", "Cumulative Worldwide Gross", "Runtime"]
 
-        self.imdb_info=[]
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_2_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.3 Safari/605.1.15",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Connection": "keep-alive",
-        }
-
+        cache = self._cache()
+        imdb_ids = self.imdb_ids(list_of_movies)
+        results = {}
+        urls = {}
         for movie_id in list_of_movies:
-            imdb_id = self.links.get(movie_id)
+            imdb_id = imdb_ids.get(movie_id)
             if not imdb_id:
                 continue
-
-            url = f"https://www.imdb.com/title/tt{imdb_id:07d}/"
-            print("Запрашиваем:", url)
-
-            try:
-                response = requests.get(url, headers=headers)
-                if response.status_code != 200:
-                    print(f"[ERROR] [{movie_id}] Не удалось загрузить {url}: код {response.status_code}")
+            if cache is not None:
+                try:
+                    cached = self._from_cache(cache, movie_id, imdb_id, list_of_fields)
+                except Exception as e:
+                    print(f"Ошибка для {movie_id}: {e}")
+                    cached = None
+                if cached is not None:
+                    results[movie_id] = cached
                     continue
-
-                soup = BeautifulSoup(response.text, 'html.parser')
-                movie_data = {'movie_id': movie_id}
-
-                for field in list_of_fields:
-                    if field == "Director":
-                        director = None
-                        section = soup.find(attrs={"data-testid": "title-pc-principal-credit"})
-                        if section:
-                            name_tag = section.find("a")
-                            if name_tag:
-                                director = name_tag.text.strip()
-                        movie_data["Director"] = director
-
-                    elif field == "Budget":
-                        budget = None
-                        for li in soup.find_all("li", class_="ipc-metadata-list__item"):
-                            if li.find(string="Budget"):
-                                val = li.find_all("span")[-1]
-                                if val:
-                                    budget = val.text.strip()
-                                break
-                        movie_data["Budget"] = budget
-                    elif field == "Cumulative Worldwide Gross":
-                        gross = None
-                        for li in soup.find_all("li", class_="ipc-metadata-list__item"):
-                            if li.find(string="Gross worldwide"):
-                                val = li.find_all("span")[-1]
-                                if val:
-                                    gross = val.text.strip()
-                                break
-                        movie_data["Cumulative Worldwide Gross"] = gross
-
-                    elif field == "Runtime":
-                        runtime = None
-                        tech = soup.find("li", attrs={"data-testid": "title-techspec_runtime"})
-                        if tech:
-                            time_tag = tech.find("div")
-                            if time_tag:
-                                runtime = time_tag.text.strip()
-                        movie_data["Runtime"] = runtime
-
-                    else:
-                        movie_data[field] = None  
-                self.imdb_info.append(movie_data)
-
+                if cache.offline:
+                    continue
+            urls[movie_id] = self.imdb_page_url(imdb_id)
+
+        if urls:
+            if self.fetcher is None:
+                self.fetcher = Fetcher()
+            pages = self.fetcher.fetch_many(urls.values())
+        else:
+            pages = {}
+        for movie_id, url in urls.items():
+            html = pages.get(url)
+            if html is None:
+                continue
+            try:
+                movie_data = self.parse_imdb(movie_id, html, list_of_fields)
             except Exception as e:
                 print(f"Ошибка для {movie_id}: {e}")
                 continue
-
-        self.imdb_info.sort(key=lambda x: x['movie_id'], reverse=True)
+            results[movie_id] = movie_data
+            if cache is not None:
+                fields = {k: v for k, v in movie_data.items() if k != 'movie_id'}
+                cache.put(imdb_ids[movie_id], html, fields)
+
+        # новые результаты дополняют старые, а не затирают их
+        for movie_id, movie_data in results.items():
+            self._imdb_by_movie.setdefault(movie_id, {}).update(movie_data)
+            self.imdb_facts.update(movie_data)
+        self.imdb_info = sorted(self._imdb_by_movie.values(), key=lambda x: x['movie_id'], reverse=True)
         return self.imdb_info
     
     def _ensure_data_loaded(self):
@@ -132,111 +248,34 @@ class Links:
                 counter[m["Director"]] += 1
         return dict(counter.most_common(n))
 
-    def most_expensive(self, n=5):
+    @staticmethod
+    def _top(data, n):
+        # при равенстве значений — больший movie_id первым, как в порядке imdb_info
+        return dict(top_k(data.items(), n, key=lambda x: (x[1], x[0])))
+
+    def most_expensive(self, n=5, currency='USD'):
         if  not isinstance(n, int) or n<=0:
             raise ValueError(f"Неверное значние аргумента: {n}")
         self._ensure_data_loaded()
-        data = {}
-        for m in self.imdb_info:
-            raw = m.get("Budget")
-            if raw and "$" in raw:
-                digits = ''.join(c for c in raw if c.isdigit())
-                if digits:
-                    data[m["movie_id"]] = int(digits)
-        return dict(sorted(data.items(), key=lambda x: x[1], reverse=True)[:n])
-
-    def most_profitable(self, n=5):
+        return self._top(self.imdb_facts.budget(currency), n)
+
+    def most_profitable(self, n=5, currency='USD'):
         if  not isinstance(n, int) or n<=0:
             raise ValueError(f"Неверное значние аргумента: {n}")
         self._ensure_data_loaded()
-        data = {}
-        for m in self.imdb_info:
-            raw_budget = m.get("Budget")
-            raw_gross = m.get("Cumulative Worldwide Gross")
-            if raw_budget and raw_gross and "$" in raw_budget and "$" in raw_gross:
-                b = int(''.join(c for c in raw_budget if c.isdigit()))
-                if b == 0:
-                    continue
-                g = int(''.join(c for c in raw_gross if c.isdigit()))
-                data[m["movie_id"]] = g - b
-        return dict(sorted(data.items(), key=lambda x: x[1], reverse=True)[:n])
+        return self._top(self.imdb_facts.profit(currency), n)
 
     def longest(self, n=5):
         if  not isinstance(n, int) or n<=0:
             raise ValueError(f"Неверное значние аргумента: {n}")
         self._ensure_data_loaded()
-        data = {}
+        return self._top(self.imdb_facts.runtime(), n)
 
-        for m in self.imdb_info:
-            r = m.get("Runtime")
-            movie_id = m.get("movie_id")
-
-            if r and movie_id:
-                try:
-                    h = 0
-                    mnt = 0
-                    parts = r.lower().replace(",", "").split()
-
-                    if "hour" in parts or "hours" in parts:
-                        h_index = parts.index("hour") if "hour" in parts else parts.index("hours")
-                        h = int(parts[h_index - 1])
-
-                    if "minute" in parts or "minutes" in parts:
-                        m_index = parts.index("minute") if "minute" in parts else parts.index("minutes")
-                        mnt = int(parts[m_index - 1])
-
-                    total = h * 60 + mnt
-                    data[movie_id] = total
-
-                except Exception as e:
-                    print(f"Ошибка при обработке '{r}': {e}")
-
-        return dict(sorted(data.items(), key=lambda x: x[1], reverse=True)[:n])
-
-    def top_cost_per_minute(self, n=5):
+    def top_cost_per_minute(self, n=5, currency='USD'):
         if  not isinstance(n, int) or n<=0:
             raise ValueError(f"Неверное значние аргумента: {n}")
         self._ensure_data_loaded()
-        data = {}
-
-        for m in self.imdb_info:
-            r = m.get("Runtime", "")
-            b = m.get("Budget", "")
-            movie_id = m.get("movie_id")
-
-            if not (r and b and "$" in b and movie_id):
-                continue
-
-            try:
-                h = 0
-                minut = 0
-                parts = r.lower().replace(",", "").split()
-
-                if "hour" in parts or "hours" in parts:
-                    h_index = parts.index("hour") if "hour" in parts else parts.index("hours")
-                    h = int(parts[h_index - 1])
-
-                if "minute" in parts or "minutes" in parts:
-                    m_index = parts.index("minute") if "minute" in parts else parts.index("minutes")
-                    minut = int(parts[m_index - 1])
-
-                total_min = h * 60 + minut
-                if total_min == 0:
-                    continue  
-
-                digits = ''.join(c for c in b if c.isdigit())
-                if not digits:
-                    continue
-                budget_val = int(digits)
-
-                cost = round(budget_val / total_min, 2)
-                data[movie_id] = cost
-
-            except (ValueError, IndexError) as e:
-                print(f"Ошибка при обработке '{r}' / '{b}': {e}")
-                continue
-
-        return dict(sorted(data.items(), key=lambda x: x[1], reverse=True)[:n])
+        return self._top(self.imdb_facts.cost_per_minute(currency), n)
 
 
 if __name__=='__main__':
@@ -0,0 +1,245 @@
+import contextvars
+import functools
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from types import GeneratorType
+
+# опциональные метрики: по умолчанию выключены, и обёртка методов сводится к одной проверке флага
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+FIELDS = ('calls', 'errors', 'wall_s', 'rows', 'bytes', 'alloc_bytes')
+
+_enabled = False
+_own_tracing = False
+_lock = threading.Lock()
+_methods = {}
+_caches = {}
+_http = {}
+# методы, которые сейчас выполняются: строки и байты засчитываются каждому из них
+_active = contextvars.ContextVar('movielens_active_methods', default=())
+_registry = None
+
+
+def enable(allocations=False):
+    # allocations=True включает tracemalloc: это заметно замедляет код, поэтому отдельно
+    global _enabled, _own_tracing
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _own_tracing = True
+    _enabled = True
+
+
+def disable():
+    global _enabled, _own_tracing
+    _enabled = False
+    if _own_tracing:
+        tracemalloc.stop()
+        _own_tracing = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _methods.clear()
+        _caches.clear()
+        _http.clear()
+
+
+def _record(name):
+    with _lock:
+        record = _methods.get(name)
+        if record is None:
+            record = _methods[name] = dict.fromkeys(FIELDS, 0)
+        return record
+
+
+def _call(record, func, args, kwargs):
+    token = _active.set(_active.get() + (record,))
+    tracing = tracemalloc.is_tracing()
+    before = tracemalloc.get_traced_memory()[0] if tracing else 0
+    start = time.perf_counter()
+    failed = False
+    try:
+        result = func(*args, **kwargs)
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        # прирост занятой памяти за вызов, без учёта освобождённого до выхода
+        allocated = tracemalloc.get_traced_memory()[0] - before if tracing else 0
+        _active.reset(token)
+        with _lock:
+            record['calls'] += 1
+            record['errors'] += failed
+            record['wall_s'] += elapsed
+            record['alloc_bytes'] += allocated
+    if isinstance(result, GeneratorType):
+        return _iterate(record, result)
+    return result
+
+
+def _iterate(record, gen):
+    # генератор работает при итерации, поэтому его время складывается из каждого next()
+    try:
+        while True:
+            token = _active.set(_active.get() + (record,))
+            start = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                _active.reset(token)
+                with _lock:
+                    record['wall_s'] += elapsed
+            yield item
+    finally:
+        gen.close()
+
+
+def instrumented(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        return _call(_record(name), func, args, kwargs)
+    return wrapper
+
+
+def instrument(cls):
+    # декоратор класса: оборачивает __init__ и публичные методы. staticmethod и classmethod
+    # (parse_record вызывается на каждую строку) и свойства не трогаются
+    for name, value in list(vars(cls).items()):
+        if isinstance(value, (staticmethod, classmethod, type)) or not callable(value):
+            continue
+        if name == '__init__' or not name.startswith('_'):
+            setattr(cls, name, instrumented(value))
+    return cls
+
+
+def add(rows=0, nbytes=0):
+    # строки и байты засчитываются всем методам в текущем стеке вызовов
+    if not _enabled:
+        return
+    active = _active.get()
+    if active:
+        with _lock:
+            for record in active:
+                record['rows'] += rows
+                record['bytes'] += nbytes
+
+
+def cache(name, hit):
+    if not _enabled:
+        return
+    with _lock:
+        counts = _caches.get(name)
+        if counts is None:
+            counts = _caches[name] = {'hits': 0, 'misses': 0}
+        counts['hits' if hit else 'misses'] += 1
+
+
+def http(host, seconds, status):
+    # status — код ответа или 'error', если ответа не было
+    if not _enabled:
+        return
+    with _lock:
+        entry = _http.get(host)
+        if entry is None:
+            entry = _http[host] = {'count': 0, 'sum_s': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS), 'statuses': {}}
+        entry['count'] += 1
+        entry['sum_s'] += seconds
+        entry['buckets'][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+
+
+def snapshot():
+    # копия всех метрик; гистограммы HTTP — накопительные, как в Prometheus (le -> число)
+    with _lock:
+        http = {}
+        for host, entry in _http.items():
+            total = 0
+            buckets = {}
+            for le, n in zip(LATENCY_BUCKETS, entry['buckets']):
+                total += n
+                buckets[le] = total
+            http[host] = {'count': entry['count'], 'sum_s': entry['sum_s'],
+                          'buckets': buckets, 'statuses': dict(entry['statuses'])}
+        return {
+            'enabled': _enabled,
+            'methods': {name: dict(record) for name, record in _methods.items()},
+            'caches': {name: dict(counts) for name, counts in _caches.items()},
+            'http': http,
+        }
+
+
+class PrometheusCollector:
+    # prometheus_client импортируется только здесь, без него остальной модуль работает
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+        data = snapshot()
+        families = {
+            'calls': CounterMetricFamily('movielens_method_calls', "Вызовы метода", labels=['method']),
+            'errors': CounterMetricFamily('movielens_method_errors', "Вызовы, завершённые исключением",
+                                          labels=['method']),
+            'wall_s': CounterMetricFamily('movielens_method_seconds', "Суммарное время метода",
+                                          labels=['method']),
+            'rows': CounterMetricFamily('movielens_method_rows', "Прочитанные и просмотренные строки",
+                                        labels=['method']),
+            'bytes': CounterMetricFamily('movielens_method_read_bytes', "Прочитанные байты", labels=['method']),
+            'alloc_bytes': GaugeMetricFamily('movielens_method_alloc_bytes', "Прирост памяти по tracemalloc",
+                                             labels=['method']),
+        }
+        for name, record in data['methods'].items():
+            for field, family in families.items():
+                family.add_metric([name], record[field])
+        yield from families.values()
+
+        hits = CounterMetricFamily('movielens_cache_hits', "Попадания в кэш", labels=['cache'])
+        misses = CounterMetricFamily('movielens_cache_misses', "Промахи кэша", labels=['cache'])
+        for name, counts in data['caches'].items():
+            hits.add_metric([name], counts['hits'])
+            misses.add_metric([name], counts['misses'])
+        yield hits
+        yield misses
+
+        latency = HistogramMetricFamily('movielens_http_request_seconds', "Время HTTP-запроса",
+                                        labels=['host'])
+        responses = CounterMetricFamily('movielens_http_responses', "HTTP-ответы по коду",
+                                        labels=['host', 'status'])
+        for host, entry in data['http'].items():
+            buckets = [('+Inf' if le == float('inf') else str(le), n) for le, n in entry['buckets'].items()]
+            latency.add_metric([host], buckets, entry['sum_s'])
+            for status, n in entry['statuses'].items():
+                responses.add_metric([host, str(status)], n)
+        yield latency
+        yield responses
+
+
+def registry():
+    global _registry
+    if _registry is None:
+        from prometheus_client import CollectorRegistry
+        _registry = CollectorRegistry(auto_describe=False)
+        _registry.register(PrometheusCollector())
+    return _registry
+
+
+def prometheus_text():
+    from prometheus_client import generate_latest
+    return generate_latest(registry()).decode('utf-8')
+
+
+def serve(port=8000, addr='127.0.0.1'):
+    # эндпоинт /metrics в фоновом потоке
+    from prometheus_client import start_http_server
+    return start_http_server(port, addr, registry=registry())
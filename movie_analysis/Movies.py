@@ -1,77 +1,186 @@
+from bisect import bisect_left, bisect_right
 from collections import Counter
 import os
+from array import array
+from itertools import compress
+from . import BinaryCache
+from . import Metrics
+from .GenreIndex import GenreIndex
+from . import Sampling
+from .Reader import DEFAULT_CHUNK_SIZE, batched, read_rows
+from .TopK import top_k
+from .Views import ListView, Subset
 
+@Metrics.instrument
 class Movies:
-    def __init__(self, path='./ml-latest-small/movies.csv', limit=1000):
+    CACHE_SCHEMA = 'movies/2'
+    SAMPLE_KEYS = {'movie': 0}
+
+    def __init__(self, path='./ml-latest-small/movies.csv', limit=Sampling.DEFAULT_LIMIT,
+                 stream=False, chunk_size=DEFAULT_CHUNK_SIZE, cache=False, sample=None):
         if not os.path.isfile(path) or os.path.getsize(path) == 0:
             raise FileNotFoundError(f"Файл не найден или пустой: {path}")
+        if sample is not None and not isinstance(sample, Sampling.Sampler):
+            raise TypeError("sample должен быть выборкой из модуля Sampling")
         
         self.path = path
-        self.limit = limit
+        self.limit = Sampling.resolve_limit(limit, sample)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.sample = sample
+        self._select = sample.selector(self.SAMPLE_KEYS) if sample is not None else None
         self.movies = []
-        self.load()
-
-    def smart_split(self, line):
-        line = line.strip()
-        if '"' in line:
-            first_quote = line.index('"')
-            last_quote = line.rindex('"')
-            movieID = line[:first_quote - 1]
-            title = line[first_quote + 1:last_quote]
-            genres = line[last_quote + 2:]
+        self._genres = None
+        self._id_order = None
+        if self.stream:
+            pass
+        elif self.cache and self.sample is None:
+            self.load_cached()
         else:
-            movieID, title, genres = line.split(',', maxsplit=2)
-        return int(movieID), title.strip(), genres.strip()
+            self.load()
+
+    @staticmethod
+    def parse_record(fields):
+        # год отделяется от названия в том же проходе: "Название (1995)" -> ("Название", 1995)
+        movieID, title, genres = fields
+        title = title.strip()
+        year = None
+        if title[-1:] == ')':
+            k = title.rfind('(')
+            if k >= 0:
+                digits = title[k + 1:].strip(')')[:4]
+                if digits.isdigit():
+                    title, year = title[:k].strip(), int(digits)
+        return {
+            'movieID': int(movieID),
+            'title': title,
+            'release': year,
+            'genres': genres.strip().split('|')
+        }
 
-    def extract_title_and_year(self, title):
-        if title.endswith(')') and '(' in title:
-            name, year = title.rsplit('(', 1)
-            year_cleaned = year.strip(')')
-            if year_cleaned[:4].isdigit():
-                return name.strip(), int(year_cleaned[:4])
-        return title.strip(), None
+    def read_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        return batched(read_rows(self.path, self.parse_record, self.limit, self._select), chunk_size)
 
     def load(self):
-        with open(self.path, 'r', encoding='utf-8') as f:
-            next(f)
-            for i, line in enumerate(f):
-                if i >= self.limit:
-                    break
-                try:
-                    movieID, title_raw, genres = self.smart_split(line)
-                    title, year = self.extract_title_and_year(title_raw)
-                    genre_list = genres.split('|') if genres != "(no genres listed)" else ['(no genres listed)']
-                    self.movies.append({
-                        'movieID': movieID,
-                        'title': title,
-                        'release': year,
-                        'genres': genre_list
-                    })
-                except Exception as e:
-                    print("Ошибка разбора:",i+2, line)
-                    print("→", e)
-                    continue
+        for chunk in self.read_chunks(self.chunk_size):
+            self.movies.extend(chunk)
+
+    def build_columns(self):
+        columns = {'movieID': array('i'), 'title': [], 'release': array('i'), 'genres': []}
+        for m in read_rows(self.path, self.parse_record):
+            columns['movieID'].append(m['movieID'])
+            columns['title'].append(m['title'])
+            columns['release'].append(m['release'] if m['release'] is not None else -1)
+            columns['genres'].append('|'.join(m['genres']))
+        return columns
+
+    def load_cached(self):
+        columns = BinaryCache.load_or_build(self.path, self.CACHE_SCHEMA, self.build_columns)
+        rows = zip(columns['movieID'], columns['title'], columns['release'], columns['genres'])
+        for i, (movieID, title, year, genres) in enumerate(rows):
+            if self.limit is not None and i >= self.limit:
+                break
+            self.movies.append({
+                'movieID': movieID,
+                'title': title,
+                'release': year if year != -1 else None,
+                'genres': genres.split('|')
+            })
+
+    def chunks(self):
+        if self.stream:
+            yield from self.read_chunks(self.chunk_size)
+        else:
+            Metrics.add(len(self.movies))
+            yield self.movies
+
+    @property
+    def population(self):
+        # размеры страт в полном файле по итогам отбора; None без выборки
+        return self._select.population if self._select is not None else None
+
+    def rows(self):
+        for chunk in self.chunks():
+            yield from chunk
 
     def get_all(self):
-        return self.movies.copy()
+        # представление только для чтения без копирования списка
+        return ListView(self.movies)
+
+    def by_year(self, low, high=None):
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        high = low if high is None else high
+        years = range(low, high + 1)
+        positions = array('i', compress(range(len(self.movies)), map(years.__contains__, self.genre_index().years)))
+        return Subset(self.get_all(), positions)
+
+    def by_id(self, low, high):
+        # movieID из [low, high] в порядке возрастания, через отсортированные позиции
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        if self._id_order is None:
+            ids = self.genre_index().movie_ids
+            self._id_order = array('i', sorted(range(len(ids)), key=ids.__getitem__))
+        ids = self.genre_index().movie_ids
+        start = bisect_left(self._id_order, low, key=ids.__getitem__)
+        stop = bisect_right(self._id_order, high, key=ids.__getitem__)
+        return Subset(self.get_all(), self._id_order[start:stop])
+
+    def genre_index(self):
+        if self._genres is None:
+            self._genres = GenreIndex.build(self.rows())
+        return self._genres
+
+    def estimate_counts(self, key=None, z=Sampling.Z):
+        # число фильмов в полном файле: всего (None), по жанрам ('genre') или годам ('release');
+        # фильм с несколькими жанрами входит в каждый. Без выборки оценки точные
+        if key not in (None, 'genre', 'release'):
+            raise ValueError(f"Неверное значние аргумента: {key}")
+        stratified = self._select is not None and self._select.key == 'movie'
+        strata, groups = [], []
+        sizes = Counter()
+        for m in self.rows():
+            stratum = m['movieID'] if stratified else None
+            sizes[stratum] += 1
+            labels = m['genres'] if key == 'genre' else (m['release'] if key == 'release' else None,)
+            strata.extend([stratum] * len(labels))
+            groups.extend(labels)
+        population = self.population if self._select is not None else {None: sizes[None]}
+        return Sampling.estimate_totals(population, strata, groups, z, sizes)
 
     def dist_by_release(self):
-        years = [m['release'] for m in self.movies if m['release'] is not None]
-        return dict(Counter(years).most_common())
+        if self.sample is not None:
+            estimates = self.estimate_counts('release')
+            estimates.pop(None, None)
+            return dict(sorted(estimates.items(), key=lambda x: x[1], reverse=True))
+        years = Counter()
+        for chunk in self.chunks():
+            years.update(m['release'] for m in chunk if m['release'] is not None)
+        return dict(years.most_common())
 
     def dist_by_genres(self):
-        genres = []
-        for m in self.movies:
-            genres.extend(m['genres'])
-        return dict(Counter(genres).most_common())
+        if self.sample is not None:
+            return dict(sorted(self.estimate_counts('genre').items(), key=lambda x: x[1], reverse=True))
+        genres = Counter(self.genre_index().counts())
+        return dict(genres.most_common())
 
     def most_genres(self, n):
         if  not isinstance(n, int) or n<=0:
             raise ValueError(f"Неверное значние аргумента: {n}")
-        movies = {
-            m['title']: len(m['genres']) for m in self.movies
-        }
-        return dict(sorted(movies.items(), key=lambda x: x[1], reverse=True)[:n])
+        index = self.genre_index()
+        return dict(top_k(zip(index.labels(), index.sizes()), n))
+
+    def with_genres(self, any_of=None, all_of=None, years=None):
+        # movieID фильмов, у которых есть хотя бы один жанр из any_of и все жанры из all_of
+        for genres in (any_of, all_of):
+            if genres is not None and (isinstance(genres, str) or not all(isinstance(g, str) for g in genres)):
+                raise TypeError("Жанры нужно передавать списком строк")
+        return list(self.genre_index().select(any_of, all_of, years))
+
+    def movie_ids_where(self, any_of=None, all_of=None, years=None):
+        return set(self.with_genres(any_of, all_of, years))
     
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import io
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from . import Metrics
+from .Reader import parse_records
+
+
+def split_ranges(path, parts, size=None):
+    # байтовые диапазоны после заголовка до size (по умолчанию весь файл),
+    # каждая граница — начало строки
+    size = os.path.getsize(path) if size is None else size
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        bounds = [start]
+        for k in range(1, parts):
+            pos = start + (size - start) * k // parts
+            f.seek(max(pos - 1, start))
+            f.readline()
+            bounds.append(max(min(f.tell(), size), bounds[-1]))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _parse_range(path, start, end, parse, typecodes):
+    # воркер: разбирает свой диапазон в типизированные колонки и кладёт их
+    # в один блок shared memory; родителю возвращается только имя блока и длины
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    columns = [array(code) for code in typecodes]
+    for row in parse_records(io.StringIO(text, newline=''), parse):
+        for column, value in zip(columns, row):
+            column.append(value)
+    sizes = [len(c) * c.itemsize for c in columns]
+    shm = shared_memory.SharedMemory(create=True, size=max(sum(sizes), 1))
+    offset = 0
+    for column, nbytes in zip(columns, sizes):
+        shm.buf[offset:offset + nbytes] = column.tobytes()
+        offset += nbytes
+    name = shm.name
+    shm.close()
+    # владельцем блока становится родитель: он подключится к нему и сделает unlink
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return name, len(columns[0])
+
+
+def _unlink(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def read_columns(path, parse, typecodes, workers, end=None):
+    # склейка в порядке диапазонов, поэтому результат совпадает с последовательным разбором
+    ranges = split_ranges(path, workers, end)
+    columns = [array(code) for code in typecodes]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_parse_range, path, a, b, parse, typecodes) for a, b in ranges]
+        try:
+            for future in futures:
+                name, count = future.result()
+                shm = shared_memory.SharedMemory(name=name)
+                try:
+                    offset = 0
+                    for column in columns:
+                        nbytes = count * column.itemsize
+                        column.frombytes(shm.buf[offset:offset + nbytes])
+                        offset += nbytes
+                finally:
+                    shm.close()
+        finally:
+            # блоки освобождает только родитель: после ошибки в одном воркере нужно
+            # дождаться остальных и удалить всё, что они успели создать
+            pool.shutdown(wait=True)
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    _unlink(future.result()[0])
+    # воркеры в другом процессе, строки и байты засчитываются здесь по итогу
+    Metrics.add(len(columns[0]), ranges[-1][1] - ranges[0][0] if ranges else 0)
+    return columns
@@ -0,0 +1,185 @@
+from collections import Counter
+from itertools import compress
+from operator import and_
+from .GroupStats import GroupStats
+from .TopK import top_k
+
+COLUMNS = {'user': 'user_ids', 'movie': 'movie_ids', 'rating': 'ratings', 'timestamp': 'timestamps'}
+
+METRICS = {
+    'count': lambda stats, min_count: {key: n for key, n in stats.counts.items() if n >= min_count},
+    'mean': GroupStats.means,
+    'median': GroupStats.medians,
+    'variance': GroupStats.variances,
+}
+
+
+class Query:
+    # ленивый план над Ratings или Tags: фильтры строк, соединения по movieId с другими наборами,
+    # группировка, агрегат и top-k. Ничего не считается до run()/top().
+    # Соединения сворачиваются в множество movieId до сканирования; если фильтров строк нет,
+    # группы берутся из уже посчитанных movie_stats/user_stats, иначе все фильтры
+    # применяются за один проход по блокам
+    def __init__(self, source, workers=None):
+        self.source = source
+        self.workers = workers
+        self.predicates = []
+        self.joins = []
+        self.key = None
+        self.metric = 'count'
+        self.min_count = 1
+
+    def _derive(self, **changes):
+        query = Query(self.source, self.workers)
+        query.__dict__.update(self.__dict__)
+        query.predicates = list(self.predicates)
+        query.joins = list(self.joins)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, column, predicate):
+        if column not in COLUMNS:
+            raise ValueError(f"Неизвестная колонка: {column}")
+        if not hasattr(self.source, COLUMNS[column]):
+            raise ValueError(f"В наборе {type(self.source).__name__} нет колонки: {column}")
+        return self._derive(predicates=self.predicates + [(column, predicate)])
+
+    def between(self, column, low=None, high=None):
+        # границы включительно; None — без ограничения
+        if low is None and high is None:
+            return self
+        if low is None:
+            return self.where(column, lambda v: v <= high)
+        if high is None:
+            return self.where(column, lambda v: low <= v)
+        return self.where(column, lambda v: low <= v <= high)
+
+    def join(self, other, **conditions):
+        # other — Movies, Tags, Links или Ratings; условия передаются в его movie_ids_where
+        if not hasattr(other, 'movie_ids_where'):
+            raise TypeError(f"Набор {type(other).__name__} нельзя соединить по movieId")
+        return self._derive(joins=self.joins + [(other, conditions)])
+
+    def group_by(self, key):
+        if key not in ('movie', 'user'):
+            raise ValueError(f"Группировка возможна только по movie или user: {key}")
+        return self._derive(key=key)
+
+    def agg(self, metric, min_count=1):
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестный агрегат: {metric}")
+        if metric != 'count' and not hasattr(self.source, 'ratings'):
+            raise ValueError(f"Агрегат {metric} требует колонку rating")
+        return self._derive(metric=metric, min_count=min_count)
+
+    def movie_ids(self):
+        # пересечение всех соединений; None — ограничений по фильмам нет
+        movies = None
+        for other, conditions in self.joins:
+            ids = set(other.movie_ids_where(**conditions))
+            movies = ids if movies is None else movies & ids
+            if not movies:
+                break
+        return movies
+
+    def uses_stats(self):
+        # план обходится групповыми агрегатами источника (movie_stats/user_stats) без прохода
+        if self.predicates or not hasattr(self.source, 'movie_stats'):
+            return False
+        return self.key == 'movie' or (self.key == 'user' and not self.joins)
+
+    def cached_stats(self):
+        if not self.uses_stats():
+            return None
+        if self.key == 'movie':
+            return self.source.movie_stats(self.workers)
+        return self.source.user_stats(self.workers)
+
+    def explain(self):
+        # только описание плана: агрегаты источника здесь не строятся
+        steps = [f"join {type(other).__name__} {conditions or ''}".rstrip() for other, conditions in self.joins]
+        if self.uses_stats():
+            steps.append(f"{'reuse' if self.source.stats_built(self.key) else 'build'} {self.key}_stats")
+        else:
+            filters = (['movie in joins'] if self.joins else []) + [column for column, _ in self.predicates]
+            steps.append(f"scan {type(self.source).__name__} filters={filters}")
+        steps.append(f"group_by {self.key} agg {self.metric} min_count={self.min_count}")
+        return steps
+
+    def stats(self):
+        if self.key is None:
+            raise ValueError("Не задана группировка: вызовите group_by")
+        movies = self.movie_ids()
+        stats = self.cached_stats()
+        if stats is not None:
+            return stats if movies is None else restrict(stats, movies)
+        return self.scan(movies)
+
+    def scan(self, movies):
+        key_column = COLUMNS[self.key]
+        counting = self.metric == 'count'
+        stats = Counter() if counting else GroupStats()
+        if movies is not None and not movies:
+            return CountStats(stats) if counting else stats
+        for chunk in self.source.chunks():
+            flags = None
+            if movies is not None:
+                flags = map(movies.__contains__, chunk.movie_ids)
+            for column, predicate in self.predicates:
+                matched = map(predicate, getattr(chunk, COLUMNS[column]))
+                flags = matched if flags is None else map(and_, flags, matched)
+            keys = getattr(chunk, key_column)
+            if flags is None:
+                if counting:
+                    stats.update(keys)
+                else:
+                    stats.update(keys, chunk.ratings)
+                continue
+            flags = list(flags)
+            if counting:
+                stats.update(compress(keys, flags))
+            else:
+                stats.update(list(compress(keys, flags)), list(compress(chunk.ratings, flags)))
+        return CountStats(stats) if counting else stats
+
+    def run(self):
+        return METRICS[self.metric](self.stats(), self.min_count)
+
+    def top(self, n, label=None, digits=None):
+        # label: None — ключ как есть, 'title' — название фильма (фильмы без названия пропускаются),
+        # 'label' — название, различающее фильмы с одинаковым названием, функция — произвольное
+        # преобразование ключа
+        return ranked(self.run(), n, self.source, label, digits)
+
+
+def ranked(values, n, source=None, label=None, digits=None):
+    # top-k по значениям с подписями, как в Query.top; source нужен для label='title' и 'label'
+    if label in ('title', 'label'):
+        titles = source.get_titles() if label == 'title' else source.get_labels()
+        values = {titles[key]: value for key, value in values.items() if key in titles}
+        if digits is not None:
+            values = {key: round(value, digits) for key, value in values.items()}
+    elif label is not None or digits is not None:
+        label = label or (lambda key: key)
+        values = {label(key): value if digits is None else round(value, digits) for key, value in values.items()}
+    return dict(top_k(values.items(), n))
+
+
+class CountStats:
+    # Counter в роли GroupStats для агрегата count
+    def __init__(self, counts):
+        self.counts = counts
+
+
+def restrict(stats, movies):
+    # подмножество групп без пересчёта, порядок групп сохраняется
+    part = GroupStats(stats.step)
+    for key in stats.counts:
+        if key in movies:
+            part.counts[key] = stats.counts[key]
+            part.sums[key] = stats.sums[key]
+            part.sumsq[key] = stats.sumsq[key]
+            part.mins[key] = stats.mins[key]
+            part.maxs[key] = stats.maxs[key]
+            part.histograms[key] = stats.histograms[key]
+    return part
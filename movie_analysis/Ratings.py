@@ -1,70 +1,404 @@
-from datetime import datetime
-from collections import Counter, defaultdict
-from .Movies import Movies as mv
+from array import array
+from datetime import timezone
+from collections import Counter, namedtuple
+from . import BinaryCache
+from . import Metrics
+from .Catalog import Catalog
+from .GroupStats import GroupStats
+from .Query import Query, ranked
+from . import Sampling
+from . import Similarity
+from .Sketches import StreamSummary
+from .SparseMatrix import SparseMatrix
+from . import TimeBuckets
+from . import ParallelReader
+from .Reader import DEFAULT_CHUNK_SIZE, batched, complete_size, read_rows, read_tail
+from .Views import PositionIndex, SequenceView, Subset
 import os
 
 
+class RatingChunk(namedtuple('RatingChunk', 'user_ids movie_ids ratings timestamps')):
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(
+            array('i', [r[0] for r in rows]),
+            array('i', [r[1] for r in rows]),
+            array('f', [r[2] for r in rows]),
+            array('q', [r[3] for r in rows]),
+        )
+
+
+class RatingRows(SequenceView):
+    # строки в прежнем формате (dict со строковыми значениями), собираются по запросу
+    def __init__(self, outer):
+        self.outer = outer
+
+    def __len__(self):
+        return len(self.outer)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        outer = self.outer
+        return {
+            'userId': str(outer.user_ids[i]),
+            'movieId': str(outer.movie_ids[i]),
+            'rating': str(outer.ratings[i]),
+            'timestamp': str(outer.timestamps[i]),
+        }
+
+
+@Metrics.instrument
 class Ratings:
-    def __init__(self, path='./ml-latest-small/ratings.csv', limit=1000):
+    CACHE_SCHEMA = 'ratings/1'
+    NEIGHBOURS_SCHEMA = 'neighbours/1'
+    TYPECODES = ('i', 'i', 'f', 'q')
+    SAMPLE_KEYS = {'user': 0, 'movie': 1}
+
+    def __init__(self, path='./ml-latest-small/ratings.csv', limit=Sampling.DEFAULT_LIMIT, movies_path=None,
+                 stream=False, chunk_size=DEFAULT_CHUNK_SIZE, cache=False, workers=1, sample=None):
         if not os.path.isfile(path) or os.path.getsize(path) == 0:
             raise FileNotFoundError(f"Файл не найден или пустой: {path}")
+        if sample is not None and not isinstance(sample, Sampling.Sampler):
+            raise TypeError("sample должен быть выборкой из модуля Sampling")
 
-        self.data=[]
         self.path = path
-        self.limit = limit
-        self.load()
-    
+        self.limit = Sampling.resolve_limit(limit, sample)
+        self.movies_path = movies_path or Catalog.default_path(path)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.workers = workers
+        # выборка делается при чтении csv, поэтому бинарный кэш с ней не используется
+        self.sample = sample
+        self._select = sample.selector(self.SAMPLE_KEYS) if sample is not None else None
+        self.user_ids = array('i')
+        self.movie_ids = array('i')
+        self.ratings = array('f')
+        self.timestamps = array('q')
+        self._movie_stats = None
+        self._user_stats = None
+        self._buckets = {}
+        self._rating_counts = None
+        self._positions = {}
+        self._summaries = {}
+        self._matrix = None
+        self._neighbours = {}
+        # после append/refresh файл кэша соседей уже не соответствует данным в памяти
+        self._appended = False
+        # с этого смещения refresh() дочитывает новые строки; загрузка читает файл только
+        # до него, чтобы строки, дописанные во время загрузки, не потерялись между ними;
+        # недописанная последняя строка тоже остаётся для refresh()
+        self._offset = complete_size(path)
+        if self.stream:
+            pass
+        elif self.cache and self.sample is None:
+            self.load_cached()
+        else:
+            self.load()
+
+    @staticmethod
+    def parse_record(fields):
+        user_id, movie_id, rating, timestamp = fields
+        return int(user_id), int(movie_id), float(rating), int(timestamp)
+
+    def read_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        rows = read_rows(self.path, self.parse_record, self.limit, self._select, self._offset)
+        for batch in batched(rows, chunk_size):
+            yield RatingChunk.from_rows(batch)
+
     def load(self):
-        with open(self.path, 'r', encoding='utf-8') as file:
-            headers=file.readline().strip().split(',',3)
-            for i, line in enumerate(file):
-                if i >= self.limit:
-                    break
-                try:
-                    values=line.strip().split(',')
-                    self.data.append(dict(zip(headers,values)))     
-                except Exception as e:
-                    print("Ошибка разбора:",i+2, line)
-                    print("→", e)
-                    continue
+        # параллельный разбор возможен только для всего файла: limit считает строки с начала
+        if self.workers > 1 and self.limit is None and self.sample is None:
+            columns = ParallelReader.read_columns(self.path, self.parse_record, self.TYPECODES, self.workers, self._offset)
+            self.user_ids, self.movie_ids, self.ratings, self.timestamps = columns
+            return
+        for chunk in self.read_chunks(self.chunk_size):
+            self.user_ids.extend(chunk.user_ids)
+            self.movie_ids.extend(chunk.movie_ids)
+            self.ratings.extend(chunk.ratings)
+            self.timestamps.extend(chunk.timestamps)
+
+    def build_columns(self):
+        if self.workers > 1:
+            columns = ParallelReader.read_columns(self.path, self.parse_record, self.TYPECODES, self.workers, self._offset)
+            return RatingChunk(*columns)._asdict()
+        full = RatingChunk(*(array(code) for code in self.TYPECODES))
+        for batch in batched(read_rows(self.path, self.parse_record, end=self._offset), self.chunk_size):
+            for column, part in zip(full, RatingChunk.from_rows(batch)):
+                column.extend(part)
+        return full._asdict()
+
+    def load_cached(self):
+        # кэш хранит весь файл; limit — срез memoryview без копирования
+        columns = BinaryCache.load_or_build(self.path, self.CACHE_SCHEMA, self.build_columns, size=self._offset)
+        self._columns = columns
+        self.user_ids = columns['user_ids'][:self.limit]
+        self.movie_ids = columns['movie_ids'][:self.limit]
+        self.ratings = columns['ratings'][:self.limit]
+        self.timestamps = columns['timestamps'][:self.limit]
+
+    def _add_chunk(self, chunk):
+        # колонки из кэша — memoryview над файлом, перед дописыванием их нужно скопировать в array
+        if isinstance(self.ratings, memoryview):
+            columns = []
+            for code, column in zip(self.TYPECODES, (self.user_ids, self.movie_ids, self.ratings, self.timestamps)):
+                copy = array(code)
+                copy.frombytes(column.cast('B'))
+                columns.append(copy)
+            self.user_ids, self.movie_ids, self.ratings, self.timestamps = columns
+            self._columns = None
+        self.user_ids.extend(chunk.user_ids)
+        self.movie_ids.extend(chunk.movie_ids)
+        self.ratings.extend(chunk.ratings)
+        self.timestamps.extend(chunk.timestamps)
+        # уже посчитанные агрегаты обновляются только новыми строками
+        if self._movie_stats is not None:
+            self._movie_stats.update(chunk.movie_ids, chunk.ratings)
+        if self._user_stats is not None:
+            self._user_stats.update(chunk.user_ids, chunk.ratings)
+        for (unit, tz), counts in self._buckets.items():
+            counts.update(TimeBuckets.count(chunk.timestamps, unit, tz))
+        for column, index in self._positions.items():
+            index.extend(getattr(chunk, column))
+        if self._rating_counts is not None:
+            self._rating_counts.update(chunk.ratings)
+        for summary in self._summaries.values():
+            summary.update(chunk)
+        # матрицу и соседей дешевле пересчитать целиком, чем дополнять
+        self._matrix = None
+        self._neighbours = {}
+        self._appended = True
+
+    def append(self, rows):
+        # rows — кортежи (userId, movieId, rating, timestamp), как возвращает parse_record
+        if self.stream:
+            raise ValueError("В режиме stream данные читаются из файла, append недоступен")
+        if self.sample is not None:
+            raise ValueError("Для выборки append недоступен: новые строки не прошли бы отбор")
+        rows = list(rows)
+        if rows:
+            self._add_chunk(RatingChunk.from_rows(rows))
+        return len(rows)
+
+    def refresh(self):
+        # дочитывает строки, дописанные в файл после загрузки; возвращает их число.
+        # Смещение сдвигается только после успешного append, иначе строки потерялись бы
+        rows, offset = read_tail(self.path, self.parse_record, self._offset)
+        if self.stream:
+            self._offset = offset
+            if rows:
+                self._movie_stats = self._user_stats = self._rating_counts = None
+                self._buckets = {}
+                self._summaries = {}
+                self._matrix = None
+                self._neighbours = {}
+                self._appended = True
+            return len(rows)
+        count = self.append(rows)
+        self._offset = offset
+        return count
+
+    def chunks(self):
+        # в режиме stream данные читаются из файла блоками, иначе — один блок из памяти
+        if self.stream:
+            yield from self.read_chunks(self.chunk_size)
+        else:
+            Metrics.add(len(self.ratings))
+            yield RatingChunk(self.user_ids, self.movie_ids, self.ratings, self.timestamps)
+
+    def __len__(self):
+        return len(self.ratings)
+
+    @property
+    def population(self):
+        # размеры страт в полном файле по итогам отбора; None без выборки
+        return self._select.population if self._select is not None else None
+
+    @property
+    def data(self):
+        return RatingRows(self)
+
+    def position_index(self, column):
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        if column not in self._positions:
+            self._positions[column] = PositionIndex(getattr(self, column))
+        return self._positions[column]
+
+    def by_user(self, user_id):
+        return Subset(self.data, self.position_index('user_ids').get(user_id))
+
+    def by_movie(self, movie_id):
+        return Subset(self.data, self.position_index('movie_ids').get(movie_id))
+
+    def get_titles(self):
+        return Catalog.get(self.movies_path).titles
+
+    def get_labels(self):
+        return Catalog.get(self.movies_path).labels()
+
+    def movie_ids_where(self, min_count=1):
+        return {movie_id for movie_id, n in self.movie_stats().counts.items() if n >= min_count}
+
+    def query(self, workers=None):
+        return Query(self, workers)
+
+    def genre_index(self):
+        return Catalog.get(self.movies_path).movies.genre_index()
+
+    def partitions(self, key, parts):
+        # пары (ключи, оценки) для параллельной агрегации: блоки файла в режиме stream,
+        # иначе parts непрерывных кусков колонок (копии, чтобы их можно было передать в процесс)
+        if self.stream:
+            for chunk in self.chunks():
+                yield getattr(chunk, key), chunk.ratings
+            return
+        keys = getattr(self, key)
+        Metrics.add(len(keys))
+        step = max(-(-len(keys) // parts), 1)
+        for start in range(0, len(keys), step):
+            part_keys = array('i')
+            part_keys.frombytes(memoryview(keys)[start:start + step].cast('B'))
+            part_values = array('f')
+            part_values.frombytes(memoryview(self.ratings)[start:start + step].cast('B'))
+            yield part_keys, part_values
+
+    def group_stats(self, key, workers=None):
+        workers = self.workers if workers is None else workers
+        if workers > 1:
+            return GroupStats.build_parallel(self.partitions(key, workers), workers)
+        stats = GroupStats()
+        for chunk in self.chunks():
+            stats.update(getattr(chunk, key), chunk.ratings)
+        return stats
+
+    def time_buckets(self, unit, tz=timezone.utc):
+        if (unit, tz) not in self._buckets and self.sample is not None:
+            estimates = self.estimate_counts(lambda chunk: TimeBuckets.labels(chunk.timestamps, unit, tz))
+            self._buckets[unit, tz] = Counter(estimates)
+        if (unit, tz) not in self._buckets:
+            result = Counter()
+            for chunk in self.chunks():
+                result.update(TimeBuckets.count(chunk.timestamps, unit, tz))
+            self._buckets[unit, tz] = result
+        return Counter(self._buckets[unit, tz])
 
+    def rating_counts(self):
+        if self._rating_counts is None and self.sample is not None:
+            self._rating_counts = Counter(self.estimate_counts('rating'))
+        if self._rating_counts is None:
+            result = Counter()
+            for chunk in self.chunks():
+                result.update(chunk.ratings)
+            self._rating_counts = result
+        return Counter(self._rating_counts)
 
+    def estimate_counts(self, key='movie', z=Sampling.Z):
+        # число оценок в полном файле по группам (key=None — всего) с полушириной интервала;
+        # без выборки оценки точные, погрешность 0. С выборкой через эти оценки идут
+        # счётчики и средние аналитики (значения — Sampling.Estimate); медианы, дисперсии,
+        # средние по жанрам и приближённый режим считаются по самой выборке
+        population, strata, groups, _ = Sampling.collect(self.chunks(), self._select, key)
+        return Sampling.estimate_totals(population, strata, groups, z)
+
+    def estimate_means(self, key='movie', z=Sampling.Z):
+        # средняя оценка по группам (key=None — по всему файлу)
+        population, strata, groups, values = Sampling.collect(self.chunks(), self._select, key, 'rating')
+        return Sampling.estimate_means(population, strata, groups, values, z)
+
+    def summary(self, capacity=1000, k=64, precision=12):
+        # скетчи ограниченного размера для приближённого режима (approx=True); в режиме stream
+        # строятся за один проход без хранения строк
+        params = (capacity, k, precision)
+        if params not in self._summaries:
+            summary = StreamSummary(capacity, k, precision)
+            for chunk in self.chunks():
+                summary.update(chunk)
+            self._summaries[params] = summary
+        return self._summaries[params]
+
+    def matrix(self):
+        # разреженная матрица пользователи × фильмы (CSR), строится один раз
+        if self._matrix is None:
+            self._matrix = SparseMatrix.from_chunks(self.chunks())
+        return self._matrix
+
+    def neighbours(self, key='movie', metric='cosine', k=20, workers=None, min_support=1):
+        # top-k похожих фильмов (key='movie') или пользователей (key='user');
+        # для полного файла с cache=True результат хранится в <file>.<параметры>.mlcache
+        if key not in ('movie', 'user'):
+            raise ValueError(f"Неверное значние аргумента: {key}")
+        params = (key, metric, k, min_support)
+        if params in self._neighbours:
+            return self._neighbours[params]
+        workers = self.workers if workers is None else workers
+
+        def build():
+            matrix = self.matrix()
+            entities = matrix.transpose() if key == 'movie' else matrix
+            return Similarity.neighbours(entities, k, metric, workers, min_support=min_support).columns()
+
+        if self.cache and self.limit is None and self.sample is None and not self._appended:
+            path = f"{self.path}.{key}-{metric}-{k}-{min_support}{BinaryCache.CACHE_SUFFIX}"
+            columns = BinaryCache.load_or_build(self.path, self.NEIGHBOURS_SCHEMA, build, path, self._offset)
+        else:
+            columns = build()
+        self._neighbours[params] = Similarity.Neighbours.from_columns(columns)
+        return self._neighbours[params]
+
+    def movie_stats(self, workers=None):
+        if self._movie_stats is None:
+            self._movie_stats = self.group_stats('movie_ids', workers)
+        return self._movie_stats
+
+    def user_stats(self, workers=None):
+        if self._user_stats is None:
+            self._user_stats = self.group_stats('user_ids', workers)
+        return self._user_stats
+
+    def stats_built(self, key):
+        # построены ли уже movie_stats ('movie') или user_stats ('user'); сами не строятся
+        if key not in ('movie', 'user'):
+            raise ValueError(f"Неверное значние аргумента: {key}")
+        return (self._movie_stats if key == 'movie' else self._user_stats) is not None
+
+
+    @Metrics.instrument
     class Movies: 
         def __init__(self, outer):
             if not isinstance(outer, Ratings):
                 raise TypeError("Аргумент должен быть экземпляром класса Ratings")
-            self.data=outer.data
-
-        def dist_by_year(self):
-            ratings_and_year=[]
-            for row in self.data:
-                year=datetime.fromtimestamp(int(row['timestamp'])).year
-                ratings_and_year.append(year)
-            return dict(Counter(ratings_and_year).most_common())
+            self.outer=outer
+
+        @property
+        def data(self):
+            return self.outer.data
+
+        def time_buckets(self, unit, tz=timezone.utc):
+            return self.outer.time_buckets(unit, tz)
+
+        def dist_by_year(self, tz=timezone.utc):
+            return dict(self.time_buckets('year', tz).most_common())
+
+        def dist_by_year_month(self, tz=timezone.utc):
+            return dict(sorted(self.time_buckets('year_month', tz).items()))
+
+        def dist_by_week(self, tz=timezone.utc):
+            return dict(sorted(self.time_buckets('week', tz).items()))
         
         def dist_by_rating(self):
-            ratings_all=[]
-            for row in self.data:
-                rating=row['rating']
-                ratings_all.append(rating)
-            return dict(Counter(ratings_all).most_common())
+            ratings_all=self.outer.rating_counts()
+            return dict(Counter({str(rating): count for rating, count in ratings_all.items()}).most_common())
         
-        def top_by_num_of_ratings(self, n=5):
+        def top_by_num_of_ratings(self, n=5, approx=False):
             if  not isinstance(n, int) or n<=0:
                 raise ValueError(f"Неверное значние аргумента: {n}")
-            data_from_mvcsv=mv().get_all()
-            title_and_id={str(row['movieID']): row['title'] for row in data_from_mvcsv}
-            rating_count=defaultdict(int)
-            for row in self.data:
-                movieId=row['movieId']
-                rating_count[movieId]+=1
-            title_ratings = {
-            title_and_id[movie_id]: count
-            for movie_id, count in rating_count.items()
-            if movie_id in title_and_id
-            }
-            top_movies = dict(sorted(title_ratings.items(), key=lambda x: x[1], reverse=True)[:n])
-            return top_movies
+            if self.outer.sample is not None:
+                return ranked(self.outer.estimate_counts('movie'), n, self.outer, 'title')
+            if approx:
+                return ranked(self.outer.summary().top_movies.counts, n, self.outer, 'title')
+            return self.outer.query().group_by('movie').agg('count').top(n, label='title')
         
         def average(self,values):
             return sum(values) / len(values) if values else 0
@@ -80,94 +414,97 @@ class Ratings:
             else:
                 return (sorted_vals[mid - 1] + sorted_vals[mid]) / 2
 
-        def top_by_ratings(self, n=5,metric='average'):
+        def top_by_ratings(self, n=5,metric='average', workers=None, approx=False):
             if  not isinstance(n, int) or n<=0 or metric not in ['average','median']:
                 raise ValueError(f"Неверное значние аргумента: {n,metric}")
+            if self.outer.sample is not None and metric == 'average':
+                return ranked(self.outer.estimate_means('movie'), n, self.outer, 'title', 2)
+            if approx:
+                summary = self.outer.summary()
+                values = summary.means('movie') if metric == 'average' else summary.medians('movie')
+                return ranked(values, n, self.outer, 'title', 2)
             
-            metric=self.average if metric=='average' else self.median
-            data_from_mvcsv = mv().get_all()
-            title_and_id = {str(row['movieID']): row['title'] for row in data_from_mvcsv}
-
-            ratings = defaultdict(list)
-            for row in self.data:
-                movie_id = str(row['movieId'])
-                rating = float(row['rating'])
-                ratings[movie_id].append(rating)
-
-            metric_values = {}
-            for movie_id, rating_list in ratings.items():
-                if movie_id in title_and_id and rating_list:
-                    value = round(metric(rating_list), 2)
-                    title = title_and_id[movie_id]
-                    metric_values[title] = value
-
-            top_movies = dict(sorted(metric_values.items(), key=lambda x: x[1], reverse=True)[:n])
-            return top_movies
+            query = self.outer.query(workers).group_by('movie')
+            query = query.agg('mean' if metric == 'average' else 'median')
+            return query.top(n, label='title', digits=2)
         def variance(self,lst):
                 if not lst:
                     return 0
                 mean=sum(lst)/len(lst)
                 return sum((x-mean)**2 for x in lst)/len(lst)
-        def top_controversial(self, n=5):
+        def average_by_genre(self, workers=None):
+            # суммы и количества оценок сначала сводятся по маскам жанров, затем по битам
+            index = self.outer.genre_index()
+            masks = index.by_movie()
+            stats = self.outer.movie_stats(workers)
+            sums = Counter()
+            counts = Counter()
+            for movie_id, n in stats.counts.items():
+                mask = masks.get(movie_id)
+                if mask is not None:
+                    sums[mask] += stats.sums[movie_id]
+                    counts[mask] += n
+            averages = {}
+            for bit, genre in enumerate(index.names):
+                total = sum(n for mask, n in counts.items() if mask >> bit & 1)
+                if total:
+                    averages[genre] = round(sum(s for mask, s in sums.items() if mask >> bit & 1) / total, 2)
+            return dict(sorted(averages.items(), key=lambda x: x[1], reverse=True))
+
+        def top_controversial(self, n=5, workers=None):
             if  not isinstance(n, int) or n<=0:
                 raise ValueError(f"Неверное значние аргумента: {n}")
-            data_from_mvcsv = mv().get_all()
-            title_and_id = {str(row['movieID']): row['title'] for row in data_from_mvcsv}
-            ratings=defaultdict(list)
-            for row in self.data:
-                movieId=str(row['movieId'])
-                rating=float(row['rating'])
-                ratings[movieId].append(rating)
-            
-            variance_dict={}
-            for movie_id,rating_list in ratings.items():
-                if movie_id in title_and_id and len(rating_list)>=2:
-                    var=round(self.variance(rating_list),2)
-                    title=title_and_id[movie_id]
-                    variance_dict[title]=var
-            top_movies=dict(sorted(variance_dict.items(), key=lambda x:x[1], reverse=True)[:n])
-            return top_movies
+            query = self.outer.query(workers).group_by('movie').agg('variance', min_count=2)
+            return query.top(n, label='title', digits=2)
+
+        def similar_movies(self, movie_id, n=10, metric='cosine', workers=None):
+            if  not isinstance(n, int) or n<=0:
+                raise ValueError(f"Неверное значние аргумента: {n}")
+            neighbours = self.outer.neighbours('movie', metric, max(n, 20), workers)
+            # соседи — разные фильмы, поэтому одинаковые названия различаются годом
+            return ranked(dict(neighbours.get(movie_id, n)), n, self.outer, 'label', 3)
 
+    @Metrics.instrument
     class Users(Movies):
         def __init__(self, outer):
             self.outer=outer
-        def dist_by_num_of_rating(self):
-            user_counter=Counter()
-            for row in self.outer.data:
-                user_id=row['userId']
-                user_counter[user_id]+=1
-            
+        def dist_by_num_of_rating(self, approx=False):
+            # approx — только пользователи из сводки частых (не больше её ёмкости), счётчики — оценки сверху
+            if self.outer.sample is not None:
+                per_user=self.outer.estimate_counts('user')
+            else:
+                per_user=self.outer.summary().top_users.counts if approx else self.outer.user_stats().counts
+            user_counter=Counter({str(user_id): count for user_id, count in per_user.items()})
             return dict(user_counter.most_common())
         
-        def dist_by_rating_values(self, metric='average'):
+        def dist_by_rating_values(self, metric='average', workers=None, approx=False):
             if metric not in ['average','median']:
                 raise ValueError(f"Неверное значние аргумента: {metric}")
-            ratings = defaultdict(list)
-            for row in self.outer.data:
-                user_id = row['userId']
-                rating = float(row['rating'])
-                ratings[user_id].append(rating)
-            func = self.average if metric == "average" else self.median
+            if self.outer.sample is not None and metric == 'average':
+                values = self.outer.estimate_means('user')
+            elif approx:
+                summary = self.outer.summary()
+                values = summary.means('user') if metric == 'average' else summary.medians('user')
+            else:
+                query = self.outer.query(workers).group_by('user')
+                values = query.agg('mean' if metric == "average" else 'median').run()
             user_metrics = {
-            user_id: round(func(rating_list), 2)
-            for user_id, rating_list in ratings.items()
+            str(user_id): round(value, 2)
+            for user_id, value in values.items()
             }
             return dict(sorted(user_metrics.items(), key=lambda x: x[1], reverse=True))
         
-        def top_controversial_users(self, n):
+        def top_controversial_users(self, n, workers=None):
+            if  not isinstance(n, int) or n<=0:
+                raise ValueError(f"Неверное значние аргумента: {n}")
+            query = self.outer.query(workers).group_by('user').agg('variance', min_count=2)
+            return query.top(n, label=str, digits=2)
+
+        def similar_users(self, user_id, n=10, metric='cosine', workers=None):
             if  not isinstance(n, int) or n<=0:
                 raise ValueError(f"Неверное значние аргумента: {n}")
-            ratings=defaultdict(list)
-            for row in self.outer.data:
-                user_id = row['userId']
-                rating = float(row['rating'])
-                ratings[user_id].append(rating)
-            user_variances={}
-            for user_id, rating_list in ratings.items():
-                if len(rating_list) >= 2:
-                    var = round(self.variance(rating_list), 2)
-                    user_variances[user_id] = var
-            return dict(sorted(user_variances.items(), key=lambda x: x[1], reverse=True)[:n])
+            neighbours = self.outer.neighbours('user', metric, max(n, 20), workers)
+            return ranked(dict(neighbours.get(user_id, n)), n, label=str, digits=3)
         
 
 if __name__=='__main__':
@@ -0,0 +1,114 @@
+import csv
+import io
+import os
+from itertools import islice
+from . import Metrics
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def parse_records(lines, parse, limit=None, first_line=None, select=None):
+    # разбор по RFC 4180 (кавычки, запятые и переводы строк внутри полей, удвоенные "")
+    # модулем csv; parse получает список полей. Битые записи пропускаются с сообщением.
+    # select отбирает записи до parse (выборка); номер строки тогда уже не известен
+    reader = csv.reader(lines)
+    records = reader if limit is None else islice(reader, limit)
+    if select is not None:
+        records = select(records)
+        first_line = None
+    for fields in records:
+        try:
+            row = parse(fields)
+        except Exception as e:
+            if first_line is None:
+                print("Ошибка разбора:", ','.join(fields))
+            else:
+                print("Ошибка разбора:", first_line + reader.line_num - 1, ','.join(fields))
+            print("→", e)
+            continue
+        if row is not None:
+            yield row
+
+
+class _Head(io.RawIOBase):
+    # первые end байт файла: то, что дописано позже, читатель не видит
+    def __init__(self, raw, end):
+        self.raw = raw
+        self.left = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.raw.readinto(memoryview(b)[:max(min(len(b), self.left), 0)])
+        self.left -= n
+        return n
+
+    def tell(self):
+        return self.raw.tell()
+
+
+def open_text(path, end=None):
+    if end is None:
+        return open(path, 'r', encoding='utf-8', newline='')
+    head = io.BufferedReader(_Head(open(path, 'rb', buffering=0), end))
+    return io.TextIOWrapper(head, encoding='utf-8', newline='')
+
+
+def read_rows(path, parse, limit=None, select=None, end=None):
+    # записи csv без заголовка; end — граница в байтах (размер файла на момент загрузки)
+    with open_text(path, end) as f:
+        if next(f, None) is None:
+            return
+        if not Metrics.enabled():
+            yield from parse_records(f, parse, limit, 2, select)
+            return
+        rows = 0
+        try:
+            for row in parse_records(f, parse, limit, 2, select):
+                rows += 1
+                yield row
+        finally:
+            # позиция буфера — сколько байт на самом деле прочитано с диска
+            Metrics.add(rows, f.buffer.tell())
+
+
+def batched(rows, size):
+    if not isinstance(size, int) or size <= 0:
+        raise ValueError(f"Неверный размер блока: {size}")
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def complete_size(path, block=1 << 16):
+    # размер файла до конца последней завершённой строки: недописанная строка
+    # не разбирается при загрузке и дочитывается refresh(), как в read_tail
+    pos = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while pos > 0:
+            start = max(pos - block, 0)
+            f.seek(start)
+            i = f.read(pos - start).rfind(b'\n')
+            if i != -1:
+                return start + i + 1
+            pos = start
+    return 0
+
+
+def read_tail(path, parse, offset):
+    # строки, дописанные после offset; незавершённая последняя строка остаётся до следующего вызова
+    size = os.path.getsize(path)
+    if size < offset:
+        raise ValueError(f"Файл стал короче, чем прочитанная часть: {path}")
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b'\n') + 1
+    text = io.StringIO(data[:end].decode('utf-8'), newline='')
+    rows = list(parse_records(text, parse))
+    Metrics.add(len(rows), len(data))
+    return rows, offset + end
@@ -0,0 +1,266 @@
+import random
+from collections import Counter, namedtuple
+from itertools import islice, repeat
+from math import exp, floor, log, log1p
+
+# выборки строк за один потоковый проход. select получает записи csv (списки полей) до разбора,
+# поэтому отброшенные строки не переводятся в числа. После прохода population отбора — размеры
+# страт в исходных данных: {None: N} для равномерных выборок, {ключ: N_h} для стратифицированной
+Z = 1.96
+COLUMNS = {'user': 'user_ids', 'movie': 'movie_ids', 'rating': 'ratings', 'timestamp': 'timestamps', 'tag': 'tags'}
+
+
+# загрузчики по умолчанию читают первые LIMIT строк, но выборка по ним была бы выборкой
+# из начала файла, поэтому с sample лимит по умолчанию снимается. DEFAULT_LIMIT — метка
+# «limit не задан», явно переданное число (в том числе 1000) соблюдается и с выборкой
+LIMIT = 1000
+DEFAULT_LIMIT = object()
+
+
+def resolve_limit(limit, sample):
+    if limit is DEFAULT_LIMIT:
+        return None if sample is not None else LIMIT
+    return limit
+
+
+class Estimate(namedtuple('Estimate', 'value error')):
+    # error — полуширина доверительного интервала (по умолчанию 95%)
+    @property
+    def low(self):
+        return self.value - self.error
+
+    @property
+    def high(self):
+        return self.value + self.error
+
+    def __round__(self, digits=None):
+        return Estimate(round(self.value, digits), round(self.error, digits))
+
+
+def _uniform(rnd):
+    # (0, 1): логарифм нуля не нужен ни одной из формул пропусков
+    u = rnd.random()
+    while u == 0.0:
+        u = rnd.random()
+    return u
+
+
+def _skip(records, n):
+    # пропускает n записей, возвращает сколько удалось пропустить
+    skipped = 0
+    for _ in islice(records, n):
+        skipped += 1
+    return skipped
+
+
+class Selection:
+    # отбор одной загрузки: у каждого загрузчика свой, поэтому размеры страт не затираются,
+    # если той же выборкой загружен другой файл
+    def __init__(self, sampler, keys):
+        self.sampler = sampler
+        self.keys = keys
+        self.key = sampler.key
+        self.population = {}
+
+    def __call__(self, records):
+        return self.sampler.select(records, self)
+
+
+class Sampler:
+    key = None
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def selector(self, keys):
+        # keys — имя ключа -> номер поля в записи; задаёт их загрузчик
+        return Selection(self, keys)
+
+
+class Reservoir(Sampler):
+    # равномерная выборка ровно size строк (алгоритм L: случайные числа только на замены)
+    def __init__(self, size, seed=0):
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError(f"Неверный размер выборки: {size}")
+        super().__init__(seed)
+        self.size = size
+
+    def select(self, records, selection):
+        rnd = random.Random(self.seed)
+        records = iter(records)
+        size = self.size
+        reservoir = list(enumerate(islice(records, size)))
+        seen = len(reservoir)
+        if seen == size:
+            w = exp(log(_uniform(rnd)) / size)
+            while True:
+                skip = floor(log(_uniform(rnd)) / log1p(-w))
+                skipped = _skip(records, skip)
+                seen += skipped
+                if skipped < skip:
+                    break
+                record = next(records, None)
+                if record is None:
+                    break
+                reservoir[rnd.randrange(size)] = (seen, record)
+                seen += 1
+                w *= exp(log(_uniform(rnd)) / size)
+        selection.population = {None: seen}
+        # строки возвращаются в порядке файла
+        reservoir.sort(key=lambda x: x[0])
+        return [record for _, record in reservoir]
+
+
+class Bernoulli(Sampler):
+    # каждая строка независимо с вероятностью fraction; пропуски между отобранными
+    # строками геометрические, поэтому случайное число нужно только на отобранную строку
+    def __init__(self, fraction, seed=0):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"Неверная доля выборки: {fraction}")
+        super().__init__(seed)
+        self.fraction = fraction
+
+    def select(self, records, selection):
+        rnd = random.Random(self.seed)
+        records = iter(records)
+        seen = 0
+        log_q = log1p(-self.fraction) if self.fraction < 1 else None
+        try:
+            while True:
+                if log_q is not None:
+                    skip = floor(log(_uniform(rnd)) / log_q)
+                    skipped = _skip(records, skip)
+                    seen += skipped
+                    if skipped < skip:
+                        return
+                record = next(records, None)
+                if record is None:
+                    return
+                seen += 1
+                yield record
+        finally:
+            selection.population = {None: seen}
+
+
+class Stratified(Sampler):
+    # по size строк на каждого пользователя или фильм (резервуар на страту): редкие
+    # пользователи и фильмы представлены так же, как частые
+    def __init__(self, key, size, seed=0):
+        if key not in ('user', 'movie'):
+            raise ValueError(f"Стратификация возможна только по user или movie: {key}")
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError(f"Неверный размер выборки: {size}")
+        super().__init__(seed)
+        self.key = key
+        self.size = size
+
+    def select(self, records, selection):
+        if self.key not in selection.keys:
+            raise ValueError(f"В этом наборе нет ключа для стратификации: {self.key}")
+        rnd = random.Random(self.seed)
+        index = selection.keys[self.key]
+        size = self.size
+        counts = Counter()
+        strata = {}
+        for position, record in enumerate(records):
+            stratum = record[index] if len(record) > index else None
+            seen = counts[stratum]
+            counts[stratum] = seen + 1
+            if seen < size:
+                strata.setdefault(stratum, []).append((position, record))
+            else:
+                j = rnd.randrange(seen + 1)
+                if j < size:
+                    strata[stratum][j] = (position, record)
+        selection.population = {_stratum_key(stratum): n for stratum, n in counts.items()}
+        chosen = [item for items in strata.values() for item in items]
+        chosen.sort(key=lambda x: x[0])
+        return [record for _, record in chosen]
+
+
+def _stratum_key(value):
+    # страты собираются по сырому полю csv, а в колонках ключи — числа
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def collect(chunks, selection, key=None, value=None):
+    # колонки выборки для оценок: страты, группы (None — одна группа на всё) и значения;
+    # selection — отбор загрузчика (None — полные данные). key — колонка или функция,
+    # возвращающая группу каждой строки блока
+    strata_column = COLUMNS[selection.key] if selection is not None and selection.key else None
+    strata, groups, values = [], [], []
+    rows = 0
+    for chunk in chunks:
+        size = len(chunk[0])
+        rows += size
+        if callable(key):
+            groups.extend(key(chunk))
+        else:
+            groups.extend(getattr(chunk, COLUMNS[key]) if key is not None else repeat(None, size))
+        if strata_column is not None:
+            strata.extend(getattr(chunk, strata_column))
+        if value is not None:
+            values.extend(getattr(chunk, COLUMNS[value]))
+    if strata_column is None:
+        strata = repeat(None, rows)
+    # без выборки данные полные: одна страта, в которую попали все строки
+    population = selection.population if selection is not None else {None: rows}
+    return population, strata, groups, values
+
+
+def _variance(N, n, s2):
+    # дисперсия оценки суммы по страте: N_h^2 (1 - n_h/N_h) s^2 / n_h
+    return N * N * (1 - n / N) * s2 / n
+
+
+def estimate_totals(population, strata, groups, z=Z, sizes=None):
+    # число строк по группам в исходных данных: стратифицированная оценка Хорвица — Томпсона.
+    # sizes — число строк выборки в стратах, если строка входит в несколько групп
+    # (фильм с несколькими жанрами) и пары (страта, группа) повторяют её
+    strata = list(strata)
+    sizes = Counter(strata) if sizes is None else sizes
+    cells = Counter(zip(strata, groups))
+    totals = Counter()
+    variances = Counter()
+    for (h, g), y in cells.items():
+        N, n = population[h], sizes[h]
+        totals[g] += N * y / n
+        if n > 1:
+            p = y / n
+            variances[g] += _variance(N, n, p * (1 - p) * n / (n - 1))
+    return {g: Estimate(totals[g], z * variances[g] ** 0.5) for g in totals}
+
+
+def estimate_means(population, strata, groups, values, z=Z):
+    # среднее значение по группам: отношение оценок суммы и числа строк,
+    # дисперсия — линеаризацией отношения
+    strata = list(strata)
+    sizes = Counter(strata)
+    cells = {}
+    for h, g, v in zip(strata, groups, values):
+        cell = cells.get((h, g))
+        if cell is None:
+            cell = cells[h, g] = [0, 0.0, 0.0]
+        cell[0] += 1
+        cell[1] += v
+        cell[2] += v * v
+    counts = Counter()
+    sums = Counter()
+    for (h, g), (n_hg, s, _) in cells.items():
+        weight = population[h] / sizes[h]
+        counts[g] += weight * n_hg
+        sums[g] += weight * s
+    means = {g: sums[g] / counts[g] for g in counts}
+    variances = Counter()
+    for (h, g), (n_hg, s, ss) in cells.items():
+        n = sizes[h]
+        if n <= 1:
+            continue
+        r, total = means[g], counts[g]
+        z_sum = (s - r * n_hg) / total
+        z_sq = max(ss - 2 * r * s + r * r * n_hg, 0.0) / (total * total)
+        variances[g] += _variance(population[h], n, max(z_sq - z_sum * z_sum / n, 0.0) / (n - 1))
+    return {g: Estimate(means[g], z * variances[g] ** 0.5) for g in means}
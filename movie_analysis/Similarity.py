@@ -0,0 +1,131 @@
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from heapq import nlargest
+from itertools import compress
+from operator import truediv
+
+METRICS = ('cosine', 'pearson')
+DEFAULT_BLOCK = 256
+
+# матрицы воркера: передаются один раз через initializer, а не с каждым блоком
+_state = {}
+
+
+class Neighbours:
+    # top-k соседей каждого ключа в виде CSR: соседи ключа ids[i] — neighbour_ids и scores
+    # в диапазоне offsets[i]:offsets[i+1], по убыванию сходства. Колонки можно хранить
+    # в BinaryCache и читать через mmap без разбора
+    def __init__(self, ids, offsets, neighbour_ids, scores):
+        self.ids = ids
+        self.offsets = offsets
+        self.neighbour_ids = neighbour_ids
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, key):
+        i = bisect_left(self.ids, key)
+        return i < len(self.ids) and self.ids[i] == key
+
+    def get(self, key, n=None):
+        # [(ключ соседа, сходство)], пустой список для неизвестного ключа
+        i = bisect_left(self.ids, key)
+        if i == len(self.ids) or self.ids[i] != key:
+            return []
+        a, b = self.offsets[i], self.offsets[i + 1]
+        if n is not None:
+            b = min(b, a + n)
+        return list(zip(self.neighbour_ids[a:b], self.scores[a:b]))
+
+    def columns(self):
+        return {'ids': self.ids, 'offsets': self.offsets, 'neighbour_ids': self.neighbour_ids, 'scores': self.scores}
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(columns['ids'], columns['offsets'], columns['neighbour_ids'], columns['scores'])
+
+
+def _init(entities, others, norms, k, min_support):
+    _state.update(entities=entities, others=others, norms=norms, k=k, min_support=min_support)
+
+
+def _block(start, end):
+    # соседи для строк start..end: скалярные произведения накапливаются только по
+    # встретившимся парам (через общих пользователей), плотная матрица не строится
+    entities, others, norms = _state['entities'], _state['others'], _state['norms']
+    k, min_support = _state['k'], _state['min_support']
+    e_ptr, e_idx, e_data = entities.indptr, entities.indices, entities.data
+    o_ptr, o_idx, o_data = others.indptr, others.indices, others.data
+    offsets = array('q')
+    neighbours = array('i')
+    scores = array('f')
+    for i in range(start, end):
+        offsets.append(len(neighbours))
+        norm = norms[i]
+        if not norm:
+            continue
+        dots = {}
+        get = dots.get
+        support = {} if min_support > 1 else None
+        for p in range(e_ptr[i], e_ptr[i + 1]):
+            o, w = e_idx[p], e_data[p]
+            a, b = o_ptr[o], o_ptr[o + 1]
+            for j, v in zip(o_idx[a:b], o_data[a:b]):
+                dots[j] = get(j, 0.0) + w * v
+            if support is not None:
+                for j in o_idx[a:b]:
+                    support[j] = support.get(j, 0) + 1
+        dots.pop(i, None)
+        keys = list(dots)
+        if support is not None:
+            keys = list(compress(keys, (support[j] >= min_support for j in keys)))
+        denominators = [norm * norms[j] for j in keys]
+        usable = [d > 0 for d in denominators]
+        keys = list(compress(keys, usable))
+        values = map(truediv, map(dots.__getitem__, keys), compress(denominators, usable))
+        for value, j in nlargest(k, zip(values, keys)):
+            neighbours.append(j)
+            scores.append(value)
+    return offsets, neighbours, scores
+
+
+def neighbours(entities, k=20, metric='cosine', workers=1, block=DEFAULT_BLOCK, min_support=1):
+    # entities — матрица «объект × признак» (фильмы × пользователи для item-item),
+    # сходство — косинус строк или корреляция Пирсона (косинус центрированных строк)
+    if metric not in METRICS:
+        raise ValueError(f"Неизвестная мера сходства: {metric}")
+    if not isinstance(k, int) or k <= 0:
+        raise ValueError(f"Неверное значение аргумента: {k}")
+    if metric == 'pearson':
+        entities = entities.centered()
+    others = entities.transpose()
+    norms = entities.row_norms()
+    n = len(entities.row_ids)
+    blocks = [(start, min(start + block, n)) for start in range(0, n, block)]
+    parts = []
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                 initargs=(entities, others, norms, k, min_support)) as pool:
+            futures = [pool.submit(_block, a, b) for a, b in blocks]
+            parts = [future.result() for future in futures]
+    else:
+        _init(entities, others, norms, k, min_support)
+        try:
+            parts = [_block(a, b) for a, b in blocks]
+        finally:
+            _state.clear()
+
+    # блоки склеиваются по порядку: смещения каждого сдвигаются на уже набранное
+    offsets = array('q')
+    neighbour_ids = array('i')
+    scores = array('f')
+    ids = entities.row_ids
+    for part_offsets, part_neighbours, part_scores in parts:
+        base = len(neighbour_ids)
+        offsets.extend(base + offset for offset in part_offsets)
+        neighbour_ids.extend(ids[j] for j in part_neighbours)
+        scores.extend(part_scores)
+    offsets.append(len(neighbour_ids))
+    return Neighbours(array('i', ids), offsets, neighbour_ids, scores)
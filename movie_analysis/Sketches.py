@@ -0,0 +1,340 @@
+import base64
+import json
+import zlib
+from collections import Counter, defaultdict
+from hashlib import blake2b
+from math import ceil, log
+from .TagIndex import normalize
+
+# приближённые структуры ограниченного размера. Все сливаются (merge) без потери гарантий
+# и сериализуются в байты (dumps/loads), поэтому их можно строить по частям данных, по дням
+# или на разных машинах и объединять потом
+MASK64 = (1 << 64) - 1
+
+
+def hash64(value):
+    # стабильный между процессами 64-битный хэш (hash() для строк рандомизирован)
+    if isinstance(value, int):
+        # splitmix64
+        x = (value + 0x9E3779B97F4A7C15) & MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+        return x ^ (x >> 31)
+    return int.from_bytes(blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    # число уникальных значений; относительная ошибка около 1.04 / sqrt(2^precision)
+    def __init__(self, precision=12):
+        if not isinstance(precision, int) or not 4 <= precision <= 18:
+            raise ValueError(f"Неверная точность HyperLogLog: {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def update(self, values):
+        # повторы внутри блока ничего не меняют, поэтому хэшируются только уникальные
+        p = self.precision
+        rest = 64 - p
+        low = (1 << rest) - 1
+        registers = self.registers
+        for value in set(values):
+            h = hash64(value)
+            rank = rest - (h & low).bit_length() + 1
+            i = h >> rest
+            if rank > registers[i]:
+                registers[i] = rank
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Нельзя слить HyperLogLog разной точности")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # малые значения — линейный подсчёт по пустым регистрам
+            estimate = m * log(m / zeros)
+        return round(estimate)
+
+    def __len__(self):
+        return self.count()
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': base64.b64encode(self.registers).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['precision'])
+        sketch.registers = bytearray(base64.b64decode(data['registers']))
+        return sketch
+
+
+class SpaceSaving:
+    # частые элементы: не более capacity счётчиков. count — оценка сверху,
+    # count - error — снизу; элемент с частотой больше n / capacity гарантированно в сводке
+    def __init__(self, capacity=1000):
+        if not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError(f"Неверная ёмкость: {capacity}")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.n = 0
+
+    def _floor(self):
+        # сколько мог набрать элемент, которого в заполненной сводке нет
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def update(self, items):
+        # блок считается точно и сливается со сводкой
+        exact = SpaceSaving(self.capacity)
+        exact.counts = Counter(items)
+        exact.errors = dict.fromkeys(exact.counts, 0)
+        exact.n = sum(exact.counts.values())
+        exact.capacity = max(len(exact.counts), 1)
+        return self._merge(exact, exact_other=True)
+
+    def merge(self, other):
+        return self._merge(other)
+
+    def _merge(self, other, exact_other=False):
+        floor_self = self._floor()
+        floor_other = 0 if exact_other else other._floor()
+        counts = {}
+        errors = {}
+        for key in self.counts.keys() | other.counts.keys():
+            counts[key] = self.counts.get(key, floor_self) + other.counts.get(key, floor_other)
+            errors[key] = self.errors.get(key, floor_self) + other.errors.get(key, floor_other)
+        if len(counts) > self.capacity:
+            kept = sorted(counts, key=counts.__getitem__, reverse=True)[:self.capacity]
+            counts = {key: counts[key] for key in kept}
+            errors = {key: errors[key] for key in kept}
+        self.counts = counts
+        self.errors = errors
+        self.n += other.n
+        return self
+
+    def top(self, n):
+        # при равных оценках — по меньшей погрешности
+        items = sorted(self.counts.items(), key=lambda x: (x[1], -self.errors[x[0]]), reverse=True)
+        return items[:n]
+
+    def bounds(self, key):
+        if key in self.counts:
+            return self.counts[key] - self.errors[key], self.counts[key]
+        return 0, self._floor()
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'n': self.n,
+                'items': [[key, count, self.errors[key]] for key, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['capacity'])
+        sketch.n = data['n']
+        for key, count, error in data['items']:
+            sketch.counts[key] = count
+            sketch.errors[key] = error
+        return sketch
+
+
+class KLL:
+    # квантили: уровни-компакторы, элемент уровня h весит 2^h. Размер O(k log(n/k)),
+    # ошибка ранга порядка 1.7 / k. Половина при сжатии выбирается поочерёдно,
+    # чтобы результат не зависел от генератора случайных чисел
+    def __init__(self, k=64):
+        if not isinstance(k, int) or k < 8:
+            raise ValueError(f"Неверный параметр k: {k}")
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.coin = 0
+
+    def _capacity(self, h):
+        return max(2, ceil(self.k * (2 / 3) ** (len(self.levels) - h - 1)))
+
+    def _compress(self):
+        while sum(map(len, self.levels)) > sum(map(self._capacity, range(len(self.levels)))):
+            h = next(h for h, level in enumerate(self.levels) if len(level) >= self._capacity(h))
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+            level = sorted(self.levels[h])
+            keep = [level.pop()] if len(level) % 2 else []
+            self.coin ^= 1
+            self.levels[h + 1].extend(level[self.coin::2])
+            self.levels[h] = keep
+
+    def update(self, values):
+        values = list(values)
+        self.levels[0].extend(values)
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError("Нельзя слить KLL с разным k")
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in zip(self.levels, other.levels):
+            level.extend(items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = sorted((v, 1 << h) for h, level in enumerate(self.levels) for v in level)
+        return items, sum(w for _, w in items)
+
+    def quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError(f"Неверный квантиль: {q}")
+        items, total = self._weighted()
+        if not items:
+            return 0
+        target = q * total
+        seen = 0
+        for value, weight in items:
+            seen += weight
+            if seen >= target:
+                return value
+        return items[-1][0]
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def rank(self, value):
+        # доля значений не больше value
+        items, total = self._weighted()
+        return sum(w for v, w in items if v <= value) / total if total else 0.0
+
+    def __len__(self):
+        return self.n
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'coin': self.coin, 'levels': self.levels}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.n = data['n']
+        sketch.coin = data['coin']
+        sketch.levels = [list(level) for level in data['levels']]
+        return sketch
+
+
+class StreamSummary:
+    # приближённая аналитика Ratings и Tags по блокам строк: уникальные пользователи и фильмы,
+    # самые частые фильмы, пользователи и теги, для оценок — count/sum и KLL по каждому
+    # фильму и пользователю. Размер на ключ ограничен, сводки разных частей данных сливаются
+    def __init__(self, capacity=1000, k=64, precision=12):
+        self.capacity = capacity
+        self.k = k
+        self.precision = precision
+        self.users = HyperLogLog(precision)
+        self.movies = HyperLogLog(precision)
+        self.top_movies = SpaceSaving(capacity)
+        self.top_users = SpaceSaving(capacity)
+        self.top_tags = SpaceSaving(capacity)
+        self.ratings = {'movie': {}, 'user': {}}
+        self.moments = {'movie': {}, 'user': {}}
+
+    def update(self, chunk):
+        # chunk — RatingChunk или TagChunk
+        self.users.update(chunk.user_ids)
+        self.movies.update(chunk.movie_ids)
+        self.top_movies.update(chunk.movie_ids)
+        self.top_users.update(chunk.user_ids)
+        if hasattr(chunk, 'tags'):
+            self.top_tags.update(map(normalize, chunk.tags))
+        if hasattr(chunk, 'ratings'):
+            self._add_ratings('movie', chunk.movie_ids, chunk.ratings)
+            self._add_ratings('user', chunk.user_ids, chunk.ratings)
+        return self
+
+    def _add_ratings(self, key, keys, ratings):
+        groups = defaultdict(list)
+        for group, rating in zip(keys, ratings):
+            groups[group].append(rating)
+        sketches = self.ratings[key]
+        moments = self.moments[key]
+        for group, values in groups.items():
+            sketch = sketches.get(group)
+            if sketch is None:
+                sketch = sketches[group] = KLL(self.k)
+                moments[group] = [0, 0.0]
+            sketch.update(values)
+            moments[group][0] += len(values)
+            moments[group][1] += sum(values)
+
+    def merge(self, other):
+        if (other.capacity, other.k, other.precision) != (self.capacity, self.k, self.precision):
+            raise ValueError("Нельзя слить сводки с разными параметрами")
+        self.users.merge(other.users)
+        self.movies.merge(other.movies)
+        self.top_movies.merge(other.top_movies)
+        self.top_users.merge(other.top_users)
+        self.top_tags.merge(other.top_tags)
+        for key in ('movie', 'user'):
+            sketches = self.ratings[key]
+            moments = self.moments[key]
+            for group, sketch in other.ratings[key].items():
+                if group in sketches:
+                    sketches[group].merge(sketch)
+                    moments[group][0] += other.moments[key][group][0]
+                    moments[group][1] += other.moments[key][group][1]
+                else:
+                    sketches[group] = KLL.from_dict(sketch.to_dict())
+                    moments[group] = list(other.moments[key][group])
+        return self
+
+    def means(self, key, min_count=1):
+        return {group: s / n for group, (n, s) in self.moments[key].items() if n >= min_count}
+
+    def medians(self, key, min_count=1):
+        return {group: sketch.median() for group, sketch in self.ratings[key].items() if sketch.n >= min_count}
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity, 'k': self.k, 'precision': self.precision,
+            'users': self.users.to_dict(), 'movies': self.movies.to_dict(),
+            'top_movies': self.top_movies.to_dict(), 'top_users': self.top_users.to_dict(),
+            'top_tags': self.top_tags.to_dict(),
+            # ключи JSON-объектов — только строки, поэтому группы хранятся списком пар
+            'ratings': {key: [[group, sketch.to_dict(), self.moments[key][group]]
+                              for group, sketch in sketches.items()]
+                        for key, sketches in self.ratings.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['capacity'], data['k'], data['precision'])
+        summary.users = HyperLogLog.from_dict(data['users'])
+        summary.movies = HyperLogLog.from_dict(data['movies'])
+        summary.top_movies = SpaceSaving.from_dict(data['top_movies'])
+        summary.top_users = SpaceSaving.from_dict(data['top_users'])
+        summary.top_tags = SpaceSaving.from_dict(data['top_tags'])
+        for key, groups in data['ratings'].items():
+            for group, sketch, moments in groups:
+                summary.ratings[key][group] = KLL.from_dict(sketch)
+                summary.moments[key][group] = list(moments)
+        return summary
+
+
+SKETCHES = {cls.__name__: cls for cls in (HyperLogLog, SpaceSaving, KLL, StreamSummary)}
+
+
+def dumps(sketch):
+    data = {'type': type(sketch).__name__, 'data': sketch.to_dict()}
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def loads(raw):
+    data = json.loads(zlib.decompress(raw))
+    if data.get('type') not in SKETCHES:
+        raise ValueError(f"Неизвестный тип скетча: {data.get('type')}")
+    return SKETCHES[data['type']].from_dict(data['data'])
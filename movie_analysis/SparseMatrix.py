@@ -0,0 +1,104 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, chain, repeat
+from operator import add, mul, sub
+
+
+class SparseMatrix:
+    # CSR: строка i — значения data[indptr[i]:indptr[i+1]] в столбцах indices[...] того же
+    # диапазона, столбцы внутри строки по возрастанию. row_ids и col_ids — исходные ключи
+    # (userId, movieId) по возрастанию, индексы строк и столбцов — позиции в них.
+    # transpose() даёт ту же матрицу по столбцам (CSC исходной)
+    def __init__(self, row_ids, col_ids, indptr, indices, data):
+        self.row_ids = row_ids
+        self.col_ids = col_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_columns(cls, rows, cols, values):
+        # rows, cols, values — колонки одинаковой длины (ключ строки, ключ столбца, значение)
+        row_ids = array('i', sorted(set(rows)))
+        col_ids = array('i', sorted(set(cols)))
+        row_pos = {key: i for i, key in enumerate(row_ids)}
+        col_pos = {key: j for j, key in enumerate(col_ids)}
+        return cls._build(row_ids, col_ids, list(map(row_pos.__getitem__, rows)),
+                          list(map(col_pos.__getitem__, cols)), values)
+
+    @classmethod
+    def from_chunks(cls, chunks, rows='user_ids', cols='movie_ids', values='ratings'):
+        r, c, v = array('i'), array('i'), array('f')
+        for chunk in chunks:
+            r.extend(getattr(chunk, rows))
+            c.extend(getattr(chunk, cols))
+            v.extend(getattr(chunk, values))
+        return cls.from_columns(r, c, v)
+
+    @classmethod
+    def _build(cls, row_ids, col_ids, rows, cols, values):
+        # сортировка позиций по (строка, столбец) целиком на встроенных функциях
+        width = len(col_ids)
+        keys = list(map(add, map(mul, rows, repeat(width)), cols))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        counts = Counter(rows)
+        indptr = array('q', [0])
+        indptr.extend(accumulate(map(counts.__getitem__, range(len(row_ids)))))
+        indices = array('i', map(cols.__getitem__, order))
+        data = array('f', map(values.__getitem__, order))
+        return cls(row_ids, col_ids, indptr, indices, data)
+
+    @property
+    def shape(self):
+        return len(self.row_ids), len(self.col_ids)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def row_index(self, key):
+        i = bisect_left(self.row_ids, key)
+        if i == len(self.row_ids) or self.row_ids[i] != key:
+            raise KeyError(key)
+        return i
+
+    def row(self, i):
+        # (индексы столбцов, значения) строки i
+        a, b = self.indptr[i], self.indptr[i + 1]
+        return self.indices[a:b], self.data[a:b]
+
+    def row_sizes(self):
+        return array('i', map(sub, self.indptr[1:], self.indptr[:-1]))
+
+    def row_means(self):
+        sizes = self.row_sizes()
+        return array('d', (sum(self.data[self.indptr[i]:self.indptr[i + 1]]) / n if n else 0.0
+                           for i, n in enumerate(sizes)))
+
+    def row_norms(self):
+        return array('d', (sum(v * v for v in self.data[self.indptr[i]:self.indptr[i + 1]]) ** 0.5
+                           for i in range(len(self.row_ids))))
+
+    def centered(self):
+        # значения за вычетом среднего своей строки (для корреляции Пирсона)
+        means = self.row_means()
+        shifts = chain.from_iterable(map(repeat, means, self.row_sizes()))
+        return SparseMatrix(self.row_ids, self.col_ids, self.indptr, self.indices,
+                            array('f', map(sub, self.data, shifts)))
+
+    def transpose(self):
+        rows = list(chain.from_iterable(map(repeat, range(len(self.row_ids)), self.row_sizes())))
+        return self._build(self.col_ids, self.row_ids, list(self.indices), rows, self.data)
+
+    def get(self, row_key, col_key, default=0.0):
+        try:
+            i = self.row_index(row_key)
+        except KeyError:
+            return default
+        j = bisect_left(self.col_ids, col_key)
+        if j == len(self.col_ids) or self.col_ids[j] != col_key:
+            return default
+        a, b = self.indptr[i], self.indptr[i + 1]
+        k = bisect_left(self.indices, j, a, b)
+        return self.data[k] if k < b and self.indices[k] == j else default
@@ -0,0 +1,122 @@
+from array import array
+from bisect import bisect_left
+
+
+def normalize(tag):
+    return tag.strip().lower()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Vocabulary:
+    # интернированные нормализованные теги (id -> текст) и статистика по каждому:
+    # число слов, длина, частота, фильмы и пользователи
+    def __init__(self):
+        self.texts = []
+        self.ids = {}
+        self.word_counts = array('I')
+        self.lengths = array('I')
+        self.frequency = array('i')
+        self.movies = []
+        self.users = []
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def intern(self, tag):
+        tag = normalize(tag)
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            tag_id = self.ids[tag] = len(self.texts)
+            self.texts.append(tag)
+            self.word_counts.append(len(tag.split()))
+            self.lengths.append(len(tag))
+            self.frequency.append(0)
+            self.movies.append(set())
+            self.users.append(set())
+            self._sorted = None
+        return tag_id
+
+    def observe(self, tag_id, movie_id, user_id):
+        self.frequency[tag_id] += 1
+        self.movies[tag_id].add(movie_id)
+        self.users[tag_id].add(user_id)
+
+    def add(self, tag, movie_id, user_id):
+        tag_id = self.intern(tag)
+        self.observe(tag_id, movie_id, user_id)
+        return tag_id
+
+    def sorted_ids(self):
+        if self._sorted is None:
+            self._sorted = sorted(range(len(self.texts)), key=self.texts.__getitem__)
+        return self._sorted
+
+
+class TagIndex:
+    # инвертированные индексы над словарём: триграммы, отдельные слова, префиксы.
+    # Новые записи словаря доиндексируются при следующем запросе
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.grams = {}
+        self.words = {}
+        self.indexed = 0
+
+    @classmethod
+    def build(cls, rows):
+        vocab = Vocabulary()
+        for row in rows:
+            vocab.add(row['tag'], row['movieId'], row['userId'])
+        return cls(vocab)
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def refresh(self):
+        texts = self.vocab.texts
+        for tag_id in range(self.indexed, len(texts)):
+            tag = texts[tag_id]
+            for gram in trigrams(tag):
+                self.grams.setdefault(gram, array('i')).append(tag_id)
+            for word in set(tag.split()):
+                self.words.setdefault(word, array('i')).append(tag_id)
+        self.indexed = len(texts)
+
+    def contains(self, word):
+        self.refresh()
+        texts = self.vocab.texts
+        word = normalize(word)
+        if len(word) < 3:
+            return [tag for tag in texts if word in tag]
+        postings = sorted((self.grams.get(gram, ()) for gram in trigrams(word)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [texts[i] for i in sorted(candidates) if word in texts[i]]
+
+    def with_word(self, word):
+        self.refresh()
+        return [self.vocab.texts[i] for i in self.words.get(normalize(word), ())]
+
+    def with_prefix(self, prefix):
+        texts = self.vocab.texts
+        order = self.vocab.sorted_ids()
+        prefix = normalize(prefix)
+        start = bisect_left(order, prefix, key=texts.__getitem__)
+        result = []
+        for tag_id in order[start:]:
+            if not texts[tag_id].startswith(prefix):
+                break
+            result.append(texts[tag_id])
+        return result
+
+    def movies_for(self, tag):
+        tag_id = self.vocab.ids.get(normalize(tag))
+        return set() if tag_id is None else set(self.vocab.movies[tag_id])
+
+    def users_for(self, tag):
+        tag_id = self.vocab.ids.get(normalize(tag))
+        return set() if tag_id is None else set(self.vocab.users[tag_id])
@@ -1,53 +1,271 @@
 import os
-from collections import Counter
-from datetime import datetime
+from array import array
+from . import BinaryCache
+from . import Metrics
+from collections import Counter, namedtuple
+from datetime import timezone
+from .Catalog import Catalog
+from . import Sampling
+from .Sketches import StreamSummary
+from . import TimeBuckets
+from .TagIndex import TagIndex, Vocabulary, normalize
+from .Reader import DEFAULT_CHUNK_SIZE, batched, complete_size, read_rows, read_tail
+from .TopK import top_k
+from .Views import PositionIndex, SequenceView, Subset
 
+
+class TagChunk(namedtuple('TagChunk', 'user_ids movie_ids tags timestamps')):
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(
+            array('i', [r['userId'] for r in rows]),
+            array('i', [r['movieId'] for r in rows]),
+            [r['tag'] for r in rows],
+            array('q', [r['timestamp'] for r in rows]),
+        )
+
+
+class TagTexts(SequenceView):
+    # исходный текст тега для каждой строки, через интернированные id
+    def __init__(self, outer):
+        self.outer = outer
+
+    def __len__(self):
+        return len(self.outer.tag_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.outer.raw_texts[self.outer.tag_ids[i]]
+
+
+class TagRows(TagTexts):
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        outer = self.outer
+        return {
+            'userId': outer.user_ids[i],
+            'movieId': outer.movie_ids[i],
+            'tag': outer.raw_texts[outer.tag_ids[i]],
+            'timestamp': outer.timestamps[i],
+        }
+
+
+@Metrics.instrument
 class Tags:
-    def __init__(self, path='./ml-latest-small/tags.csv', limit=1000):
+    CACHE_SCHEMA = 'tags/2'
+    SAMPLE_KEYS = {'user': 0, 'movie': 1}
+
+    def __init__(self, path='./ml-latest-small/tags.csv', limit=Sampling.DEFAULT_LIMIT, movies_path=None,
+                 stream=False, chunk_size=DEFAULT_CHUNK_SIZE, cache=False, sample=None):
         if not os.path.isfile(path) or os.path.getsize(path) == 0:
             raise FileNotFoundError(f"Файл не найден или пустой: {path}")
+        if sample is not None and not isinstance(sample, Sampling.Sampler):
+            raise TypeError("sample должен быть выборкой из модуля Sampling")
         self.path=path
-        self.limit=limit
-        self.tags = []
-        with open(self.path, 'r', encoding='utf-8') as file:
-            next(file)  
-            try:
-                for i, line in enumerate(file):
-                    if i >= self.limit:
-                        break
-                    parts = line.strip().split(',', 3)  
-                    if len(parts) < 4:
-                        continue
-                    user_id = int(parts[0])
-                    movie_id = int(parts[1])
-                    tag = parts[2]
-                    timestamp = int(parts[3])
-                    self.tags.append({'userId': user_id, 'movieId': movie_id, 'tag': tag, 'timestamp': timestamp})
-                    
-            except Exception as e:
-                print(f"Ошибка при загрузке тегов: {e}, line:{i+2} - {line}")
+        self.limit = Sampling.resolve_limit(limit, sample)
+        self.movies_path = movies_path or Catalog.default_path(path)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.sample = sample
+        self._select = sample.selector(self.SAMPLE_KEYS) if sample is not None else None
+        # строки — целочисленные колонки; tag_ids ссылаются на уникальные исходные тексты,
+        # а те через raw_norm — на словарь нормализованных тегов
+        self.user_ids = array('i')
+        self.movie_ids = array('i')
+        self.tag_ids = array('i')
+        self.timestamps = array('q')
+        self.raw_texts = []
+        self.raw_ids = {}
+        self.raw_norm = array('i')
+        self._vocab = None
+        self._index = None
+        self._buckets = {}
+        self._positions = {}
+        self._summaries = {}
+        # граница загрузки и начало для refresh(), как в Ratings
+        self._offset = complete_size(path)
+        if self.stream:
+            pass
+        elif self.cache and self.sample is None:
+            self.load_cached()
+        else:
+            self.load()
+
+    @staticmethod
+    def parse_record(fields):
+        if len(fields) < 4:
+            return None
+        user_id, movie_id, tag, timestamp = fields
+        return {'userId': int(user_id), 'movieId': int(movie_id), 'tag': tag, 'timestamp': int(timestamp)}
+
+    def read_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        for batch in batched(read_rows(self.path, self.parse_record, self.limit, self._select, self._offset), chunk_size):
+            yield TagChunk.from_rows(batch)
+
+    def _add_chunk(self, chunk):
+        if self._vocab is None:
+            self._vocab = Vocabulary()
+        vocab = self._vocab
+        for user_id, movie_id, tag in zip(chunk.user_ids, chunk.movie_ids, chunk.tags):
+            raw_id = self.raw_ids.get(tag)
+            if raw_id is None:
+                raw_id = self.raw_ids[tag] = len(self.raw_texts)
+                self.raw_texts.append(tag)
+                self.raw_norm.append(vocab.intern(tag))
+            self.tag_ids.append(raw_id)
+            vocab.observe(self.raw_norm[raw_id], movie_id, user_id)
+        self.user_ids.extend(chunk.user_ids)
+        self.movie_ids.extend(chunk.movie_ids)
+        self.timestamps.extend(chunk.timestamps)
+        for column, index in self._positions.items():
+            index.extend(getattr(chunk, column))
+        for (unit, tz), counts in self._buckets.items():
+            counts.update(TimeBuckets.count(filter(None, chunk.timestamps), unit, tz))
+        for summary in self._summaries.values():
+            summary.update(chunk)
+
+    def load(self):
+        for chunk in self.read_chunks(self.chunk_size):
+            self._add_chunk(chunk)
+
+    def build_columns(self):
+        columns = {'userId': array('i'), 'movieId': array('i'), 'tag': [], 'timestamp': array('q')}
+        for row in read_rows(self.path, self.parse_record, end=self._offset):
+            for name, column in columns.items():
+                column.append(row[name])
+        return columns
+
+    def load_cached(self):
+        columns = BinaryCache.load_or_build(self.path, self.CACHE_SCHEMA, self.build_columns, size=self._offset)
+        self._add_chunk(TagChunk(
+            columns['userId'][:self.limit],
+            columns['movieId'][:self.limit],
+            columns['tag'][:self.limit],
+            columns['timestamp'][:self.limit],
+        ))
+
+    def append(self, rows):
+        # rows — словари как из parse_record; словарь тегов и индекс дополняются на месте
+        if self.stream:
+            raise ValueError("В режиме stream данные читаются из файла, append недоступен")
+        if self.sample is not None:
+            raise ValueError("Для выборки append недоступен: новые строки не прошли бы отбор")
+        rows = list(rows)
+        if rows:
+            self._add_chunk(TagChunk.from_rows(rows))
+        return len(rows)
 
+    def refresh(self):
+        rows, offset = read_tail(self.path, self.parse_record, self._offset)
+        if self.stream:
+            self._offset = offset
+            if rows:
+                self._vocab = self._index = None
+                self._buckets = {}
+                self._summaries = {}
+            return len(rows)
+        count = self.append(rows)
+        self._offset = offset
+        return count
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    @property
+    def population(self):
+        # размеры страт в полном файле по итогам отбора; None без выборки
+        return self._select.population if self._select is not None else None
+
+    @property
+    def tags(self):
+        return TagRows(self)
+
+    def chunks(self):
+        if self.stream:
+            yield from self.read_chunks(self.chunk_size)
+        else:
+            Metrics.add(len(self.tag_ids))
+            yield TagChunk(self.user_ids, self.movie_ids, TagTexts(self), self.timestamps)
+
+    def rows(self):
+        for chunk in self.chunks():
+            for user_id, movie_id, tag, timestamp in zip(*chunk):
+                yield {'userId': user_id, 'movieId': movie_id, 'tag': tag, 'timestamp': timestamp}
 
     def get_tags(self):
-        return self.tags.copy()
+        # представление только для чтения: строки собираются при обращении
+        return self.tags
+
+    def position_index(self, column):
+        if self.stream:
+            raise ValueError("В режиме stream строки не хранятся в памяти, выборка недоступна")
+        if column not in self._positions:
+            self._positions[column] = PositionIndex(getattr(self, column))
+        return self._positions[column]
+
+    def by_user(self, user_id):
+        return Subset(self.tags, self.position_index('user_ids').get(user_id))
+
+    def by_movie(self, movie_id):
+        return Subset(self.tags, self.position_index('movie_ids').get(movie_id))
+
+    def vocabulary(self):
+        if self._vocab is None:
+            vocab = Vocabulary()
+            for chunk in self.chunks():
+                for user_id, movie_id, tag in zip(chunk.user_ids, chunk.movie_ids, chunk.tags):
+                    vocab.add(tag, movie_id, user_id)
+            self._vocab = vocab
+        return self._vocab
+
+    def tag_index(self):
+        if self._index is None:
+            self._index = TagIndex(self.vocabulary())
+        return self._index
+
+    def movie_ids_where(self, tag=None):
+        if tag is not None:
+            return self.tag_index().movies_for(tag)
+        return set().union(*self.vocabulary().movies)
+
+    def summary(self, capacity=1000, k=64, precision=12):
+        params = (capacity, k, precision)
+        if params not in self._summaries:
+            summary = StreamSummary(capacity, k, precision)
+            for chunk in self.chunks():
+                summary.update(chunk)
+            self._summaries[params] = summary
+        return self._summaries[params]
+
+    def estimate_counts(self, key='movie', z=Sampling.Z):
+        # число тегов в полном файле по фильмам, пользователям или тексту тега (None — всего);
+        # с выборкой через эти оценки идут most_popular и распределения по времени
+        population, strata, groups, _ = Sampling.collect(self.chunks(), self._select, key)
+        return Sampling.estimate_totals(population, strata, groups, z)
+
+    def get_titles(self):
+        return Catalog.get(self.movies_path).titles
 
     def most_words(self, n=5):
         if not isinstance(n, int) or n <= 0:
             raise ValueError(f"Неверное значение аргумента: {n}")
         
-        unique_tags = set(i['tag'].strip().lower() for i in self.tags)
-        counts = {tag: len(tag.split()) for tag in unique_tags}
+        vocab = self.vocabulary()
+        counts = ((vocab.texts[i], vocab.word_counts[i]) for i in vocab.sorted_ids())
 
-        return dict(sorted(counts.items(), key=lambda x: x[1], reverse=True)[:n])
+        return dict(top_k(counts, n))
 
     def longest(self, n):
         if not isinstance(n, int) or n <= 0:
             raise ValueError(f"Неверное значение аргумента: {n}")
         
-        unique_tags = set(i['tag'].strip().lower() for i in self.tags)
-        counts = {tag: len(tag) for tag in unique_tags}
+        vocab = self.vocabulary()
+        counts = ((vocab.texts[i], vocab.lengths[i]) for i in vocab.sorted_ids())
 
-        return list(sorted(counts.items(), key=lambda x: x[1], reverse=True)[:n])
+        return list(top_k(counts, n))
     
     def most_words_and_longest(self, n=5):
         if not isinstance(n, int) or n <= 0:
@@ -60,46 +278,50 @@ class Tags:
         return sorted(intersection)
 
     
-    def most_popular(self, n=5):
+    def most_popular(self, n=5, approx=False):
         if not isinstance(n, int) or n <= 0:
             raise ValueError(f"Неверное значение аргумента: {n}")
+        if self.sample is not None:
+            return dict(top_k(self.estimate_counts(lambda chunk: map(normalize, chunk.tags)).items(), n))
+        if approx:
+            return dict(top_k(self.summary().top_tags.counts.items(), n))
         
-        tag_list = [i['tag'].strip().lower() for i in self.tags]
-        counter = Counter(tag_list)
+        vocab = self.vocabulary()
     
-        return dict(counter.most_common(n))
+        return dict(top_k(zip(vocab.texts, vocab.frequency), n))
 
     def tags_with(self, word):
         if not isinstance(word, str) or not word.strip():
             raise ValueError(f"Некорректное слово для поиска: {word}")
 
-        word = word.strip().lower()
-        # set comprehension
-        matching_tags = {
-            i['tag'].strip().lower()
-            for i in self.tags
-            if word in i['tag'].strip().lower()
-        }
+        matching_tags = self.tag_index().contains(word)
 
         return sorted(matching_tags)
 
-    def dist_by_year(self):
-        years = []
-        for tag in self.tags:
-            ts = tag.get('timestamp')
-            if ts:
-                year = datetime.fromtimestamp(ts).year
-                years.append(year)
-        return dict(Counter(years).most_common())
+    def time_buckets(self, unit, tz=timezone.utc):
+        if (unit, tz) not in self._buckets and self.sample is not None:
+            # теги без времени (0) не учитываются, как и без выборки
+            estimates = self.estimate_counts(lambda chunk: TimeBuckets.labels(chunk.timestamps, unit, tz, True))
+            estimates.pop(None, None)
+            self._buckets[unit, tz] = Counter(estimates)
+        if (unit, tz) not in self._buckets:
+            result = Counter()
+            for chunk in self.chunks():
+                result.update(TimeBuckets.count(filter(None, chunk.timestamps), unit, tz))
+            self._buckets[unit, tz] = result
+        return Counter(self._buckets[unit, tz])
+
+    def dist_by_year(self, tz=timezone.utc):
+        return dict(self.time_buckets('year', tz).most_common())
     
-    def dist_by_month(self):
-        months = []
-        for tag in self.tags:
-            ts = tag.get('timestamp')
-            if ts:
-                month = datetime.fromtimestamp(ts).month
-                months.append(month)
-        return dict(Counter(months).most_common())
+    def dist_by_month(self, tz=timezone.utc):
+        return dict(self.time_buckets('month', tz).most_common())
+
+    def dist_by_year_month(self, tz=timezone.utc):
+        return dict(sorted(self.time_buckets('year_month', tz).items()))
+
+    def dist_by_week(self, tz=timezone.utc):
+        return dict(sorted(self.time_buckets('week', tz).items()))
     
 
 if __name__ == '__main__':
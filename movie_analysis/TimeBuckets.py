@@ -0,0 +1,68 @@
+from collections import Counter
+from datetime import date, datetime, timezone
+from itertools import repeat
+from operator import add, floordiv
+
+HOUR = 3600
+DAY = 86400
+QUARTER_HOUR = 900
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+UNITS = {
+    'year': lambda d: d.year,
+    'month': lambda d: d.month,
+    'day': lambda d: d.day,
+    'weekday': lambda d: d.weekday(),
+    'date': lambda d: d.strftime('%Y-%m-%d'),
+    'year_month': lambda d: f'{d.year:04d}-{d.month:02d}',
+    'week': lambda d: '{:04d}-W{:02d}'.format(*d.isocalendar()[:2]),
+    'hour': lambda d: d.hour,
+}
+
+
+def _floor(timestamps, width, shift=0):
+    # деление целиком на встроенных функциях C, без python-кадра на строку
+    if shift:
+        timestamps = map(add, timestamps, repeat(shift))
+    return Counter(map(floordiv, timestamps, repeat(width)))
+
+
+def count(timestamps, unit='year', tz=timezone.utc):
+    # гистограмма по календарным единицам; строки сначала сворачиваются в сутки
+    # (или четверть часа для зон с переходом на летнее время), и только
+    # уникальные значения переводятся в дату
+    if unit not in UNITS:
+        raise ValueError(f"Неизвестная единица времени: {unit}")
+    key = UNITS[unit]
+    result = Counter()
+    if isinstance(tz, timezone):
+        shift = int(tz.utcoffset(None).total_seconds())
+        if unit == 'hour':
+            for h, n in _floor(timestamps, HOUR, shift).items():
+                result[h % 24] += n
+        else:
+            for d, n in _floor(timestamps, DAY, shift).items():
+                result[key(date.fromordinal(d + EPOCH_ORDINAL))] += n
+    else:
+        for q, n in _floor(timestamps, QUARTER_HOUR).items():
+            result[key(datetime.fromtimestamp(q * QUARTER_HOUR, tz))] += n
+    return result
+
+
+def labels(timestamps, unit='year', tz=timezone.utc, skip_zero=False):
+    # единица времени каждой строки по отдельности (для оценок по выборке), как в count;
+    # skip_zero — нулевое время считается отсутствующим и получает None
+    if unit not in UNITS:
+        raise ValueError(f"Неизвестная единица времени: {unit}")
+    key = UNITS[unit]
+    return [None if skip_zero and not ts else key(datetime.fromtimestamp(ts, tz)) for ts in timestamps]
+
+
+def count_bins(timestamps, width, origin=0):
+    # произвольные интервалы: ключ — начало интервала в секундах
+    if not isinstance(width, int) or width <= 0:
+        raise ValueError(f"Неверная ширина интервала: {width}")
+    return Counter({
+        origin + b * width: n
+        for b, n in _floor(timestamps, width, -origin).items()
+    })
@@ -0,0 +1,12 @@
+from heapq import nlargest
+
+
+def by_value(item):
+    return item[1]
+
+
+def top_k(items, n, key=by_value):
+    # n лучших через кучу ограниченного размера, O(N log n).
+    # При равных значениях побеждает элемент, встретившийся раньше, поэтому
+    # результат тот же, что у sorted(items, key=key, reverse=True)[:n]
+    return nlargest(n, items, key=key)
@@ -0,0 +1,67 @@
+from array import array
+from collections.abc import Sequence
+from operator import eq
+
+
+class SequenceView(Sequence):
+    # общая основа представлений только для чтения: сравнение и вывод как у списка,
+    # но без собственной копии данных
+    __hash__ = None
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(map(eq, self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ListView(SequenceView):
+    def __init__(self, items):
+        self._items = items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class Subset(SequenceView):
+    # строки базового представления по массиву позиций
+    def __init__(self, base, positions):
+        self.base = base
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.base[p] for p in self.positions[i]]
+        return self.base[self.positions[i]]
+
+
+class PositionIndex:
+    # ключ -> позиции строк с этим ключом; новые строки дописываются без перестройки
+    def __init__(self, keys=()):
+        self.positions = {}
+        self.size = 0
+        self.extend(keys)
+
+    def extend(self, keys):
+        positions = self.positions
+        start = self.size
+        for i, key in enumerate(keys, start):
+            found = positions.get(key)
+            if found is None:
+                found = positions[key] = array('i')
+            found.append(i)
+        self.size = start + len(keys)
+
+    def get(self, key):
+        return self.positions.get(key, array('i'))
@@ -1,11 +1,36 @@
 
 import pytest
+import httpx
+import json
 import os
 import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from movie_analysis.Tags import Tags
 from movie_analysis.Movies import Movies
 from movie_analysis.Ratings import Ratings
 from movie_analysis.Links import Links
+from movie_analysis.Catalog import Catalog
+from movie_analysis.Fetcher import Fetcher
+from movie_analysis.ImdbCache import ImdbCache
+from movie_analysis import Extractors
+from movie_analysis.ImdbFacts import ImdbFacts, parse_money, parse_runtime
+from movie_analysis.GroupStats import GroupStats
+from movie_analysis.TopK import top_k
+from movie_analysis.TagIndex import TagIndex
+from movie_analysis.GenreIndex import GenreIndex
+from movie_analysis.Query import Query
+from movie_analysis import BinaryCache
+from movie_analysis import TimeBuckets
+from movie_analysis import Metrics
+from movie_analysis import Sampling
+from movie_analysis import Sketches
+from movie_analysis import Similarity
+from movie_analysis import ParallelReader
+from datetime import datetime, timedelta, timezone
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -26,17 +51,75 @@ def ratings():
     assert os.path.isfile('./ml-latest-small/ratings.csv')
     return Ratings(limit=100)
 
+IMDB_PAGE = """<html><body>
+<ul><li data-testid="title-pc-principal-credit"><span>Director</span><a href="/name/nm1/">{director}</a></li></ul>
+<ul>
+<li class="ipc-metadata-list__item"><span>Budget</span><div><span>${budget:,} (estimated)</span></div></li>
+<li class="ipc-metadata-list__item"><span>Gross worldwide</span><div><span>${gross:,}</span></div></li>
+</ul>
+<ul><li data-testid="title-techspec_runtime"><span>Runtime</span><div>{hours} hour {minutes} minutes</div></li></ul>
+</body></html>"""
+
+def imdb_page(imdb_id):
+    return IMDB_PAGE.format(director=f"Director {imdb_id % 3}", budget=imdb_id * 100,
+                            gross=imdb_id * 300, hours=1, minutes=imdb_id % 60)
+
+@contextmanager
+def serve_imdb_stub():
+    hits = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] += 1
+            imdb_id = int(self.path.strip('/').split('/')[-1][2:])
+            # первый запрос к одному из фильмов падает, чтобы проверить повтор
+            if imdb_id == 113497 and hits[self.path] == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = imdb_page(imdb_id).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", hits
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def imdb_stub():
+    with serve_imdb_stub() as stub:
+        yield stub
+
 @pytest.fixture(scope="module")
-def links():
+def links(tmp_path_factory):
+    # страницы IMDb отдаёт локальная заглушка, кэш — во временном каталоге: без сети
     assert os.path.isfile('./ml-latest-small/links.csv')
-    l = Links(path='./ml-latest-small/links.csv', limit=100)
-    ids = list(l.get_links().keys())[:20]
-    info = l.get_imdb(ids)
-    assert info, "IMDb данные не загружены"
-    return l
+    cache = ImdbCache(str(tmp_path_factory.mktemp('imdb') / 'imdb.sqlite'))
+    with serve_imdb_stub() as (url, _), Links(path='./ml-latest-small/links.csv', limit=100, imdb_url=url,
+                                               imdb_cache=cache) as l:
+        ids = list(l.get_links().keys())[:20]
+        info = l.get_imdb(ids)
+        assert info, "IMDb данные не загружены"
+        yield l
+    cache.close()
 
 # ==== Tags Tests ====
 
+def test_tags_rankings_are_deterministic(tags):
+    assert list(tags.most_words(10).items()) == list(tags.most_words(10).items())
+    assert tags.longest(10) == tags.longest(10)
+
 def test_tags_most_words(tags):
     result = tags.most_words(5)
     assert isinstance(result, dict)
@@ -64,6 +147,40 @@ def test_tags_with_word(tags):
     assert isinstance(result, list)
     assert all(isinstance(tag, str) for tag in result)
 
+def test_tags_with_matches_linear_scan():
+    t = Tags(limit=None)
+    for word in ['war', 'W', 'sci', ' Good ', 'zzz', 'based on']:
+        expected = sorted({i['tag'].strip().lower() for i in t.tags if word.strip().lower() in i['tag'].strip().lower()})
+        assert t.tags_with(word) == expected
+    assert t.tag_index() is t.tag_index()
+
+def test_tags_vocabulary():
+    t = Tags(limit=None)
+    vocab = t.vocabulary()
+    assert len(vocab) < len(t) and len(t.raw_texts) < len(t)
+    assert t.tag_ids.typecode == 'i'
+    assert sum(vocab.frequency) == len(t)
+    tag_id = vocab.ids['funny']
+    assert vocab.word_counts[tag_id] == 1 and vocab.lengths[tag_id] == 5
+    streamed = Tags(limit=None, stream=True, chunk_size=500)
+    assert streamed.most_popular(10) == t.most_popular(10)
+    assert streamed.longest(5) == t.longest(5)
+
+def test_tag_index_lookups():
+    rows = [
+        {'userId': 1, 'movieId': 10, 'tag': 'Cold War'},
+        {'userId': 2, 'movieId': 11, 'tag': 'cold war '},
+        {'userId': 2, 'movieId': 12, 'tag': 'warm'},
+        {'userId': 3, 'movieId': 12, 'tag': 'coldplay'},
+    ]
+    index = TagIndex.build(rows)
+    assert len(index) == 3
+    assert index.contains('war') == ['cold war', 'warm']
+    assert index.with_word('war') == ['cold war']
+    assert index.with_prefix('cold') == ['cold war', 'coldplay']
+    assert index.movies_for('COLD WAR') == {10, 11}
+    assert index.users_for('cold war') == {1, 2}
+
 def test_tags_dist_by_year(tags):
     result = tags.dist_by_year()
     assert isinstance(result, dict)
@@ -74,6 +191,13 @@ def test_tags_dist_by_month(tags):
     assert isinstance(result, dict)
     assert all(isinstance(k, int) and isinstance(v, int) for k, v in result.items())
 
+def test_tags_dist_by_year_month_and_week(tags):
+    months = tags.dist_by_year_month()
+    assert list(months) == sorted(months)
+    assert sum(months.values()) == sum(tags.dist_by_year().values())
+    weeks = tags.dist_by_week()
+    assert all(isinstance(k, str) and '-W' in k for k in weeks)
+
 # ==== Movies Tests ====
 
 def test_movies_dist_by_release(movies):
@@ -92,6 +216,48 @@ def test_movies_most_genres(movies):
     assert all(isinstance(k, str) and isinstance(v, int) for k, v in result.items())
     assert list(result.values()) == sorted(result.values(), reverse=True)
 
+def test_movies_csv_quoting(tmp_path):
+    src = tmp_path / 'movies.csv'
+    src.write_text(
+        'movieId,title,genres\n'
+        '1,Toy Story (1995),Adventure|Animation\n'
+        '2,"American President, The (1995)",Comedy|Drama\n'
+        '3,"11\'09""01 - September 11 (2002)",Drama\n'
+        '4,"Say ""Hi"", Bob",(no genres listed)\n'
+        '5,Babylon 5 (1994-1998),Sci-Fi\n',
+        encoding='utf-8')
+    rows = Movies(str(src)).get_all()
+    assert [(m['title'], m['release']) for m in rows] == [
+        ('Toy Story', 1995), ('American President, The', 1995),
+        ("11'09\"01 - September 11", 2002), ('Say "Hi", Bob', None), ('Babylon 5', 1994)]
+    assert rows[3]['genres'] == ['(no genres listed)'] and rows[0]['genres'] == ['Adventure', 'Animation']
+    assert '"artsy"' in Tags(limit=None).tag_index().contains('artsy')
+
+def test_movies_genre_bitmasks():
+    movies = Movies(limit=None)
+    rows = movies.get_all()
+    index = movies.genre_index()
+    assert len(index.names) <= GenreIndex.MAX_GENRES and len(index) == len(rows)
+    assert movies.dist_by_genres() == dict(Counter(g for m in rows for g in m['genres']).most_common())
+    assert movies.with_genres(any_of=['Comedy', 'Drama'], all_of=['Romance']) == [
+        m['movieID'] for m in rows if 'Romance' in m['genres'] and {'Comedy', 'Drama'} & set(m['genres'])]
+    assert movies.with_genres(all_of=['Comedy', 'No Such Genre']) == []
+    with pytest.raises(TypeError):
+        movies.with_genres(any_of='Comedy')
+    labels = index.labels()
+    assert len(set(labels)) == len(labels) and 'Hamlet (1996)' in labels
+
+def test_ratings_average_by_genre(ratings):
+    genres = {m['movieID']: m['genres'] for m in Movies(limit=None).get_all()}
+    values = {}
+    for movie_id, rating in zip(ratings.movie_ids, ratings.ratings):
+        for genre in genres.get(movie_id, ()):
+            values.setdefault(genre, []).append(rating)
+    expected = {g: round(sum(v) / len(v), 2) for g, v in values.items()}
+    result = ratings.Movies(ratings).average_by_genre()
+    assert result == expected
+    assert list(result.values()) == sorted(result.values(), reverse=True)
+
 # ==== Ratings Tests ====
 
 def test_ratings_dist_by_year(ratings):
@@ -113,6 +279,491 @@ def test_ratings_top_by_num_of_ratings(ratings):
     assert all(isinstance(k, str) and isinstance(v, int) for k, v in result.items())
     assert list(result.values()) == sorted(result.values(), reverse=True)
 
+def test_ratings_columns(ratings):
+    assert len(ratings) == 100
+    assert ratings.user_ids.typecode == 'i' and ratings.movie_ids.typecode == 'i'
+    assert ratings.ratings.typecode == 'f' and ratings.timestamps.typecode == 'q'
+    row = ratings.data[0]
+    assert set(row) == {'userId', 'movieId', 'rating', 'timestamp'}
+    assert all(isinstance(v, str) for v in row.values())
+
+def test_group_stats_match_helpers(ratings):
+    r = ratings.Movies(ratings)
+    stats = ratings.movie_stats()
+    assert stats is ratings.movie_stats()
+    movie_id = max(stats.keys(), key=stats.count)
+    values = [v for m, v in zip(ratings.movie_ids, ratings.ratings) if m == movie_id]
+    assert stats.count(movie_id) == len(values)
+    assert stats.mean(movie_id) == pytest.approx(r.average(values))
+    assert stats.median(movie_id) == pytest.approx(r.median(values))
+    assert stats.variance(movie_id) == pytest.approx(r.variance(values))
+    assert list(stats.sorted_values(movie_id)) == sorted(values)
+    assert sum(ratings.user_stats().counts.values()) == len(ratings)
+
+def test_group_stats_build():
+    stats = GroupStats.build([1, 2, 1, 1], [4.0, 3.0, 2.0, 3.0])
+    assert stats.counts == {1: 3, 2: 1}
+    assert stats.mins[1] == 2.0 and stats.maxs[1] == 4.0
+    assert stats.medians() == {1: 3.0, 2: 3.0}
+    assert stats.variances(min_count=2) == {1: pytest.approx(2 / 3)}
+    # значения вне сетки шага 0.5 не попадают в гистограмму молча
+    with pytest.raises(ValueError, match="не кратно шагу"):
+        GroupStats.build([1, 1], [4.0, 3.3])
+    free = GroupStats.build([1, 1, 1], [3.3, 1.25, 3.3], step=None)
+    assert free.median(1) == 3.3 and free.mins[1] == 1.25 and free.maxs[1] == 3.3
+
+def test_group_stats_merge():
+    merged = GroupStats.build([1, 2], [4.0, 3.0]).merge(GroupStats.build([1, 3, 1], [2.0, 5.0, 3.0]))
+    whole = GroupStats.build([1, 2, 1, 3, 1], [4.0, 3.0, 2.0, 5.0, 3.0])
+    assert list(merged.keys()) == list(whole.keys())
+    assert merged.histograms == whole.histograms and merged.sums == whole.sums
+    assert merged.mins == whole.mins and merged.maxs == whole.maxs
+
+def test_parallel_group_by_matches_serial():
+    serial = Ratings(limit=20000)
+    parallel = Ratings(limit=20000, workers=3)
+    assert parallel.Movies(parallel).top_by_ratings(10, 'median') == serial.Movies(serial).top_by_ratings(10, 'median')
+    assert parallel.Movies(parallel).top_controversial(10) == serial.Movies(serial).top_controversial(10)
+    assert parallel.Users(parallel).dist_by_rating_values('median') == serial.Users(serial).dist_by_rating_values('median')
+    streamed = Ratings(limit=20000, stream=True, chunk_size=3000)
+    assert streamed.Users(streamed).top_controversial_users(10, workers=2) == serial.Users(serial).top_controversial_users(10)
+
+def test_top_k_matches_full_sort():
+    items = [('a', 1), ('b', 3), ('c', 3), ('d', 2), ('e', 3)]
+    assert top_k(items, 2) == [('b', 3), ('c', 3)]
+    for n in range(1, 7):
+        assert top_k(items, n) == sorted(items, key=lambda x: x[1], reverse=True)[:n]
+
+def test_ratings_stream_matches_loaded():
+    loaded = Ratings(limit=5000)
+    streamed = Ratings(limit=5000, stream=True, chunk_size=700)
+    assert len(streamed) == 0
+    assert sum(len(c.ratings) for c in streamed.chunks()) == 5000
+    assert loaded.Movies(loaded).dist_by_year() == streamed.Movies(streamed).dist_by_year()
+    assert loaded.Movies(loaded).dist_by_rating() == streamed.Movies(streamed).dist_by_rating()
+    assert loaded.Users(loaded).dist_by_num_of_rating() == streamed.Users(streamed).dist_by_num_of_rating()
+    assert loaded.Movies(loaded).top_by_ratings(5, 'median') == streamed.Movies(streamed).top_by_ratings(5, 'median')
+
+def test_stream_stats_fold_chunks_into_histograms():
+    loaded = Ratings(limit=None)
+    streamed = Ratings(limit=None, stream=True, chunk_size=500)
+    stats = streamed.movie_stats()
+    assert stats.histograms == loaded.movie_stats().histograms
+    assert stats.medians() == loaded.movie_stats().medians()
+    # на популярный фильм приходится столько блоков, сколько в файле, но гистограмма не растёт
+    movie_id = max(stats.keys(), key=stats.count)
+    assert stats.count(movie_id) > 300 and len(stats.histograms[movie_id]) <= 10
+
+def test_stream_mode_other_loaders():
+    assert Movies(limit=None, stream=True, chunk_size=1000).dist_by_genres() == Movies(limit=None).dist_by_genres()
+    assert Tags(limit=None, stream=True, chunk_size=300).dist_by_year() == Tags(limit=None).dist_by_year()
+    chunks = list(Links(limit=250).read_chunks(100))
+    assert [len(c) for c in chunks] == [100, 100, 50]
+    links, streamed = Links(limit=None), Links(limit=None, stream=True, chunk_size=1000)
+    assert not streamed.links and list(streamed.rows()) == list(links.rows())
+    assert streamed.estimate_counts() == links.estimate_counts()
+    assert streamed.imdb_ids([1, 2, -5]) == {1: links.links[1], 2: links.links[2]}
+    with pytest.raises(ValueError):
+        streamed.get_links()
+
+def test_binary_cache_roundtrip(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    src.write_text(open('./ml-latest-small/ratings.csv', encoding='utf-8').read(), encoding='utf-8')
+    plain = Ratings(str(src), limit=None)
+    cold = Ratings(str(src), limit=None, cache=True)
+    assert os.path.isfile(BinaryCache.cache_path(str(src)))
+    warm = Ratings(str(src), limit=500, cache=True)
+    assert isinstance(warm.ratings, memoryview) and len(warm) == 500
+    assert list(cold.ratings) == list(plain.ratings)
+    assert list(warm.timestamps) == list(plain.timestamps[:500])
+    with open(src, 'a', encoding='utf-8') as f:
+        f.write('1,1,5.0,964982703\n')
+    assert BinaryCache.load(str(src), Ratings.CACHE_SCHEMA) is None
+    assert len(Ratings(str(src), limit=None, cache=True)) == len(plain) + 1
+
+def test_binary_cache_read_only_directory(tmp_path, monkeypatch):
+    src = tmp_path / 'ratings.csv'
+    src.write_text(''.join(open('./ml-latest-small/ratings.csv', encoding='utf-8').readlines()[:2001]), encoding='utf-8')
+    real_open = open
+    def read_only(file, mode='r', *args, **kwargs):
+        if 'w' in mode and str(file).endswith('.tmp'):
+            raise PermissionError(13, 'Read-only file system', file)
+        return real_open(file, mode, *args, **kwargs)
+    monkeypatch.setattr('builtins.open', read_only)
+    r = Ratings(str(src), limit=None, cache=True)
+    monkeypatch.undo()
+    assert len(r) == 2000 and not os.path.exists(BinaryCache.cache_path(str(src)))
+    assert list(r.ratings) == list(Ratings(str(src), limit=None).ratings)
+
+def test_binary_cache_corrupt_file_is_a_miss(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    src.write_text(''.join(open('./ml-latest-small/ratings.csv', encoding='utf-8').readlines()[:2001]), encoding='utf-8')
+    plain = list(Ratings(str(src), limit=None).ratings)
+    path = BinaryCache.cache_path(str(src))
+    Ratings(str(src), limit=None, cache=True)
+    good = open(path, 'rb').read()
+    # обрезанные колонки, обрезанный и испорченный заголовок, обрезанная длина заголовка
+    for damaged in (good[:len(good) // 2], good[:40], good[:8] + b'{"x' + good[11:], good[:6]):
+        with open(path, 'wb') as f:
+            f.write(damaged)
+        assert BinaryCache.load(str(src), Ratings.CACHE_SCHEMA) is None
+        assert list(Ratings(str(src), limit=None, cache=True).ratings) == plain
+        assert open(path, 'rb').read() == good
+
+def test_binary_cache_strings(tmp_path):
+    src = tmp_path / 'tags.csv'
+    src.write_text(open('./ml-latest-small/tags.csv', encoding='utf-8').read(), encoding='utf-8')
+    assert Tags(str(src), limit=None, cache=True).get_tags() == Tags(str(src), limit=None).get_tags()
+    assert Tags(str(src), limit=20, cache=True).get_tags() == Tags(str(src), limit=20).get_tags()
+
+def test_parallel_parse_matches_serial(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    text = open('./ml-latest-small/ratings.csv', encoding='utf-8').read()
+    src.write_text(text[:20000] + 'broken line\n' + text[20000:].rstrip('\n'), encoding='utf-8')
+    serial = Ratings(str(src), limit=None)
+    for workers in (2, 5):
+        parallel = Ratings(str(src), limit=None, workers=workers)
+        assert list(parallel.user_ids) == list(serial.user_ids)
+        assert list(parallel.movie_ids) == list(serial.movie_ids)
+        assert list(parallel.ratings) == list(serial.ratings)
+        assert list(parallel.timestamps) == list(serial.timestamps)
+    assert list(Ratings(str(src), limit=300, workers=4).ratings) == list(Ratings(str(src), limit=300).ratings)
+    ranges = ParallelReader.split_ranges(str(src), 7)
+    assert ranges[0][1] == ranges[1][0] and ranges[-1][1] == os.path.getsize(src)
+
+def test_parallel_parse_frees_shared_memory_on_error(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    text = open('./ml-latest-small/ratings.csv', encoding='utf-8').read()
+    # битый utf-8 в первом диапазоне: его воркер падает, остальные успевают создать блоки
+    data = text.encode('utf-8')
+    src.write_bytes(data[:1000] + b'\xff\n' + data[1000:])
+    before = set(os.listdir('/dev/shm'))
+    with pytest.raises(UnicodeDecodeError):
+        ParallelReader.read_columns(str(src), Ratings.parse_record, Ratings.TYPECODES, 4)
+    assert set(os.listdir('/dev/shm')) <= before
+
+def test_ratings_refresh_matches_reload(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    lines = open('./ml-latest-small/ratings.csv', encoding='utf-8').read().splitlines(keepends=True)
+    src.write_text(''.join(lines[:3001]), encoding='utf-8')
+    movies = './ml-latest-small/movies.csv'
+    for live in (Ratings(str(src), limit=None, movies_path=movies), Ratings(str(src), limit=None, movies_path=movies, cache=True)):
+        m, u = live.Movies(live), live.Users(live)
+        before = (m.dist_by_year(), m.dist_by_rating(), m.top_by_ratings(5), u.dist_by_num_of_rating(), u.top_controversial_users(5))
+        assert live.refresh() == 0
+        with open(src, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines[3001:6001]) + lines[6001][:5])
+        assert live.refresh() == 3000
+        fresh = Ratings(str(src), limit=None, movies_path=movies)
+        fm, fu = fresh.Movies(fresh), fresh.Users(fresh)
+        assert before != (m.dist_by_year(), m.dist_by_rating(), m.top_by_ratings(5), u.dist_by_num_of_rating(), u.top_controversial_users(5))
+        assert m.dist_by_year() == fm.dist_by_year() and m.dist_by_rating() == fm.dist_by_rating()
+        assert m.top_by_ratings(5, 'median') == fm.top_by_ratings(5, 'median')
+        assert u.dist_by_num_of_rating() == fu.dist_by_num_of_rating()
+        assert u.top_controversial_users(5) == fu.top_controversial_users(5)
+        assert live.append([(1, 1, 5.0, 964982703)]) == 1 and live.movie_stats().count(1) == fresh.movie_stats().count(1) + 1
+        src.write_text(''.join(lines[:3001]), encoding='utf-8')
+
+def test_refresh_sees_rows_appended_during_load(tmp_path, monkeypatch):
+    src = tmp_path / 'ratings.csv'
+    lines = open('./ml-latest-small/ratings.csv', encoding='utf-8').read().splitlines(keepends=True)
+    for method, options in (('load', {}), ('load', {'workers': 2}), ('load_cached', {'cache': True})):
+        src.write_text(''.join(lines[:3001]), encoding='utf-8')
+        original = getattr(Ratings, method)
+        def load(self, original=original):
+            # строки дописываются после того, как загрузчик запомнил размер файла
+            with open(src, 'a', encoding='utf-8') as f:
+                f.write(''.join(lines[3001:3501]))
+            original(self)
+        monkeypatch.setattr(Ratings, method, load)
+        r = Ratings(str(src), limit=None, **options)
+        monkeypatch.undo()
+        assert len(r) == 3000
+        assert r.refresh() == 500 and len(r) == 3500
+    assert Ratings(str(src), limit=None, cache=True).refresh() == 0
+
+def test_load_stops_at_last_complete_line(tmp_path):
+    for loader, name in ((Ratings, 'ratings.csv'), (Tags, 'tags.csv')):
+        src = tmp_path / name
+        lines = open(f'./ml-latest-small/{name}', encoding='utf-8').read().splitlines(keepends=True)
+        src.write_text(''.join(lines[:301]) + lines[301][:7], encoding='utf-8')
+        for options in ({}, {'cache': True}):
+            live = loader(str(src), limit=None, **options)
+            assert len(live) == 300 and live.refresh() == 0
+        with open(src, 'a', encoding='utf-8') as f:
+            f.write(lines[301][7:])
+        assert live.refresh() == 1 and len(live) == 301
+        # append для выборки падает, смещение остаётся на месте
+        sampled = loader(str(src), limit=None, sample=Sampling.Reservoir(50, seed=1))
+        with open(src, 'a', encoding='utf-8') as f:
+            f.write(lines[302])
+        offset = sampled._offset
+        with pytest.raises(ValueError):
+            sampled.refresh()
+        assert sampled._offset == offset
+
+def test_sampled_time_buckets_keep_zero_timestamps(tmp_path):
+    src = tmp_path / 'ratings.csv'
+    lines = open('./ml-latest-small/ratings.csv', encoding='utf-8').read().splitlines(keepends=True)
+    rows = [line.rsplit(',', 1)[0] + ',0\n' if i % 7 == 0 else line for i, line in enumerate(lines[1:2001])]
+    src.write_text(lines[0] + ''.join(rows), encoding='utf-8')
+    full = Ratings(str(src), limit=None).time_buckets('year')
+    sampled = Ratings(str(src), sample=Sampling.Reservoir(5000)).time_buckets('year')
+    assert full[1970] > 0 and {year: e.value for year, e in sampled.items()} == full
+
+def test_tags_longer_than_uint16(tmp_path):
+    src = tmp_path / 'tags.csv'
+    huge = ' '.join(['w'] * 65536)
+    src.write_text('userId,movieId,tag,timestamp\n1,1,short,1500000000\n2,1,' + huge + ',1500000000\n', encoding='utf-8')
+    tags = Tags(str(src), limit=None)
+    assert tags.most_words(1) == {huge: 65536} and tags.longest(1) == [(huge, len(huge))]
+
+def test_tags_append_updates_vocabulary(tmp_path):
+    src = tmp_path / 'tags.csv'
+    lines = open('./ml-latest-small/tags.csv', encoding='utf-8').read().splitlines(keepends=True)
+    src.write_text(''.join(lines[:1001]), encoding='utf-8')
+    live = Tags(str(src), limit=None)
+    assert live.tags_with('zzqx') == [] and live.dist_by_year()
+    with open(src, 'a', encoding='utf-8') as f:
+        f.write(''.join(lines[1001:]))
+    assert live.refresh() == len(Tags(limit=None)) - 1000
+    assert live.append([{'userId': 1, 'movieId': 1, 'tag': 'Zzqx Fresh', 'timestamp': 1500000000}]) == 1
+    assert live.tags_with('zzqx') == ['zzqx fresh']
+    with open(src, 'a', encoding='utf-8') as f:
+        f.write('1,1,Zzqx Fresh,1500000000\n')
+    fresh = Tags(str(src), limit=None)
+    assert live.get_tags() == fresh.get_tags()
+    assert live.dist_by_year() == fresh.dist_by_year()
+    assert live.most_popular(10) == fresh.most_popular(10)
+
+def test_query_matches_manual_loop():
+    ratings, movies = Ratings(limit=None), Movies(limit=None)
+    since = datetime(2010, 1, 1, tzinfo=timezone.utc).timestamp()
+    query = (ratings.query().join(movies, all_of=['Drama'], years=(1990, 1999))
+             .between('timestamp', low=since).group_by('movie').agg('variance', min_count=2))
+    assert query.explain()[1].startswith('scan')
+    dramas = {m['movieID'] for m in movies.get_all() if 'Drama' in m['genres'] and m['release'] and 1990 <= m['release'] <= 1999}
+    values = {}
+    for movie_id, rating, ts in zip(ratings.movie_ids, ratings.ratings, ratings.timestamps):
+        if movie_id in dramas and ts >= since:
+            values.setdefault(movie_id, []).append(rating)
+    r = ratings.Movies(ratings)
+    assert query.run() == pytest.approx({k: r.variance(v) for k, v in values.items() if len(v) >= 2})
+    comedies = ratings.query().join(movies, any_of=['Comedy']).group_by('movie').agg('mean')
+    assert 'build movie_stats' in comedies.explain() and not ratings.stats_built('movie')
+    comedy_ids = set(movies.with_genres(any_of=['Comedy']))
+    assert comedies.run() == {k: v for k, v in ratings.movie_stats().means().items() if k in comedy_ids}
+    assert 'reuse movie_stats' in comedies.explain() and ratings.stats_built('movie')
+    with pytest.raises(ValueError):
+        Query(Tags(limit=10)).group_by('movie').agg('mean')
+
+def test_read_only_views_and_filters():
+    movies = Movies(limit=None)
+    view = movies.get_all()
+    assert view is not movies.movies and view == movies.movies and view[:2] == movies.movies[:2]
+    with pytest.raises(TypeError):
+        view[0] = {}
+    nineties = movies.by_year(1990, 1999)
+    assert list(nineties) == [m for m in movies.movies if m['release'] and 1990 <= m['release'] <= 1999]
+    assert [m['movieID'] for m in movies.by_id(100, 200)] == sorted(m['movieID'] for m in movies.movies if 100 <= m['movieID'] <= 200)
+    ratings = Ratings(limit=5000)
+    assert list(ratings.by_user(1)) == [r for r in ratings.data if r['userId'] == '1']
+    ratings.append([(1, 1, 5.0, 964982703)])
+    assert ratings.by_user(1)[-1]['rating'] == '5.0' and len(ratings.by_movie(1)) == sum(m == 1 for m in ratings.movie_ids)
+    tags = Tags(limit=None)
+    assert tags.get_tags() == list(tags.tags) and list(tags.by_movie(296)) == [t for t in tags.get_tags() if t['movieId'] == 296]
+    links = Links(limit=None)
+    assert links.get_links()[1] == links.links[1]
+    with pytest.raises(TypeError):
+        links.get_links()[1] = 0
+    assert links.by_id(1, 10) == {k: v for k, v in links.links.items() if k <= 10}
+    with pytest.raises(ValueError):
+        Ratings(limit=10, stream=True).by_user(1)
+
+def test_sampling_loaders_and_estimates():
+    full = Ratings(limit=None)
+    counts = full.estimate_counts('movie')
+    mean = full.estimate_means(None)[None]
+    assert counts[1] == (full.movie_stats().counts[1], 0.0) and mean.error == 0.0
+
+    r = Ratings(limit=None, sample=Sampling.Reservoir(5000, seed=1))
+    assert len(r) == 5000 and r.population == {None: len(full)}
+    assert list(r.user_ids) == sorted(r.user_ids)
+    assert len({u for u in r.user_ids}) > 500
+    assert Ratings(limit=None, sample=Sampling.Reservoir(5000, seed=1)).data == r.data
+    # без явного limit выборка идёт по всему файлу, а не по первым 1000 строкам
+    default = Ratings(sample=Sampling.Reservoir(500, seed=1))
+    assert default.limit is None and default.population == {None: len(full)}
+    assert len(set(default.user_ids)) > 200 and Ratings().limit == 1000
+    assert Ratings(limit=1000, sample=Sampling.Reservoir(500, seed=1)).population == {None: 1000}
+    assert Ratings(limit=Sampling.LIMIT, sample=Sampling.Reservoir(500, seed=1)).limit == 1000
+    estimate = r.estimate_means(None)[None]
+    assert estimate.low <= mean.value <= estimate.high
+    total = r.estimate_counts(None)[None]
+    assert total.value == len(full) and total.error == 0.0
+
+    b = Ratings(limit=None, sample=Sampling.Bernoulli(0.1, seed=2))
+    assert 9000 < len(b) < 11000
+    assert Ratings(limit=None, sample=Sampling.Bernoulli(1.0)).estimate_counts('movie') == counts
+    streamed = Ratings(limit=None, stream=True, sample=Sampling.Bernoulli(0.1, seed=2))
+    assert streamed.estimate_means(None) == b.estimate_means(None)
+
+    s = Ratings(limit=None, sample=Sampling.Stratified('user', 5, seed=3))
+    assert len(s) == sum(min(n, 5) for n in full.user_stats().counts.values())
+    assert s.estimate_counts('user') == full.estimate_counts('user')
+    estimate = s.estimate_counts('movie')[356]
+    assert estimate.error > 0 and estimate.low <= counts[356].value <= estimate.high
+
+    t = Tags(limit=None, sample=Sampling.Reservoir(100))
+    assert len(t) == 100 and t.estimate_counts(None)[None].value == len(Tags(limit=None))
+    # одна выборка на два файла: у каждого загрузчика свои размеры страт
+    shared = Sampling.Reservoir(100)
+    rs, ts = Ratings(limit=None, sample=shared), Tags(limit=None, sample=shared)
+    assert rs.estimate_counts(None)[None].value == len(full) and ts.population == t.population
+    assert full.population is None
+
+    # счётчики и средние аналитики выборки — оценки по полному файлу с погрешностью
+    exact = full.Movies(full).dist_by_rating()
+    sampled = r.Movies(r).dist_by_rating()
+    assert all(isinstance(e, Sampling.Estimate) for e in sampled.values())
+    assert sum(e.low <= exact[key] <= e.high for key, e in sampled.items()) >= 8
+    assert sum(e.value for e in sampled.values()) == pytest.approx(len(full))
+    top = r.Movies(r).top_by_num_of_ratings(3)
+    assert all(e.error > 0 for e in top.values()) and list(top.values()) == sorted(top.values(), reverse=True)
+    years = r.Movies(r).dist_by_year()
+    assert sum(e.value for e in years.values()) == pytest.approx(len(full))
+    assert r.Users(r).dist_by_num_of_rating()['414'].low <= full.user_stats().count(414)
+    genres = Movies(limit=None).dist_by_genres()
+    estimates = Movies(limit=None, sample=Sampling.Bernoulli(0.5, seed=4)).dist_by_genres()
+    assert 0 < abs(estimates['Drama'].value - genres['Drama']) <= 2 * estimates['Drama'].error
+    assert Movies(limit=None).estimate_counts('genre')['Drama'] == (genres['Drama'], 0.0)
+    assert Links(limit=None, sample=Sampling.Reservoir(10)).estimate_counts()[None] == (len(Links(limit=None).links), 0.0)
+    assert set(t.most_popular(3)) <= set(t.vocabulary().texts)
+    assert len(Links(limit=None, sample=Sampling.Reservoir(10)).links) == 10
+    with pytest.raises(ValueError):
+        Movies(limit=None, sample=Sampling.Stratified('user', 1))
+    with pytest.raises(ValueError):
+        r.append([(1, 1, 5.0, 0)])
+    with pytest.raises(TypeError):
+        Ratings(sample=0.5)
+
+def test_sketches_merge_and_serialize():
+    hll = Sketches.HyperLogLog(12).update(range(20000))
+    other = Sketches.HyperLogLog(12).update(range(10000, 30000))
+    assert abs(hll.count() - 20000) < 20000 * 0.05
+    merged = Sketches.loads(Sketches.dumps(hll)).merge(other)
+    assert abs(merged.count() - 30000) < 30000 * 0.05
+
+    items = [i % 50 for i in range(5000)] + list(range(1000, 3000))
+    ss = Sketches.SpaceSaving(100).update(items[:3000]).merge(Sketches.SpaceSaving(100).update(items[3000:]))
+    for key, count in Counter(items).items():
+        low, high = ss.bounds(key)
+        assert low <= count <= high
+    assert {key for key, _ in ss.top(50)} == set(range(50))
+
+    values = [(i * 7919) % 10007 for i in range(10007)]
+    kll = Sketches.KLL(64).update(values[:5000])
+    kll.merge(Sketches.loads(Sketches.dumps(Sketches.KLL(64).update(values[5000:]))))
+    assert len(kll) == 10007 and sum(map(len, kll.levels)) < 300
+    assert abs(kll.median() - 5003) < 10007 * 0.05
+
+def test_ratings_approx_mode():
+    r = Ratings(limit=None)
+    summary = r.summary()
+    assert abs(summary.users.count() - 610) < 610 * 0.05
+    movies = Ratings.Movies(r)
+    assert movies.top_by_num_of_ratings(5, approx=True) == movies.top_by_num_of_ratings(5)
+    assert movies.top_by_ratings(5, approx=True) == movies.top_by_ratings(5)
+    users = Ratings.Users(r)
+    exact = users.dist_by_rating_values('median')
+    approx = users.dist_by_rating_values('median', approx=True)
+    assert sum(abs(exact[key] - approx[key]) for key in exact) / len(exact) < 0.1
+    assert list(users.dist_by_num_of_rating(approx=True).items())[:10] == list(users.dist_by_num_of_rating().items())[:10]
+    t = Tags(limit=None)
+    assert t.most_popular(2, approx=True) == t.most_popular(2)
+
+    streamed = Ratings(limit=None, stream=True, chunk_size=10000).summary()
+    restored = Sketches.loads(Sketches.dumps(streamed))
+    assert restored.top_movies.top(10) == summary.top_movies.top(10)
+    assert restored.means('movie') == pytest.approx(summary.means('movie'))
+
+def test_sparse_matrix_and_neighbours(tmp_path):
+    r = Ratings(limit=3000)
+    matrix = r.matrix()
+    items = matrix.transpose()
+    assert matrix.shape == items.shape[::-1] and matrix.nnz == items.nnz == 3000
+    for user_id, movie_id, rating in list(zip(r.user_ids, r.movie_ids, r.ratings))[::97]:
+        assert matrix.get(user_id, movie_id) == items.get(movie_id, user_id) == rating
+    assert matrix.get(1, -1) == 0.0
+
+    vectors = {}
+    for user_id, movie_id, rating in zip(r.user_ids, r.movie_ids, r.ratings):
+        vectors.setdefault(movie_id, {})[user_id] = rating
+    def cosine(a, b):
+        dot = sum(a[key] * b[key] for key in a if key in b)
+        return dot / (sum(x * x for x in a.values()) * sum(x * x for x in b.values())) ** 0.5
+    neighbours = r.neighbours('movie', k=5)
+    for movie_id in (1, 50, 260):
+        expected = sorted((cosine(vectors[movie_id], v), other) for other, v in vectors.items() if other != movie_id)
+        expected = [score for score, _ in reversed(expected) if score > 0][:5]
+        assert [score for _, score in neighbours.get(movie_id)] == pytest.approx(expected, rel=1e-5)
+    parallel = Similarity.neighbours(items, k=5, workers=2, block=100)
+    assert parallel.columns() == neighbours.columns()
+    assert all(-1.0001 <= score <= 1.0001 for score in r.neighbours('movie', 'pearson', 5).scores)
+    with pytest.raises(ValueError):
+        r.neighbours('movie', 'jaccard')
+    assert len(Ratings.Movies(r).similar_movies(1, 3)) == 3
+    assert list(Ratings.Users(r).similar_users(1, 3)) == [str(key) for key, _ in r.neighbours('user').get(1, 3)]
+
+    src = tmp_path / 'ratings.csv'
+    lines = open('./ml-latest-small/ratings.csv', encoding='utf-8').read().splitlines(keepends=True)
+    src.write_text(''.join(lines[:3001]), encoding='utf-8')
+    built = Ratings(str(src), limit=None, cache=True).neighbours('movie', k=5)
+    assert os.path.isfile(f"{src}.movie-cosine-5-1.mlcache")
+    cached = Ratings(str(src), limit=None, cache=True).neighbours('movie', k=5)
+    assert isinstance(cached.scores, memoryview) and list(cached.scores) == list(built.scores)
+    assert list(cached.neighbour_ids) == list(neighbours.neighbour_ids)
+
+def test_time_buckets_match_datetime(ratings):
+    tz = timezone(timedelta(hours=-5))
+    for unit in TimeBuckets.UNITS:
+        expected = {}
+        for ts in ratings.timestamps:
+            key = TimeBuckets.UNITS[unit](datetime.fromtimestamp(ts, tz))
+            expected[key] = expected.get(key, 0) + 1
+        assert TimeBuckets.count(ratings.timestamps, unit, tz) == expected
+
+def test_time_buckets_bins():
+    assert TimeBuckets.count_bins([0, 5, 86399, 86400], 86400) == {0: 3, 86400: 1}
+    with pytest.raises(ValueError):
+        TimeBuckets.count([1], 'decade')
+
+def test_similar_movies_keeps_remakes_apart(tmp_path):
+    movies = tmp_path / 'movies.csv'
+    movies.write_text('movieId,title,genres\n1,Original (2000),Drama\n2,Twin (1990),Drama\n'
+                      '3,Twin (2010),Drama\n4,Other (2001),Comedy\n', encoding='utf-8')
+    src = tmp_path / 'ratings.csv'
+    rows = [f"{user},{movie},{(user + movie) % 5 + 1}.0,1500000000\n" for user in range(1, 6) for movie in (1, 2, 3, 4)]
+    src.write_text('userId,movieId,rating,timestamp\n' + ''.join(rows), encoding='utf-8')
+    similar = Ratings.Movies(Ratings(str(src), limit=None)).similar_movies(1, 3)
+    assert sorted(similar) == ['Other', 'Twin (1990)', 'Twin (2010)']
+
+def test_catalog_is_shared_and_invalidated(tmp_path):
+    src = tmp_path / 'movies.csv'
+    src.write_text(open('./ml-latest-small/movies.csv', encoding='utf-8').read(), encoding='utf-8')
+    first = Catalog.get(str(src))
+    assert Catalog.get(str(src)) is first
+    assert len(first.titles) > 1000
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert Catalog.get(str(src)) is not first
+
+def test_ratings_titles_beyond_first_1000_movies():
+    r = Ratings(limit=None)
+    titles = r.get_titles()
+    assert titles is Tags(limit=1).get_titles()
+    assert r.Movies(r).top_by_num_of_ratings(1) == {'Forrest Gump': 329}
+
 # ==== Links Tests ====
 
 
@@ -147,10 +798,187 @@ def test_links_cost_per_minute(links):
     assert all(isinstance(k, int) and isinstance(v, float) for k, v in result.items())
     assert list(result.values()) == sorted(result.values(), reverse=True)
 
-def test_get_imdb_raises_on_too_many_movies(links):
-    too_many_movies = list(range(21))  
-    with pytest.raises(ValueError, match="Слишком много фильмов"):
-        links.get_imdb(too_many_movies)
+def test_get_imdb_concurrent_without_cap(imdb_stub):
+    url, hits = imdb_stub
+    fetcher = Fetcher(concurrency=4, rate=None, backoff=0.01)
+    l = Links(limit=100, imdb_url=url, fetcher=fetcher, imdb_cache=False)
+    ids = list(l.get_links().keys())[:30]
+    info = l.get_imdb(ids)
+    assert len(info) == 30
+    assert hits['/title/tt0113497/'] == 2
+    toy_story = next(m for m in info if m['movie_id'] == 1)
+    assert toy_story['Budget'] == '$11,470,900 (estimated)'
+    assert toy_story['Runtime'] == '1 hour 49 minutes'
+    assert l.most_expensive(1) == {30: 11501200}
+    assert list(l.longest(2).items()) == list(l.longest(2).items()) == [(28, 117), (26, 117)]
+    assert l.top_cost_per_minute(1) == {21: 185509.84}
+    fetcher.close()
+
+def test_get_imdb_cache(imdb_stub, tmp_path):
+    url, hits = imdb_stub
+    cache_path = str(tmp_path / 'imdb.sqlite')
+    with ImdbCache(cache_path) as cache:
+        l = Links(limit=100, imdb_url=url, fetcher=Fetcher(rate=None, backoff=0.01), imdb_cache=cache)
+        l.get_imdb([1, 2, 3])
+        l.get_imdb([4, 5])
+        assert [m['movie_id'] for m in l.imdb_info] == [5, 4, 3, 2, 1]
+        assert len(cache) == 5
+    requests_made = sum(hits.values())
+
+    with ImdbCache(cache_path, offline=True) as cache:
+        l = Links(limit=100, imdb_url=url, imdb_cache=cache)
+        info = l.get_imdb([1, 2, 3, 4, 5, 6], ["Director", "Runtime"])
+        assert [m['movie_id'] for m in info] == [5, 4, 3, 2, 1]
+        assert info[-1]['Runtime'] == '1 hour 49 minutes'
+    assert sum(hits.values()) == requests_made
+
+def test_extract_dom_fields():
+    info = Extractors.extract(imdb_page(114709), ["Director", "Budget", "Cumulative Worldwide Gross", "Runtime", "Unknown"])
+    assert info == {
+        "Director": "Director 1",
+        "Budget": "$11,470,900 (estimated)",
+        "Cumulative Worldwide Gross": "$34,412,700",
+        "Runtime": "1 hour 49 minutes",
+        "Unknown": None,
+    }
+
+def test_extract_dom_fields_in_one_scanner_pass(monkeypatch):
+    scanners, starts = [], []
+    scan = Extractors.DomScanner.scan
+    def record(self, html, start):
+        scanners.append(self)
+        starts.append(start)
+        return scan(self, html, start)
+    monkeypatch.setattr(Extractors.DomScanner, 'scan', record)
+    info = Extractors.extract(imdb_page(114709), ["Runtime", "Director", "Budget", "Cumulative Worldwide Gross"])
+    assert None not in info.values()
+    assert len(set(map(id, scanners))) == 1
+    assert starts == sorted(set(starts))
+
+def test_extract_embedded_json():
+    next_data = {'props': {'pageProps': {
+        'aboveTheFoldData': {
+            'titleText': {'text': 'Toy Story'},
+            'runtime': {'seconds': 4860},
+            'principalCredits': [{'category': {'id': 'director'},
+                                  'credits': [{'name': {'nameText': {'text': 'John Lasseter'}}}]}],
+        },
+        'mainColumnData': {
+            'productionBudget': {'budget': {'amount': 30000000, 'currency': 'USD'}},
+            'worldwideGross': {'total': {'amount': 394436586, 'currency': 'EUR'}},
+        },
+    }}}
+    json_ld = {'@type': 'Movie', 'genre': ['Animation', 'Comedy'], 'aggregateRating': {'ratingValue': 8.3}}
+    html = (f'<html><head><script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script>'
+            f'<script type="application/ld+json">{json.dumps(json_ld)}</script></head><body></body></html>')
+    info = Extractors.extract(html, ["Director", "Budget", "Cumulative Worldwide Gross", "Runtime", "Title", "Genres", "Rating"])
+    assert info == {
+        "Director": "John Lasseter",
+        "Budget": "$30,000,000",
+        "Cumulative Worldwide Gross": "€394,436,586",
+        "Runtime": "1 hour 21 minutes",
+        "Title": "Toy Story",
+        "Genres": "Animation, Comedy",
+        "Rating": "8.3",
+    }
+
+def test_imdb_facts_parsing():
+    assert parse_money("$63,000,000 (estimated)") == (63000000, 'USD')
+    assert parse_money("CA$5,000,000") == (5000000, 'CAD')
+    assert parse_money("DKK 10,000,000 (estimated)") == (10000000, 'DKK')
+    assert parse_money(None) == (None, None)
+    assert parse_runtime("1 hour 21 minutes") == 81
+    assert parse_runtime("2 hours") == 120
+    assert parse_runtime("1h 5m") == 65
+    assert parse_runtime("n/a") is None
+
+def test_imdb_facts_keep_currencies_apart():
+    facts = ImdbFacts()
+    facts.update({'movie_id': 1, 'Budget': '$100', 'Cumulative Worldwide Gross': '$250', 'Runtime': '1 hour 40 minutes'})
+    facts.update({'movie_id': 2, 'Budget': '€900', 'Cumulative Worldwide Gross': '€1,000', 'Runtime': '50 minutes'})
+    facts.update({'movie_id': 1, 'Runtime': '2 hours'})
+    assert len(facts) == 2
+    assert facts.budget() == {1: 100}
+    assert facts.budget('EUR') == {2: 900}
+    assert facts.profit() == {1: 150}
+    assert facts.runtime() == {1: 120, 2: 50}
+    assert facts.cost_per_minute('EUR') == {2: 18.0}
+
+def test_imdb_cache_ttl_and_lru(tmp_path):
+    with ImdbCache(str(tmp_path / 'c.sqlite'), max_bytes=700) as cache:
+        for imdb_id in range(1, 6):
+            cache.put(imdb_id, imdb_page(imdb_id * 1000), {'Director': str(imdb_id)})
+            cache.get(1)
+        assert cache.total_bytes() <= 700
+        assert cache.get(1) is not None and cache.get(2) is None
+        assert cache.get(5)[1] == {'Director': '5'}
+        cache.ttl = -1
+        assert cache.get(5) is None
+        cache.ttl = None
+        # дописанные поля тоже учитываются в лимите размера
+        cache.update_fields(5, {'Director': 'x' * 2000})
+        assert cache.total_bytes() <= 700
+
+def test_default_imdb_cache_next_to_dataset(imdb_stub, tmp_path, monkeypatch):
+    url, hits = imdb_stub
+    src = tmp_path / 'data' / 'links.csv'
+    src.parent.mkdir()
+    src.write_text(''.join(open('./ml-latest-small/links.csv', encoding='utf-8').readlines()[:11]), encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    with Links(str(src), limit=None, imdb_url=url) as l:
+        assert len(l.get_imdb([1, 2])) == 2
+        fetcher = l.fetcher
+    # клиент и кэш создал сам Links, он их и закрыл
+    assert l.fetcher is None and l.imdb_cache is None and fetcher.client.is_closed
+    assert (src.parent / '.imdb_cache.sqlite').is_file()
+    assert not (tmp_path / '.imdb_cache.sqlite').exists()
+
+def test_fetcher_rate_limit(imdb_stub):
+    url, hits = imdb_stub
+    with Fetcher(concurrency=4, rate=50) as fetcher:
+        start = time.monotonic()
+        pages = fetcher.fetch_many(f"{url}/title/tt{i:07d}/" for i in range(1, 11))
+        assert time.monotonic() - start >= 9 / 50
+    assert all(pages.values())
+
+def test_fetcher_caps_retry_after():
+    with Fetcher(backoff=0.5, max_backoff=30.0) as fetcher:
+        assert fetcher._delay(0, httpx.Response(429, headers={'Retry-After': '86400'})) == 30.0
+        assert fetcher._delay(0, httpx.Response(503, headers={'Retry-After': '2'})) == 2.0
+        assert fetcher._delay(10) == 30.0 and fetcher._delay(1) == 1.0
+
+def test_metrics_snapshot_and_prometheus(imdb_stub, tmp_path):
+    url, hits = imdb_stub
+    Metrics.reset()
+    Ratings(limit=50)
+    assert Metrics.snapshot()['methods'] == {}
+
+    Metrics.enable()
+    try:
+        r = Ratings(limit=50)
+        Ratings.Movies(r).top_by_num_of_ratings(3)
+        with ImdbCache(str(tmp_path / 'imdb.sqlite')) as cache:
+            l = Links(limit=100, imdb_url=url, fetcher=Fetcher(rate=None, backoff=0.01), imdb_cache=cache)
+            l.get_imdb([2, 6])
+            l.get_imdb([2, 6])
+        snapshot = Metrics.snapshot()
+        text = Metrics.prometheus_text()
+    finally:
+        Metrics.disable()
+        Metrics.reset()
+
+    methods = snapshot['methods']
+    assert methods['Ratings.__init__']['calls'] == 1
+    assert methods['Ratings.__init__']['rows'] == 50
+    assert methods['Ratings.__init__']['bytes'] > 0
+    assert methods['Ratings.Movies.top_by_num_of_ratings']['rows'] >= 50
+    assert methods['Links.get_imdb']['calls'] == 2
+    assert snapshot['caches']['imdb'] == {'hits': 2, 'misses': 2}
+    http = snapshot['http'][url.split('//')[1]]
+    assert http['count'] == 3 and http['statuses'] == {503: 1, 200: 2}
+    assert http['buckets'][float('inf')] == 3
+    assert 'movielens_method_calls_total{method="Links.get_imdb"} 2.0' in text
+    assert 'movielens_http_request_seconds_bucket' in text
 
 def test_get_imdb_raises_on_invalid_type(links):
     with pytest.raises(TypeError, match="Не верный тип данных"):